@@ -0,0 +1,230 @@
+"""
+Trigger latency and throughput benchmark.
+
+Drives the cart's pipeline (MovementSensor in edge mode on its own thread, TriggerDispatcher camera workers,
+Camera.trigger and CaptureMonitor) with replayed wheel pulses and simulated cameras, sweeping pulse rate and
+number of cameras. Results are written as JSON so they can be compared across releases, e.g.
+
+    python benchmark.py --rates 2 4 6 8 --cameras 1 3 6 --output bench.json
+
+--targets card host compares saving to the cards (photos transferred after the run) with capture to host (photos
+downloaded during the run, see host_capture).
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('CAMERACART_SIMULATE_CAMERAS', '1')
+
+import capture_monitor
+import emulators
+import host_capture
+import replay
+import sensors
+import triggering
+
+SCHEMA_VERSION = 2
+CARD = 'card'
+HOST = 'host'
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(round(q / 100 * (len(values) - 1))), len(values) - 1)]
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'describe', '--always', '--dirty'], cwd=os.path.dirname(__file__),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_point(timeline, n_cameras, args, target=CARD):
+    """
+    Replays a timeline in real time through n_cameras simulated cameras.
+    :param target: CARD or HOST
+    :return: dict of results
+    """
+    sensors.gp.devices = [emulators.SimulatedCameraDevice('Nikon DSC D3500', f'usb:001,{i + 4:03d}', 1000 + i,
+                                                          capture_latency=args.capture_latency,
+                                                          write_time=args.write_time,
+                                                          buffer_depth=args.buffer_depth,
+                                                          trigger_error_rate=args.error_rate,
+                                                          usb_throughput=args.usb_throughput, seed=i)
+                          for i in range(n_cameras)]
+    sensors.get_camera_registry().invalidate()
+
+    movement_sensor = sensors.MovementSensor(gpio_pin=10, movement_distance=args.movement_distance,
+                                             mode=sensors.MovementSensor.EDGE)
+
+    dispatcher = triggering.TriggerDispatcher(clock=movement_sensor.clock)
+    config = {'capturetarget': host_capture.RAM} if target == HOST else None
+    cameras = [sensors.Camera(name='Nikon DSC D3500', location=f'camera{i}', config=config, serial_number=1000 + i)
+               for i in range(n_cameras)]
+    monitors = []
+    windows = []
+    downloaders = []
+    destination = tempfile.mkdtemp()
+    for camera in cameras:
+        window = None
+        if target == HOST:
+            window = host_capture.InFlightWindow(args.in_flight)
+            windows.append(window)
+        dispatcher.add_camera(camera, policy=args.policy, window=window)
+        monitors.append(capture_monitor.CaptureMonitor(camera, dispatcher))
+        monitors[-1].start()
+        if target == HOST:
+            downloaders.append(host_capture.HostDownloader(camera, dispatcher, window,
+                                                           os.path.join(destination, camera.location)))
+            os.makedirs(downloaders[-1].destination)
+            downloaders[-1].start()
+
+    pulse_to_trigger = []
+    trigger_to_capture = []
+
+    def listener(event, camera, trigger):
+        if event == 'started':
+            pulse_to_trigger.append(trigger.started - trigger.issued)
+        elif event == 'confirmed':
+            trigger_to_capture.append(trigger.capture.latency)
+
+    dispatcher.add_listener(listener)
+    movement_sensor.add_listener(dispatcher.dispatch)
+    movement_sensor.start()
+
+    engine = replay.ReplayEngine(timeline, movement_sensor, replay.ReplayClock(replay.REAL_TIME))
+    engine.start()
+    engine.thread.join()
+    time.sleep(args.settle)
+
+    for monitor in monitors:
+        monitor.stop()
+    dispatcher.stop()
+    for downloader in downloaders:
+        downloader.stop()
+    movement_sensor.stop()
+
+    stats = dispatcher.stats()
+    issued = sum(s['issued'] for s in stats.values())
+    confirmed = sum(monitor.confirmed for monitor in monitors)
+    rate = (len(timeline.pulses) - 1) / timeline.duration if timeline.duration else 0
+    devices = sensors.gp.devices
+    if target == HOST:
+        transfer = {'downloaded': sum(downloader.downloaded for downloader in downloaders),
+                    'bytes': sum(downloader.bytes for downloader in downloaders),
+                    'left_in_camera': sum(len(device.files) for device in devices),
+                    'window_waits': sum(window.waits for window in windows),
+                    'window_wait_s': sum(window.wait_time for window in windows),
+                    'after_run_s': 0.0}
+    else:
+        # Cameras are transferred one after the other, after the run
+        transfer = {'after_run_s': sum(len(device.files) * (device.file_size / device.usb_throughput
+                                                            + device.round_trip) for device in devices)}
+    return {'target': target,
+            'cameras': n_cameras,
+            'pulse_rate_hz': rate,
+            'speed_m_s': rate * args.movement_distance / 100,
+            'pulses': movement_sensor.cumulative_movements,
+            'issued': issued,
+            'completed': sum(s['completed'] for s in stats.values()),
+            'failed': sum(s['failed'] for s in stats.values()),
+            'dropped': sum(s['dropped'] for s in stats.values()),
+            'busy': sum(s['busy'] for s in stats.values()),
+            'late': sum(s['late'] for s in stats.values()),
+            'confirmed': confirmed,
+            'drop_rate': 1 - confirmed / issued if issued else None,
+            'pulse_to_trigger_s': {'p50': percentile(pulse_to_trigger, 50), 'p99': percentile(pulse_to_trigger, 99),
+                                   'mean': statistics.fmean(pulse_to_trigger) if pulse_to_trigger else None},
+            'trigger_to_capture_s': {'p50': percentile(trigger_to_capture, 50),
+                                     'p99': percentile(trigger_to_capture, 99),
+                                     'mean': statistics.fmean(trigger_to_capture) if trigger_to_capture else None},
+            'shutter_skew_s': {'p50': percentile(list(dispatcher.skews), 50),
+                               'p99': percentile(list(dispatcher.skews), 99),
+                               'max': max(dispatcher.skews, default=None)},
+            'transfer': transfer}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rates', type=float, nargs='+', default=[1, 2, 4, 6, 8], help='pulse rates in Hz')
+    parser.add_argument('--cameras', type=int, nargs='+', default=[1, 3], help='numbers of cameras')
+    parser.add_argument('--distance', type=float, default=1000, help='centimeters travelled per point')
+    parser.add_argument('--replay', help='session log to replay instead of a constant speed (ignores --rates)')
+    parser.add_argument('--movement-distance', type=float, default=19.5, help='centimeters per pulse')
+    parser.add_argument('--jitter', type=float, default=0.05, help='relative jitter of the pulse period')
+    parser.add_argument('--policy', default=triggering.COALESCE, choices=triggering.POLICIES)
+    parser.add_argument('--capture-latency', type=float, default=0.08)
+    parser.add_argument('--write-time', type=float, default=0.25)
+    parser.add_argument('--buffer-depth', type=int, default=6)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--usb-throughput', type=float, default=30e6, help='bytes per second per camera')
+    parser.add_argument('--targets', nargs='+', default=[CARD], choices=[CARD, HOST],
+                        help='where photos are saved: card, or camera RAM and downloaded during the run')
+    parser.add_argument('--in-flight', type=int, default=2, help='captures waiting for download per camera (host)')
+    parser.add_argument('--settle', type=float, default=2.0, help='seconds to wait for captures after the last pulse')
+    parser.add_argument('--max-drop-rate', type=float, default=0.01,
+                        help='highest drop rate still counted as sustainable')
+    parser.add_argument('--output', help='JSON file for the results, default stdout')
+    args = parser.parse_args(argv)
+
+    if not isinstance(sensors.gp, emulators.GPhoto2Simulator):
+        parser.error('benchmark needs simulated cameras, set CAMERACART_SIMULATE_CAMERAS=1')
+
+    sensors.GPIO.delay = 0
+    sensors._camera_registry = sensors.CameraRegistry(os.path.join(tempfile.mkdtemp(), 'camera_registry.json'))
+
+    if args.replay:
+        timelines = [replay.Timeline.from_session(args.replay)]
+    else:
+        timelines = [replay.Timeline.constant_speed(rate * args.movement_distance, args.distance,
+                                                    args.movement_distance, jitter=args.jitter, seed=0)
+                     for rate in args.rates]
+
+    points = []
+    for target in args.targets:
+        for n_cameras in args.cameras:
+            for timeline in timelines:
+                # Pulse and camera messages would drown the results
+                with contextlib.redirect_stdout(sys.stderr):
+                    points.append(run_point(timeline, n_cameras, args, target))
+                print(f"{target}, {n_cameras} cameras, {points[-1]['speed_m_s']:.2f} m/s: "
+                      f"drop rate {points[-1]['drop_rate']:.3f}", file=sys.stderr)
+
+    max_speed = {}
+    for target in args.targets:
+        max_speed[target] = {}
+        for n_cameras in args.cameras:
+            sustainable = [point['speed_m_s'] for point in points
+                           if point['target'] == target and point['cameras'] == n_cameras
+                           and point['drop_rate'] is not None and point['drop_rate'] <= args.max_drop_rate]
+            max_speed[target][str(n_cameras)] = max(sustainable, default=None)
+
+    results = {'schema': SCHEMA_VERSION,
+               'revision': git_revision(),
+               'date': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+               'host': platform.node(),
+               'parameters': vars(args),
+               'max_sustainable_speed_m_s': max_speed,
+               'points': points}
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
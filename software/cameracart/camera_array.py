@@ -0,0 +1,134 @@
+"""
+The cameras on the boom, read from a JSON file (cameras.json next to this module by default):
+
+    {"cameras": [{"model": "Nikon DSC D3500", "serial_number": 3534517, "location": "left",
+                  "profile": "d3500", "offset": -60.0, "height": 150.0, "focal_length": 18.0,
+                  "burst": {"frames": 3, "bracket": {"shutterspeed": [9, 8, 10]}}},
+                 ...]}
+
+Cameras are listed left to right. profile names one of PROFILES, config optionally overrides single settings of
+the profile and offset is the camera's distance from the middle of the boom in centimeters (negative to the left).
+height is the lens's height above the ground in centimeters and focal_length that of the lens in millimeters, or fov
+gives the field of view in degrees as [across, along] the direction of travel; together they give the ground each
+photo covers (see coverage). Photos are taken in landscape, the long side of the sensor across the boom.
+burst optionally takes several frames per trigger (see triggering.Burst): frames per trigger, bracket with a list of
+choice indices per config item that frame k cycles through, and the camera's buffer_depth (frames) and write_time
+(seconds per frame), which limit the frames taken at the current speed.
+"""
+import json
+import math
+import os
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cameras.json')
+
+# Might want to also include ability to set camera time so Pi and cameras are synchronized
+D3500_CONFIG = {'capturetarget': 1,  # 'Memory card'
+                'autofocus': 1,  # 'Off'
+                'focusmode': 0,  # Off (But does not change autofocus to manual)
+                'focusmode2': 4,  # MF (selection) - this does work!
+                'capturemode': 1,  # 'Burst'
+                'whitebalance': 1,  # Daylight
+                'iso': 0,  # 100
+                'imagesize': 0,  # 6000x4000
+                'isoauto': 1,  # Off
+                'autoiso': 1,  # Off
+                'shutterspeed': 9,  # 1/640s -- to disable, turn camera wheel to A and all other settings should still work
+                'f-number': 7,  # 7 = f/8
+                'assistlight': 1  # Turn off assist light
+                }
+
+D3300_CONFIG = {'capturetarget': 1,  # 'Memory card'
+                'autofocus': 1,  # 'Off'
+                'focusmode': 0,
+                'focusmode2': 4,
+                'capturemode': 1,  # 'Burst'
+                'iso': 0,  # 100
+                'imagesize': 0,  # 6000x4000
+                'isoauto': 0,  # Off
+                'shutterspeed': 9,  # 1/500s
+                'f-number': 7  # 7 = f/8
+                }
+
+PROFILES = {'d3500': D3500_CONFIG,
+            'd3300': D3300_CONFIG}
+
+# Sensor width and height in millimeters, at imagesize 0 (6000x4000)
+SENSOR_SIZES = {'d3500': (23.5, 15.6),
+                'd3300': (23.5, 15.6)}
+
+
+class CameraSpec:
+    """
+    One camera of the array.
+    """
+
+    def __init__(self, model, serial_number, location, profile, config=None, offset=None, burst=None, height=None,
+                 focal_length=None, fov=None):
+        """
+        :param model: gphoto2 camera name, e.g. 'Nikon DSC D3500'
+        :param serial_number: serial number, used to find the camera on the USB bus
+        :param location: unique name of the camera's position, e.g. 'left'
+        :param profile: key of PROFILES
+        :param config: settings overriding the profile's
+        :param offset: distance from the middle of the boom in centimeters, negative to the left
+        :param burst: dict with frames per trigger and optionally bracket, buffer_depth and write_time
+        :param height: height of the lens above the ground in centimeters
+        :param focal_length: focal length of the lens in millimeters
+        :param fov: [across, along] field of view in degrees, instead of focal_length
+        """
+        if profile not in PROFILES:
+            raise ValueError(f'Unknown camera profile {profile}, expected one of {sorted(PROFILES)}')
+        unknown = set(burst or {}) - {'frames', 'bracket', 'buffer_depth', 'write_time'}
+        if unknown:
+            raise ValueError(f'Unknown burst settings {sorted(unknown)} for {location} camera')
+        self.model = model
+        self.serial_number = int(serial_number)
+        self.location = location
+        self.profile = profile
+        self.overrides = dict(config or {})
+        self.offset = offset
+        self.burst = burst
+        self.height = height
+        self.focal_length = focal_length
+        self.fov = fov
+
+    @property
+    def config(self):
+        config = dict(PROFILES[self.profile])
+        config.update(self.overrides)
+        return config
+
+    def footprint(self):
+        """
+        :return: (across, along) size in centimeters of the ground in a photo, None without height and lens
+        """
+        if self.height is None:
+            return None
+        if self.fov is not None:
+            return tuple(2 * self.height * math.tan(math.radians(angle) / 2) for angle in self.fov)
+        if self.focal_length is None:
+            return None
+        width, height = SENSOR_SIZES[self.profile]
+        return self.height * width / self.focal_length, self.height * height / self.focal_length
+
+    def as_dict(self):
+        return {'model': self.model, 'serial_number': self.serial_number, 'location': self.location,
+                'profile': self.profile, 'config': self.overrides, 'offset': self.offset, 'burst': self.burst,
+                'height': self.height, 'focal_length': self.focal_length, 'fov': self.fov}
+
+
+def load(path=DEFAULT_PATH):
+    """
+    :return: list of CameraSpec, left to right
+    """
+    with open(path) as f:
+        cameras = [CameraSpec(**camera) for camera in json.load(f)['cameras']]
+    locations = [camera.location for camera in cameras]
+    if len(set(locations)) != len(locations):
+        raise ValueError(f'Camera locations in {path} are not unique: {locations}')
+    return cameras
+
+
+def save(cameras, path=DEFAULT_PATH):
+    with open(path, 'w') as f:
+        json.dump({'cameras': [camera.as_dict() for camera in cameras]}, f, indent=2)
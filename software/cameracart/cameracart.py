@@ -1,7 +1,8 @@
-from PyQt5 import QtCore, QtWidgets
+from PyQt5 import QtCore, QtGui, QtWidgets
 from ui.main_window import Ui_MainWindow
+import engine
 import sensors
-import datetime
+import status
 
 
 class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
@@ -12,57 +13,96 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         self.ui.setupUi(self)
 
 
+class PreviewDecoder:
+    """
+    Decodes live view frames into images of the preview's size, on the preview thread (see preview.PreviewStream).
+    Holds the image it decodes into, so every stream needs its own decoder.
+    """
+
+    def __init__(self, width=240, height=160):
+        self.width = width
+        self.height = height
+        self.source = QtGui.QImage()
+
+    def __call__(self, data, frame):
+        if frame is None:
+            frame = QtGui.QImage(self.width, self.height, QtGui.QImage.Format_RGB32)
+        if not self.source.loadFromData(bytes(data)):
+            return frame
+        size = self.source.size().scaled(self.width, self.height, QtCore.Qt.KeepAspectRatio)
+        frame.fill(QtCore.Qt.black)
+        painter = QtGui.QPainter(frame)
+        painter.drawImage(QtCore.QRect((self.width - size.width()) // 2, (self.height - size.height()) // 2,
+                                       size.width(), size.height()), self.source)
+        painter.end()
+        return frame
+
+
+class CameraPanel(QtWidgets.QGroupBox):
+    """
+    Photo count and controls of one camera.
+    """
+
+    def __init__(self, location, parent=None):
+        super().__init__(parent)
+        self.setTitle(f'{location.title()} Camera')
+        layout = QtWidgets.QVBoxLayout(self)
+
+        self.preview = QtWidgets.QLabel(self)
+        self.preview.setFixedSize(240, 160)
+        self.preview.setVisible(False)
+        self.preview_frame = None
+        layout.addWidget(self.preview)
+
+        count = QtWidgets.QWidget(self)
+        count_layout = QtWidgets.QHBoxLayout(count)
+        count_layout.setContentsMargins(0, 0, 0, 0)
+        count_layout.addWidget(QtWidgets.QLabel('Photos Taken:', count))
+        self.photos_taken = QtWidgets.QLabel('0', count)
+        count_layout.addWidget(self.photos_taken)
+        layout.addWidget(count)
+        self.health = QtWidgets.QLabel('', self)
+        self.health.setWordWrap(True)
+        layout.addWidget(self.health)
+        self.coverage = QtWidgets.QLabel('', self)
+        layout.addWidget(self.coverage)
+
+        self.enable_camera_btn = QtWidgets.QPushButton('Enable Camera', self)
+        self.enable_camera_btn.setCheckable(True)
+        self.enable_camera_btn.setChecked(False)
+        layout.addWidget(self.enable_camera_btn)
+        self.transfer_photos_btn = QtWidgets.QPushButton('Transfer Photos', self)
+        layout.addWidget(self.transfer_photos_btn)
+        self.reset_btn = QtWidgets.QPushButton('Reset', self)
+        layout.addWidget(self.reset_btn)
+
+
 class CameraCart:
-    def __init__(self, field_name):
+    def __init__(self, field_name, movement_mode=sensors.MovementSensor.EDGE, photo_spacing=None, use_gps=False,
+                 location=None, refresh_rate=10, **engine_kwargs):
+        """
+        Window for a CartEngine. The engine is set up and started before Qt, so triggering does not depend on the
+        GUI; the window only observes it.
+        :param field_name: name of the field being photographed
+        :param movement_mode: sensors.MovementSensor.EDGE or sensors.MovementSensor.POLL
+        :param photo_spacing: distance between photos in centimeters. If None, cameras are triggered on every wheel
+        pulse, otherwise captures are scheduled ahead of time so exposures land every photo_spacing centimeters.
+        :param use_gps: read the GPS on the serial port
+        :param location: (latitude, longitude) of the field, used for the sun position until there is a GPS fix
+        :param refresh_rate: times per second the window is redrawn
+        :param engine_kwargs: further engine.CartEngine arguments, e.g. cameras, capture_to_host or skip_alleys
+        """
+        self.engine = engine.CartEngine(field_name, movement_mode=movement_mode, photo_spacing=photo_spacing,
+                                        use_gps=use_gps, location=location, **engine_kwargs)
+
         app = QtWidgets.QApplication([])
         app.setStyle('Fusion')
         self.app = app
         self.window = MainWindow()
 
-        # Colons in time replaced with hyphen due to colon being a prohibited character in file names in Windows
-        self.time = datetime.datetime.now().strftime("T%H-%M-%SZ")
-
-        self.movement_sensor = sensors.MovementSensor(gpio_pin=10, movement_distance=19.5)
-        self.moved = False
-
-        # Might want to also include ability to set camera time so Pi and cameras are synchronized
-        self.d3500_config = {'capturetarget': 1,  # 'Memory card'
-                             'autofocus': 1,  # 'Off'
-                             'focusmode': 0,  # Off (But does not change autofocus to manual)
-                             'focusmode2': 4,  # MF (selection) - this does work!
-                             'capturemode': 1,  # 'Burst'
-                             'whitebalance': 1,  # Daylight
-                             'iso': 0,  # 100
-                             'imagesize': 0,  # 6000x4000
-                             'isoauto': 1,  # Off
-                             'autoiso': 1,  # Off
-                             'shutterspeed': 9,  # 1/640s -- to disable, turn camera wheel to A and all other settings should still work
-                             'f-number': 7,  # 7 = f/8
-                             'assistlight': 1  # Turn off assist light
-                             }
-
-        self.d3300_config = {'capturetarget': 1,  # 'Memory card'
-                             'autofocus': 1,  # 'Off'
-                             'focusmode': 0,
-                             'focusmode2': 4,
-                             'capturemode': 1,  # 'Burst'
-                             'iso': 0,  # 100
-                             'imagesize': 0,  # 6000x4000
-                             'isoauto': 0,  # Off
-                             'shutterspeed': 9,  # 1/500s
-                             'f-number': 7  # 7 = f/8
-                             }
-
-        self.camera0 = sensors.Camera(name='Nikon DSC D3500', location='left', config=self.d3500_config,
-                                      serial_number=3534517)
-        self.camera1 = sensors.Camera(name='Nikon DSC D3300', location='center', config=self.d3300_config,
-                                      serial_number=3804012)
-        self.camera2 = sensors.Camera(name='Nikon DSC D3500', location='right', config=self.d3500_config,
-                                      serial_number=3534475)
-
-        # May get the following error:
-        # gphoto2.GPhoto2Error: [-53] Could not claim the USB device
-        # Was resolved by turning camera off and back on again
+        self.field_name = field_name
+        self.photo_directory = self.engine.photo_directory
+        self.movement_sensor = self.engine.movement_sensor
 
         self.window.ui.time_label.setText('')
         self.window.ui.solar_elevation_label.setText('')
@@ -72,40 +112,38 @@ class CameraCart:
         self.window.ui.compass_label.setText('')
         self.window.ui.distance_traveled_label.setText('')
 
-        self.movement_thread = QtCore.QThread()
-        self.movement_sensor.moveToThread(self.movement_thread)
-
-        self.movement_check_timer = QtCore.QTimer(interval=50, timeout=self.movement_sensor.moved_)
-        # Uncomment this line if magnet fails, adjust timing between 500 and 1000 ms
-        # self.movement_check_timer = QtCore.QTimer(interval=1000, timeout=self.movement_sensor.moved_)
-
-        self.camera0_thread = QtCore.QThread()
-        self.camera0.moveToThread(self.camera0_thread)
-        self.camera1_thread = QtCore.QThread()
-        self.camera1.moveToThread(self.camera1_thread)
-        self.camera2_thread = QtCore.QThread()
-        self.camera2.moveToThread(self.camera2_thread)
-
-        self.camera0_thread.start()
-        self.camera1_thread.start()
-        self.camera2_thread.start()
-
-        self.movement_sensor.moved.connect(self.movement_check_timer.stop)
-        self.movement_sensor.moved.connect(self.camera0.trigger)
-        self.movement_sensor.moved.connect(self.camera1.trigger)
-        self.movement_sensor.moved.connect(self.camera2.trigger)
-        self.movement_sensor.moved.connect(self.update_window)
-        self.movement_sensor.moved.connect(self.movement_check_timer.start)
-
-        self.movement_thread.start()
-
-        self.movement_check_timer.start()  # Don't see a need to stop/start this elsewhere
-
-        self.window.ui.focus_cameras_btn.clicked.connect(self.focus_cameras)
-
-        self.window.ui.reset_1_btn.clicked.connect(self.reset_left_camera)
-        self.window.ui.reset_2_btn.clicked.connect(self.reset_center_camera)
-        self.window.ui.reset_3_btn.clicked.connect(self.reset_right_camera)
+        # Labels are redrawn at a fixed rate from the status counters rather than on every pulse, so the window
+        # never adds work to the trigger path. Only labels whose text changed are set.
+        self.status = status.CartStatus(self.engine)
+        self.labels = {name: getattr(self.window.ui, name) for name in self.status.labels()
+                       if hasattr(self.window.ui, name)}
+        self.label_texts = {}
+        self.refresh_timer = QtCore.QTimer(interval=int(1000 / refresh_rate), timeout=self.update_window)
+        self.refresh_timer.start()
+
+        self.app.aboutToQuit.connect(self.engine.stop)
+
+        self.window.ui.focus_cameras_btn.clicked.connect(self.engine.focus_cameras)
+        self.window.ui.check_cameras_btn.clicked.connect(self.engine.check_cameras)
+        self.preview_btn = QtWidgets.QPushButton('Preview', self.window.ui.groupBox_4)
+        self.preview_btn.setCheckable(True)
+        self.preview_btn.toggled.connect(self.toggle_preview)
+        self.window.ui.verticalLayout_7.addWidget(self.preview_btn)
+
+        # One panel per camera of the array, left to right
+        self.camera_panels = []
+        for index, spec in enumerate(self.engine.camera_specs):
+            panel = CameraPanel(spec.location, self.window.ui.widget_14)
+            self.window.ui.horizontalLayout_12.addWidget(panel)
+            panel.reset_btn.clicked.connect(lambda checked, index=index: self.engine.reset_camera(index))
+            panel.transfer_photos_btn.clicked.connect(
+                lambda checked, index=index: self.engine.transfer_photos(self.engine.cameras[index]))
+            self.labels[f'photos_taken_{spec.location}'] = panel.photos_taken
+            self.labels[f'health_{spec.location}'] = panel.health
+            self.labels[f'coverage_{spec.location}'] = panel.coverage
+            self.camera_panels.append(panel)
+
+        self.engine.start()
 
     @staticmethod
     def setup_app():
@@ -114,59 +152,41 @@ class CameraCart:
 
         return app
 
-    def update_window(self):
-        self.window.ui.time_label.setText(datetime.datetime.now().strftime("%H:%M:%S"))
-        self.window.ui.distance_traveled_label.setText(str(self.movement_sensor.cumulative_distance))
-        self.window.ui.photos_taken_1.setText(str(self.camera0.triggers))
-        self.window.ui.photos_taken_2.setText(str(self.camera1.triggers))
-        self.window.ui.photos_taken_3.setText(str(self.camera2.triggers))
-        self.window.ui.latitude_label.setText('')
-        self.window.ui.longitude_label.setText('')
-
-    def focus_cameras(self):
-        CameraCart.focus(self.camera0)
-        CameraCart.focus(self.camera1)
-        CameraCart.focus(self.camera2)
+    def toggle_preview(self, checked):
+        """
+        Shows live view of every camera above its panel, e.g. while focusing.
+        """
+        if checked:
+            self.engine.start_preview(decoder=PreviewDecoder)
+        else:
+            self.engine.stop_preview()
+        for panel in self.camera_panels:
+            panel.preview.setVisible(checked)
+            panel.preview.clear()
+            panel.preview_frame = None
+
+    def update_previews(self):
+        streams = [self.engine.previews.get(spec.location) for spec in self.engine.camera_specs]
+        if not any(stream is not None and stream.is_alive() for stream in streams):
+            # Stopped by itself, e.g. because the cart moved
+            self.preview_btn.setChecked(False)
+            return
+        for panel, stream in zip(self.camera_panels, streams):
+            if stream is None:
+                continue
+            with stream.lock:
+                if stream.current is None or stream.frame_number == panel.preview_frame:
+                    continue
+                panel.preview.setPixmap(QtGui.QPixmap.fromImage(stream.frames[stream.current]))
+                panel.preview_frame = stream.frame_number
 
-    @staticmethod
-    def focus(camera):
-        
-        af_config = {'focusmode2': 0#,  # Set to AF-S
-                     #'autofocusdrive': 1  # Toggle autofocus drive
-                     }
-
-        camera.set_config(af_config)
-        
-        camera.trigger()
-
-        mf_config = {'focusmode2': 4  # Set back to MF
-                     }
-
-        camera.set_config(mf_config)
-
-    def reset_left_camera(self):
-        try:
-            self.camera0 = sensors.Camera(name='Nikon DSC D3500', location='left', config=self.d3500_config,
-                                          serial_number=3534517)
-            self.update_window()
-        except Exception as e:
-            print(f'Could not reset camera: {e}')
-
-    def reset_center_camera(self):
-        try:
-            self.camera1 = sensors.Camera(name='Nikon DSC D3300', location='center', config=self.d3300_config,
-                                          serial_number=3804012)
-            self.update_window()
-        except Exception as e:
-            print(f'Could not reset camera: {e}')
-
-    def reset_right_camera(self):
-        try:
-            self.camera2 = sensors.Camera(name='Nikon DSC D3500', location='right', config=self.d3500_config,
-                                          serial_number=3534475)
-            self.update_window()
-        except Exception as e:
-            print(f'Could not reset camera: {e}')
+    def update_window(self):
+        for name, text in self.status.labels().items():
+            if self.label_texts.get(name) != text:
+                self.labels[name].setText(text)
+                self.label_texts[name] = text
+        if self.preview_btn.isChecked():
+            self.update_previews()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,150 @@
+import collections
+import threading
+
+from sensors import gp
+
+
+class Capture:
+    """
+    A file the camera reported writing, matched to the trigger that caused it.
+    """
+
+    def __init__(self, trigger, folder, name, confirmed):
+        self.trigger = trigger
+        self.folder = folder
+        self.name = name
+        self.confirmed = confirmed  # monotonic time the FILE_ADDED event was received
+        self.extra_files = []  # e.g. the JPEG of a RAW+JPEG capture
+
+    @property
+    def latency(self):
+        """
+        Time between the camera being asked to capture and the file being reported. Includes up to one poll
+        interval of the monitor.
+        """
+        return self.confirmed - self.trigger.started
+
+    @property
+    def path(self):
+        return f"{self.folder.rstrip('/')}/{self.name}"
+
+
+class CaptureMonitor(threading.Thread):
+    """
+    Listens for FILE_ADDED events of one camera and matches them to the triggers the dispatcher issued.
+
+    The camera writes files in the order it was triggered, so files are matched to triggers in order.
+
+    The camera lock is only taken when no trigger is running or waiting, and only for poll_timeout at a time, so
+    the monitor never holds up a trigger by more than poll_timeout.
+    """
+
+    def __init__(self, camera, dispatcher, poll_timeout=0.01, poll_interval=0.02, confirm_timeout=5.0):
+        """
+        :param camera: sensors.Camera to monitor
+        :param dispatcher: triggering.TriggerDispatcher the camera is attached to
+        :param poll_timeout: seconds gp_camera_wait_for_event may wait for an event
+        :param poll_interval: seconds between polls
+        :param confirm_timeout: triggers without a file after this many seconds are reported as unconfirmed
+        """
+        super().__init__(daemon=True, name=f'{camera.location} camera capture monitor')
+        self.camera = camera
+        self.dispatcher = dispatcher
+        self.poll_timeout = poll_timeout
+        self.poll_interval = poll_interval
+        self.confirm_timeout = confirm_timeout
+
+        self.pending = collections.deque()  # triggers waiting for a file, oldest first
+        self.captures = collections.deque(maxlen=1000)
+        self.missed = collections.deque(maxlen=1000)  # triggers that did not produce a file
+        self.confirmed = 0
+        self.stop_event = threading.Event()
+
+        self.dispatcher.add_listener(self.on_trigger)
+
+    def on_trigger(self, event, camera, trigger):
+        if camera is not self.camera:
+            return
+        if event == 'started':
+            self.pending.append(trigger)
+        elif event == 'failed':
+            try:
+                self.pending.remove(trigger)
+            except ValueError:
+                pass
+
+    def trigger_waiting(self):
+        try:
+            return self.dispatcher.worker(self.camera).ready()
+        except KeyError:
+            return self.camera.trigger_lock
+
+    def poll(self):
+        """
+        Handles at most one event from the camera.
+        """
+        if self.trigger_waiting() or not self.camera.lock.acquire(blocking=False):
+            return
+        try:
+            event_type, event_data = gp.check_result(gp.gp_camera_wait_for_event(self.camera.camera,
+                                                                                 int(self.poll_timeout * 1000)))
+        finally:
+            self.camera.lock.release()
+
+        if event_type == gp.GP_EVENT_FILE_ADDED:
+            self.file_added(event_data.folder, event_data.name)
+
+    def file_added(self, folder, name):
+        now = self.dispatcher.clock()
+        stem = name.rsplit('.', 1)[0]
+        if self.captures and self.captures[-1].name.rsplit('.', 1)[0] == stem:
+            # Second file of the same capture (RAW+JPEG)
+            self.captures[-1].extra_files.append(f"{folder.rstrip('/')}/{name}")
+            return
+        trigger = self.match(now)
+        if trigger is None:
+            print(f'{self.camera.location} camera wrote {folder}/{name} without a matching trigger.')
+            return
+
+        capture = Capture(trigger, folder, name, now)
+        trigger.capture = capture
+        self.captures.append(capture)
+        self.confirmed += 1
+        self.dispatcher.notify('confirmed', self.camera, trigger)
+
+    def match(self, now):
+        """
+        Removes and returns the waiting trigger a file received at now belongs to. Triggers that have waited longer
+        than confirm_timeout cannot belong to a new file and are counted as missed first.
+        """
+        while self.pending and now - self.pending[0].started > self.confirm_timeout:
+            self.missed.append(self.pending.popleft())
+        if not self.pending:
+            return None
+        return self.pending.popleft()
+
+    def unconfirmed(self):
+        """
+        :return: list of missed triggers and triggers that have waited longer than confirm_timeout for a file
+        """
+        now = self.dispatcher.clock()
+        return list(self.missed) + [trigger for trigger in list(self.pending)
+                                    if now - trigger.started > self.confirm_timeout]
+
+    def latencies(self):
+        return [capture.latency for capture in list(self.captures)]
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.poll()
+            except Exception as e:  # gphoto error, e.g. camera disconnected
+                print(f'{self.camera.location} camera event error: {e}')
+                self.stop_event.wait(1)
+            self.stop_event.wait(self.poll_interval)
+
+    def stop(self):
+        self.stop_event.set()
+        # Stopping a monitor again does nothing
+        if self.on_trigger in self.dispatcher.listeners:
+            self.dispatcher.listeners.remove(self.on_trigger)
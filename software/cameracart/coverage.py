@@ -0,0 +1,136 @@
+"""
+Ground coverage and overlap of the photos while the cart is moving, so the cart can go as fast as the overlap allows.
+
+Every photo covers a rectangle of the ground centered under its camera (camera_array.CameraSpec.footprint). Along
+the direction of travel, each camera's coverage is kept as the merged intervals of wheel distance its confirmed
+captures cover. A capture is merged in with a bisection, and as long as the photos overlap all of them make up a
+single interval, so the map stays small however long the run is. Forward overlap is the share of a photo that the
+previous photo also covers, a gap is a stretch between two intervals that no photo covers. Across the boom, the side
+overlap of neighbouring cameras follows from their offsets and footprints and does not change during a run.
+"""
+import bisect
+import threading
+
+
+class CoverageMap:
+    """
+    Distances covered by one camera's photos, as sorted, disjoint intervals.
+    """
+
+    def __init__(self, length):
+        """
+        :param length: length of a photo's footprint along the direction of travel in centimeters
+        """
+        self.length = length
+        self.starts = []
+        self.ends = []
+
+    def add(self, position):
+        """
+        :param position: distance in centimeters at the middle of the photo
+        """
+        start = position - self.length / 2
+        end = position + self.length / 2
+        # Intervals i to j - 1 touch the new one and are merged with it
+        i = bisect.bisect_left(self.ends, start)
+        j = bisect.bisect_right(self.starts, end)
+        if i < j:
+            start = min(start, self.starts[i])
+            end = max(end, self.ends[j - 1])
+        self.starts[i:j] = [start]
+        self.ends[i:j] = [end]
+
+    def gaps(self, ignore=None):
+        """
+        :param ignore: function of a distance, True if a gap around it is intended (e.g. an alley that was skipped)
+        :return: list of (start, end) of the stretches no photo covers, between the first and the last photo
+        """
+        return [(end, start) for end, start in zip(self.ends[:-1], self.starts[1:])
+                if ignore is None or not ignore((end + start) / 2)]
+
+    def covered(self):
+        """
+        :return: centimeters covered by at least one photo
+        """
+        return sum(end - start for start, end in zip(self.starts, self.ends))
+
+
+class CoverageMonitor:
+    """
+    Engine observer that adds every confirmed capture to its camera's CoverageMap. Cameras without a footprint
+    (no height or lens in cameras.json) are not followed.
+    """
+
+    def __init__(self, specs, skip=None, min_overlap=0.6):
+        """
+        :param specs: list of camera_array.CameraSpec, left to right
+        :param skip: function of a distance, True where no photos are taken on purpose, gaps there are not reported
+        :param min_overlap: forward overlap below which a camera's status warns
+        """
+        self.skip = skip
+        self.min_overlap = min_overlap
+        self.lock = threading.Lock()
+        self.maps = {}  # camera location -> CoverageMap
+        self.last_position = {}  # camera location -> distance of the last capture
+        self.overlaps = {}  # camera location -> forward overlap of the last two captures, negative for a gap
+        for spec in specs:
+            footprint = spec.footprint()
+            if footprint is not None:
+                self.maps[spec.location] = CoverageMap(footprint[1])
+
+        self.side_overlaps = []  # (left camera location, right camera location, share of the narrower footprint)
+        placed = [(spec.offset, spec.location, spec.footprint()[0]) for spec in specs
+                  if spec.offset is not None and spec.footprint() is not None]
+        for (left, left_location, left_width), (right, right_location, right_width) in zip(placed, placed[1:]):
+            shared = (left + left_width / 2) - (right - right_width / 2)
+            self.side_overlaps.append((left_location, right_location, shared / min(left_width, right_width)))
+
+    def on_trigger(self, event, camera, trigger):
+        if event != 'confirmed' or trigger.position is None or camera.location not in self.maps:
+            return
+        with self.lock:
+            coverage = self.maps[camera.location]
+            coverage.add(trigger.position)
+            last = self.last_position.get(camera.location)
+            # Frames of a burst are taken at the same position and do not change the overlap
+            if last is not None and trigger.position != last:
+                self.overlaps[camera.location] = 1 - abs(trigger.position - last) / coverage.length
+            self.last_position[camera.location] = trigger.position
+
+    def gaps(self, location):
+        """
+        :return: list of (start, end) in centimeters of the stretches the camera's photos missed
+        """
+        with self.lock:
+            if location not in self.maps:
+                return []
+            return self.maps[location].gaps(self.skip)
+
+    def status(self, location):
+        """
+        :return: text for a camera's coverage label, '' if its footprint is not known
+        """
+        if location not in self.maps:
+            return ''
+        gaps = self.gaps(location)
+        overlap = self.overlaps.get(location)
+        text = 'Overlap ' + ('-' if overlap is None else f'{overlap:.0%}')
+        if overlap is not None and overlap < self.min_overlap:
+            text += ' (slow down)'
+        if gaps:
+            length = sum(end - start for start, end in gaps) / 100
+            text += f", {len(gaps)} gap{'s' if len(gaps) > 1 else ''} ({length:.1f} m)"
+        return text
+
+    def summary(self):
+        """
+        :return: lines describing every camera's coverage and the side overlaps, e.g. for the end of a run
+        """
+        lines = []
+        for location, coverage in self.maps.items():
+            with self.lock:
+                covered = coverage.covered() / 100
+            lines.append(f'{location} camera: {covered:.1f} m covered, {self.status(location)}')
+        for left, right, overlap in self.side_overlaps:
+            lines.append(f'{left} and {right} cameras overlap {overlap:.0%} across the boom')
+        return lines
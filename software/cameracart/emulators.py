@@ -1,11 +1,30 @@
+import collections
+import math
 import time
 import random
+import threading
+import types
+
+import exif
 
 class GPIOSimulator:
-    def __init__(self):
+    def __init__(self, delay=.4, seed=None):
+        """
+        :param delay: seconds input() takes for pins without a simulated level
+        :param seed: random seed for input(), so that runs can be repeated
+        """
         self.BCM = None
         self.IN = None
         self.PUD_DOWN = None
+        self.RISING = 'rising'
+        self.FALLING = 'falling'
+        self.BOTH = 'both'
+
+        self.levels = {}  # pin -> simulated level, only set while edges are being generated
+        self.callbacks = {}  # pin -> (edge, callback)
+        self.edge_threads = {}
+        self.delay = delay
+        self.random = random.Random(seed)
 
     def setmode(self, input1):
         pass
@@ -13,31 +32,760 @@ class GPIOSimulator:
     def setup(self, input1=None, input2=None, pull_up_down=None):
         pass
 
-    @staticmethod
-    def input(pin):
-        time.sleep(.4)
-        random_choice = random.choice([True, False])
+    def input(self, pin):
+        if pin in self.levels:
+            return self.levels[pin]
+        time.sleep(self.delay)
+        random_choice = self.random.choice([True, False])
         return random_choice
 
-class GPSSimulator:
-    def __init__(self):
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        self.callbacks[pin] = (edge, callback)
+
+    def remove_event_detect(self, pin):
+        self.callbacks.pop(pin, None)
+
+    def set_level(self, pin, level):
+        """
+        Sets the simulated level of a pin and runs the registered callback if the change matches its edge.
+        """
+        previous = self.levels.get(pin, False)
+        self.levels[pin] = level
+        if pin not in self.callbacks or previous == level:
+            return
+        edge, callback = self.callbacks[pin]
+        if callback is None:
+            return
+        if edge == self.BOTH or (edge == self.RISING and level) or (edge == self.FALLING and not level):
+            callback(pin)
+
+    def generate_edges(self, pin, period, count=None, pulse_width=0.01, jitter=0, bounces=0, bounce_interval=0.0005,
+                       seed=None):
+        """
+        Generates magnet pulses on a pin from a background thread, like a wheel turning at a constant speed.
+        :param pin: GPIO pin
+        :param period: time in seconds between rising edges
+        :param count: number of pulses, None to run until stop_edges is called
+        :param pulse_width: time in seconds the pin stays high
+        :param jitter: standard deviation in seconds added to each period
+        :param bounces: number of extra contact bounces after each rising edge
+        :param bounce_interval: time in seconds between bounces
+        :param seed: random seed, so that jittered runs can be repeated
+        :return: threading.Thread generating the edges
+        """
+        rng = random.Random(seed)
+        stop = threading.Event()
+
+        def run():
+            next_edge = time.monotonic()
+            n = 0
+            while not stop.is_set() and (count is None or n < count):
+                delay = next_edge - time.monotonic()
+                if delay > 0 and stop.wait(delay):
+                    break
+                self.set_level(pin, True)
+                for _ in range(bounces):
+                    time.sleep(bounce_interval)
+                    self.set_level(pin, False)
+                    time.sleep(bounce_interval)
+                    self.set_level(pin, True)
+                time.sleep(pulse_width)
+                self.set_level(pin, False)
+                n += 1
+                next_edge += max(period + rng.gauss(0, jitter) if jitter else period, pulse_width)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.stop = stop
+        self.edge_threads[pin] = thread
+        thread.start()
+        return thread
+
+    def stop_edges(self, pin):
+        thread = self.edge_threads.pop(pin, None)
+        if thread is not None:
+            thread.stop.set()
+            thread.join()
+
+
+class SimulatedSerial:
+    """
+    Serial port with a GPS on it that streams GGA and RMC sentences for a cart driving in a straight line.
+    """
+
+    def __init__(self, simulator, port, baudrate=9600, timeout=None):
+        self.simulator = simulator
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.interval = 1.0  # seconds between fixes, changed with PMTK220
+        self.lines = collections.deque()
+        self.next_fix = time.monotonic()
+        self.written = []
+
+    def write(self, data):
+        self.written.append(data)
+        command = data.decode('ascii').strip().lstrip('$').split('*')[0].split(',')
+        if command[0] == 'PMTK220':
+            self.interval = int(command[1]) / 1000
+        return len(data)
+
+    def flush(self):
         pass
 
-    class GPS():
-        def __init__(self, arg, **kwargs):
-            pass
+    def close(self):
+        pass
 
-        def send_command(self, bytes):
-            if bytes == b'PMTK220, 1000':
-                pass
+    def readline(self):
+        if not self.lines:
+            delay = self.next_fix - time.monotonic()
+            if self.timeout is not None and delay > self.timeout:
+                time.sleep(self.timeout)
+                return b''
+            if delay > 0:
+                time.sleep(delay)
+            self.lines.extend(self.simulator.sentences(time.time()))
+            self.next_fix = max(self.next_fix + self.interval, time.monotonic())
+        return self.lines.popleft()
 
-        def update(self):
-            print('GPS')
 
 class SerialSimulatior:
+    def __init__(self, latitude=32.2806, longitude=-106.7479, speed=0.5, course=0.0):
+        """
+        :param latitude: where the simulated cart starts, decimal degrees
+        :param longitude: decimal degrees
+        :param speed: meters per second
+        :param course: degrees from true north
+        """
+        self.latitude = latitude
+        self.longitude = longitude
+        self.speed = speed
+        self.course = course
+        self.start = time.time()
+
+    def Serial(self, port, baudrate=9600, timeout=None, **kwargs):
+        return SimulatedSerial(self, port, baudrate, timeout)
+
+    def position(self, t):
+        meters = self.speed * (t - self.start)
+        north = meters * math.cos(math.radians(self.course))
+        east = meters * math.sin(math.radians(self.course))
+        return (self.latitude + north / 110540.0,
+                self.longitude + east / (111320.0 * math.cos(math.radians(self.latitude))))
+
+    @staticmethod
+    def sentence(body):
+        checksum = 0
+        for char in body.encode('ascii'):
+            checksum ^= char
+        return f'${body}*{checksum:02X}\r\n'.encode('ascii')
+
+    @staticmethod
+    def coordinate(value, digits):
+        degrees = int(abs(value))
+        return f'{degrees:0{digits}d}{(abs(value) - degrees) * 60:08.5f}'
+
+    def sentences(self, t):
+        """
+        :return: GGA and RMC sentences for unix time t
+        """
+        latitude, longitude = self.position(t)
+        utc = time.gmtime(t)
+        hhmmss = time.strftime('%H%M%S', utc) + f'.{int(t % 1 * 1000):03d}'
+        lat = f"{self.coordinate(latitude, 2)},{'N' if latitude >= 0 else 'S'}"
+        lon = f"{self.coordinate(longitude, 3)},{'E' if longitude >= 0 else 'W'}"
+        knots = self.speed / 0.514444
+        return [self.sentence(f'GPRMC,{hhmmss},A,{lat},{lon},{knots:.2f},{self.course:.2f},'
+                              f"{time.strftime('%d%m%y', utc)},,,A"),
+                self.sentence(f'GPGGA,{hhmmss},{lat},{lon},1,09,0.9,1189.0,M,-22.0,M,,')]
+
+
+class GPhoto2Error(Exception):
+    messages = {-2: 'Bad parameters', -7: 'I/O problem', -52: 'Could not find the requested device on the USB port',
+                -53: 'Could not claim the USB device', -105: 'Unknown model', -108: 'File not found',
+                -110: 'I/O in progress'}
+
+    def __init__(self, code):
+        self.code = code
+        super().__init__(f'[{code}] {self.messages.get(code, "Unspecified error")}')
+
+
+class SimulatedWidget:
+    def __init__(self, name, widget_type, value=None, choices=(), children=()):
+        self.name = name
+        self.type = widget_type
+        self.value = value
+        self.choices = list(choices)
+        self.children = list(children)
+        self.changed = 0
+
+    def copy(self):
+        widget = SimulatedWidget(self.name, self.type, self.value, self.choices, [child.copy()
+                                                                                  for child in self.children])
+        return widget
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+
+class SimulatedCameraFilePath:
+    def __init__(self, folder, name):
+        self.folder = folder
+        self.name = name
+
+
+class SimulatedCameraFile:
+    def __init__(self, data):
+        self.data = data
+
+
+class SimulatedCameraDevice:
+    """
+    A camera on the simulated USB bus, with a latency and failure model.
+    """
+
+    # Choice lists in the order of the Nikon D3500, so the indices in CameraCart's configs mean the same thing
+    CHOICES = {'capturetarget': ['Internal RAM', 'Memory card'],
+               'autofocus': ['On', 'Off'],
+               'focusmode': ['Manual', 'Automatic', 'AF-S', 'AF-C', 'AF-A'],
+               'focusmode2': ['AF-S', 'AF-C', 'AF-A', 'MF (fixed)', 'MF (selection)'],
+               'capturemode': ['Single Shot', 'Burst', 'Continuous Low Speed', 'Timer', 'Quiet Release'],
+               'whitebalance': ['Automatic', 'Daylight', 'Fluorescent', 'Tungsten', 'Flash', 'Cloudy', 'Shade'],
+               'iso': ['100', '200', '400', '800', '1600', '3200', '6400', '12800', '25600'],
+               'imagesize': ['6000x4000', '4496x3000', '2992x2000'],
+               'isoauto': ['On', 'Off'],
+               'autoiso': ['On', 'Off'],
+               'shutterspeed': ['1/4000', '1/3200', '1/2500', '1/2000', '1/1600', '1/1250', '1/1000', '1/800',
+                                '1/640', '1/500', '1/400', '1/320', '1/250', '1/200', '1/160', '1/125', '1/100',
+                                '1/80', '1/60', '1/30', '1/15', '1/8', '1/4', '1/2', '1'],
+               'f-number': ['f/3.5', 'f/4', 'f/4.5', 'f/5', 'f/5.6', 'f/6.3', 'f/7.1', 'f/8', 'f/9', 'f/10',
+                            'f/11', 'f/13', 'f/16', 'f/22'],
+               'assistlight': ['On', 'Off']}
+
+    def __init__(self, model, port, serial_number, capture_latency=0.08, write_time=0.25, buffer_depth=6,
+                 usb_throughput=30e6, round_trip=0.02, file_size=2 * 1024 * 1024, trigger_error_rate=0.0,
+                 claim_errors=0, clock_offset=0.0, card_capacity=32e9, ram_write_time=0.05, seed=None,
+                 clock=time.monotonic, sleep=time.sleep):
+        """
+        :param model: model name as reported by autodetect, e.g. 'Nikon DSC D3500'
+        :param port: USB port, e.g. 'usb:001,004'
+        :param serial_number: serial number as an int
+        :param capture_latency: seconds trigger_capture takes, the exposure happens at its end
+        :param write_time: seconds to write one frame from the buffer to the card
+        :param buffer_depth: frames the camera can hold before it reports busy
+        :param usb_throughput: bytes per second for file downloads
+        :param round_trip: seconds for one USB request (config get/set, listing, events)
+        :param file_size: bytes per photo
+        :param trigger_error_rate: probability of trigger_capture failing with an I/O error
+        :param claim_errors: number of times opening the camera fails with [-53] Could not claim the USB device
+        :param clock_offset: seconds the camera's clock is ahead of the host's
+        :param card_capacity: bytes on the memory card
+        :param ram_write_time: seconds until a frame captured to Internal RAM can be downloaded. Frames stay in the
+        buffer until they are deleted.
+        :param seed: random seed for error injection
+        :param clock: monotonic clock the capture and write times are measured with
+        :param sleep: function waiting a number of seconds on that clock, e.g. replay.ReplayClock.sleep
+        """
+        self.model = model
+        self.port = port
+        self.serial_number = serial_number
+        self.capture_latency = capture_latency
+        self.write_time = write_time
+        self.buffer_depth = buffer_depth
+        self.usb_throughput = usb_throughput
+        self.round_trip = round_trip
+        self.file_size = file_size
+        self.trigger_error_rate = trigger_error_rate
+        self.claim_errors = claim_errors
+        self.clock_offset = clock_offset
+        self.card_capacity = card_capacity
+        self.ram_write_time = ram_write_time
+        self.random = random.Random(seed)
+        self.clock = clock
+        self.sleep = sleep
+
+        self.connected = True
+        self.owner = None  # SimulatedCamera that has the device open
+        self.lock = threading.RLock()
+        self.config = SimulatedWidget('main', 0, children=[
+            SimulatedWidget('settings', 1, children=[
+                SimulatedWidget('datetime', 8, int(time.time())),
+                SimulatedWidget('capturetarget', 5, 'Memory card', self.CHOICES['capturetarget']),
+                SimulatedWidget('autofocusdrive', 4, 0),
+                SimulatedWidget('viewfinder', 4, 0)]),
+            SimulatedWidget('status', 1, children=[
+                SimulatedWidget('serialnumber', 2, f'{serial_number:032d}'),
+                SimulatedWidget('batterylevel', 2, '100%'),
+                SimulatedWidget('availableshots', 2, '2000')]),
+            SimulatedWidget('capturesettings', 1, children=[
+                SimulatedWidget(name, 5, choices[0], choices) for name, choices in self.CHOICES.items()
+                if name != 'capturetarget'])])
+
+        self.card_folder = '/store_00010001/DCIM/100NIKON'
+        self.folders = {'/': ['store_00010001'], '/store_00010001': ['DCIM'], '/store_00010001/DCIM': ['100NIKON']}
+        self.files = {}  # (folder, name) -> size
+        self.mtimes = {}  # (folder, name) -> camera clock at the exposure, whole seconds
+        self.headers = {}  # (folder, name) -> EXIF header at the start of the file
+        self.file_number = 0
+        self.buffer = []  # (time the frame is written, folder, name)
+        self.events = collections.deque()
+
+        self.round_trips = 0
+        self.exposures = []  # monotonic time of every exposure
+        self.focused = False
+        self.preview_frames = 0
+
+    def usb_request(self, duration=None):
+        if not self.connected:
+            raise GPhoto2Error(-52)
+        self.round_trips += 1
+        self.sleep(self.round_trip if duration is None else duration)
+
+    def unplug(self):
+        with self.lock:
+            self.connected = False
+
+    def plug(self, port=None):
+        """
+        Reconnects the camera, a camera that is plugged in again usually gets a new USB port.
+        """
+        with self.lock:
+            if port is not None:
+                self.port = port
+            self.buffer = []
+            self.events.clear()
+            self.owner = None
+            self.connected = True
+
+    def open(self, owner=None):
+        """
+        :param owner: camera handle opening the device, a device that another open handle has claimed fails with -53
+        like a real USB device
+        """
+        if not self.connected:
+            raise GPhoto2Error(-52)
+        if owner is not None and self.owner is not None and self.owner is not owner:
+            raise GPhoto2Error(-53)
+        if self.claim_errors > 0:
+            self.claim_errors -= 1
+            raise GPhoto2Error(-53)
+        self.owner = owner
+
+    def close(self, owner):
+        if self.owner is owner:
+            self.owner = None
+
+    def camera_time(self):
+        return time.time() + self.clock_offset
+
+    def value(self, name):
+        for widget in self.config.walk():
+            if widget.name == name:
+                return widget.value
+
+    def write_buffer(self):
+        """
+        Moves frames whose write time has passed from the buffer to storage and queues FILE_ADDED events.
+        """
+        now = self.clock()
+        while self.buffer and self.buffer[0][0] <= now:
+            _, folder, name = self.buffer.pop(0)
+            self.files[(folder, name)] = self.file_size
+            self.events.append((2, SimulatedCameraFilePath(folder, name)))
+
+    def trigger_capture(self):
+        with self.lock:
+            self.usb_request(self.capture_latency)
+            self.write_buffer()
+            to_ram = self.value('capturetarget') == 'Internal RAM'
+            in_ram = sum(1 for folder, _ in self.files if folder == '/')
+            if len(self.buffer) + in_ram >= self.buffer_depth:
+                raise GPhoto2Error(-110)
+            if self.random.random() < self.trigger_error_rate:
+                raise GPhoto2Error(-7)
+
+            now = self.clock()
+            self.exposures.append(now)
+            self.file_number += 1
+            if to_ram:
+                folder, name = '/', f'capt{self.file_number:04d}.nef'
+            else:
+                folder, name = self.card_folder, f'DSC_{self.file_number % 10000:04d}.NEF'
+            camera_time = self.camera_time()
+            self.mtimes[(folder, name)] = int(camera_time)
+            self.headers[(folder, name)] = exif.write_tiff_header({
+                'model': self.model.replace('Nikon DSC ', 'NIKON '),
+                'datetime_original': time.strftime('%Y:%m:%d %H:%M:%S', time.gmtime(camera_time)),
+                'subsec': f'{int(camera_time % 1 * 100):02d}',
+                'serial_number': self.serial_number,
+                'shutter_count': self.file_number})
+            if to_ram:
+                self.buffer.append((now + self.ram_write_time, folder, name))
+            else:
+                write_start = max([now] + [frame[0] for frame in self.buffer if frame[1] != '/'])
+                self.buffer.append((write_start + self.write_time, folder, name))
+            self.buffer.sort()
+            return SimulatedCameraFilePath(folder, name)
+
+    def wait_for_event(self, timeout):
+        """
+        :param timeout: milliseconds
+        """
+        deadline = self.clock() + timeout / 1000
+        while True:
+            with self.lock:
+                if not self.connected:
+                    raise GPhoto2Error(-52)
+                self.write_buffer()
+                if self.events:
+                    self.round_trips += 1
+                    return self.events.popleft()
+                next_write = self.buffer[0][0] if self.buffer else deadline
+            remaining = min(deadline, next_write) - self.clock()
+            if self.clock() >= deadline:
+                return 1, None  # GP_EVENT_TIMEOUT
+            self.sleep(max(remaining, 0.001))
+
+    def capture(self):
+        path = self.trigger_capture()
+        while True:
+            event_type, data = self.wait_for_event(1000)
+            if event_type == 2 and data.name == path.name:
+                return path
+
+    def file_data(self, folder, name, offset, length):
+        """
+        Deterministic file contents after the EXIF header, so downloads can be verified without storing them.
+        """
+        start = (offset + len(name)) % 251
+        data = (bytes(range(251)) * ((start + length) // 251 + 1))[start:start + length]
+        header = self.headers.get((folder, name), b'')[offset:offset + length]
+        return header + data[len(header):]
+
+    def read_file(self, folder, name, offset, buffer):
+        with self.lock:
+            self.write_buffer()
+            if (folder, name) not in self.files:
+                raise GPhoto2Error(-108)
+            size = self.files[(folder, name)]
+            length = max(min(len(buffer), size - offset), 0)
+            self.usb_request(self.round_trip + length / self.usb_throughput)
+            buffer[:length] = self.file_data(folder, name, offset, length)
+            return length
+
+    def delete_file(self, folder, name):
+        with self.lock:
+            self.usb_request()
+            if self.files.pop((folder, name), None) is None:
+                raise GPhoto2Error(-108)
+
+    def list_files(self, folder):
+        with self.lock:
+            self.usb_request()
+            self.write_buffer()
+            return sorted(name for folder_, name in self.files if folder_ == folder)
+
+    def list_folders(self, folder):
+        with self.lock:
+            self.usb_request()
+            return list(self.folders.get(folder.rstrip('/') or '/', []))
+
+    def capture_preview(self, width=320, height=212):
+        """
+        Live view frame as a PGM image, which Qt decodes like the cameras' JPEGs. Stripes move with every frame and
+        only have full contrast once the camera has autofocused.
+        """
+        with self.lock:
+            self.usb_request(self.round_trip + width * height / self.usb_throughput)
+            self.widget('viewfinder').value = 1
+            self.preview_frames += 1
+            low, high = (0, 255) if self.focused else (96, 160)
+            row = bytes(high if (x + self.preview_frames * 4) // 16 % 2 else low for x in range(width))
+            return b'P5 %d %d 255\n' % (width, height) + row * height
+
+    def storage_info(self):
+        with self.lock:
+            self.usb_request()
+            self.write_buffer()
+            capacity = int(self.card_capacity // 1024)
+            free = capacity - sum(self.files.values()) // 1024
+        return [types.SimpleNamespace(capacitykbytes=capacity, freekbytes=free)]
+
+    def summary(self):
+        return (f'Manufacturer: Nikon Corporation\nModel: {self.model.replace("Nikon DSC ", "")}\n'
+                f'  Version: V1.00\n  Serial Number: {self.serial_number:032d}\n')
+
+    def widget(self, name):
+        for widget in self.config.walk():
+            if widget.name == name:
+                return widget
+        raise GPhoto2Error(-2)
+
+    def get_config(self, name=None):
+        """
+        :param name: only return this widget (gp_camera_get_single_config)
+        """
+        with self.lock:
+            self.usb_request()
+            self.widget('datetime').value = int(self.camera_time())
+            if name is not None:
+                return self.widget(name).copy()
+            return self.config.copy()
+
+    def set_config(self, tree):
+        with self.lock:
+            self.usb_request()
+            current = {widget.name: widget for widget in self.config.walk()}
+            for widget in tree.walk():
+                if widget.changed:
+                    if widget.choices and widget.value not in widget.choices:
+                        raise GPhoto2Error(-2)
+                    current[widget.name].value = widget.value
+                    if widget.name == 'datetime':
+                        self.clock_offset = widget.value - time.time()
+                    elif widget.name == 'autofocusdrive' and widget.value:
+                        self.focused = True
+                        current[widget.name].value = 0
+
+
+class SimulatedGPCamera:
+    """
+    Stand-in for gphoto2.Camera, bound to a SimulatedCameraDevice through its port.
+    """
+
+    simulator = None
+
     def __init__(self):
+        self.port = None
+        self.model = None
+        self.opened = False
+
+    @classmethod
+    def autodetect(cls):
+        return [(device.model, device.port) for device in cls.simulator.devices if device.connected]
+
+    def set_port_info(self, port_info):
+        self.port = port_info
+
+    def set_abilities(self, abilities):
+        self.model = abilities
+
+    @property
+    def device(self):
+        device = self.simulator.device(self.port)
+        if device is None or device.model != self.model:
+            raise GPhoto2Error(-52)
+        if not self.opened:
+            device.open(self)
+            self.opened = True
+        return device
+
+    def init(self):
+        self.device
+
+    def exit(self):
+        device = self.simulator.device(self.port)
+        if device is not None:
+            device.close(self)
+        self.opened = False
+
+    def get_summary(self):
+        return self.device.summary()
+
+    def trigger_capture(self):
+        self.device.trigger_capture()
+
+    def capture(self, capture_type):
+        return self.device.capture()
+
+    def wait_for_event(self, timeout):
+        return self.device.wait_for_event(timeout)
+
+
+class SimulatedList(list):
+    def load(self):
         pass
 
-    class Serial():
-        def __init__(self, arg, **kwargs):
-            pass
\ No newline at end of file
+    def lookup_path(self, path):
+        return self.index(path)
+
+    def lookup_model(self, model):
+        return self.index(model)
+
+
+class GPhoto2Simulator:
+    """
+    Drop-in replacement for the parts of the gphoto2 module used by sensors.Camera, backed by simulated cameras.
+
+    By default the bus holds the cart's three cameras, so CameraCart runs on any machine.
+    """
+
+    GP_WIDGET_WINDOW = 0
+    GP_WIDGET_SECTION = 1
+    GP_WIDGET_TEXT = 2
+    GP_WIDGET_RANGE = 3
+    GP_WIDGET_TOGGLE = 4
+    GP_WIDGET_RADIO = 5
+    GP_WIDGET_MENU = 6
+    GP_WIDGET_BUTTON = 7
+    GP_WIDGET_DATE = 8
+
+    GP_EVENT_UNKNOWN = 0
+    GP_EVENT_TIMEOUT = 1
+    GP_EVENT_FILE_ADDED = 2
+    GP_EVENT_CAPTURE_COMPLETE = 4
+
+    GP_CAPTURE_IMAGE = 0
+    GP_FILE_TYPE_PREVIEW = 0
+    GP_FILE_TYPE_NORMAL = 1
+
+    GP_ERROR_IO = -7
+    GP_ERROR_IO_USB_FIND = -52
+    GP_ERROR_IO_USB_CLAIM = -53
+    GP_ERROR_CAMERA_BUSY = -110
+
+    GPhoto2Error = GPhoto2Error
+
+    def __init__(self, devices=None):
+        if devices is None:
+            devices = [SimulatedCameraDevice('Nikon DSC D3500', 'usb:001,004', 3534517),
+                       SimulatedCameraDevice('Nikon DSC D3300', 'usb:001,005', 3804012),
+                       SimulatedCameraDevice('Nikon DSC D3500', 'usb:001,006', 3534475)]
+        self.devices = list(devices)
+        self.Camera = type('Camera', (SimulatedGPCamera,), {'simulator': self})
+
+    def device(self, port):
+        for device in self.devices:
+            if device.port == port and device.connected:
+                return device
+
+    def add_device(self, device):
+        self.devices.append(device)
+
+    def set_clock(self, clock=time.monotonic, sleep=time.sleep):
+        """
+        Sets the clock and sleep function of every device, e.g. those of a replay.ReplayClock so that captures and
+        buffer writes take replay time. Called without arguments, the devices go back to real time.
+        """
+        for device in self.devices:
+            device.clock = clock
+            device.sleep = sleep
+
+    def PortInfoList(self):
+        return SimulatedList(device.port for device in self.devices)
+
+    def CameraAbilitiesList(self):
+        return SimulatedList(sorted({device.model for device in self.devices}))
+
+    @staticmethod
+    def check_result(result):
+        return result
+
+    @staticmethod
+    def gp_camera_get_config(camera):
+        return camera.device.get_config()
+
+    @staticmethod
+    def gp_camera_get_single_config(camera, name):
+        return camera.device.get_config(name)
+
+    @staticmethod
+    def gp_camera_set_config(camera, tree):
+        camera.device.set_config(tree)
+
+    @staticmethod
+    def gp_camera_capture(camera, capture_type):
+        return camera.capture(capture_type)
+
+    @staticmethod
+    def gp_camera_trigger_capture(camera):
+        camera.trigger_capture()
+
+    @staticmethod
+    def gp_camera_wait_for_event(camera, timeout):
+        return camera.wait_for_event(timeout)
+
+    @staticmethod
+    def gp_camera_folder_list_files(camera, folder):
+        return [(name, None) for name in camera.device.list_files(folder)]
+
+    @staticmethod
+    def gp_camera_folder_list_folders(camera, folder):
+        return [(name, None) for name in camera.device.list_folders(folder)]
+
+    @staticmethod
+    def gp_camera_file_get_info(camera, folder, name):
+        device = camera.device
+        with device.lock:
+            device.usb_request()
+            device.write_buffer()
+            if (folder, name) not in device.files:
+                raise GPhoto2Error(-108)
+            size = device.files[(folder, name)]
+            mtime = device.mtimes.get((folder, name), 0)
+        return types.SimpleNamespace(file=types.SimpleNamespace(size=size, mtime=mtime))
+
+    @staticmethod
+    def gp_camera_capture_preview(camera):
+        return SimulatedCameraFile(camera.device.capture_preview())
+
+    @staticmethod
+    def gp_file_get_data_and_size(camera_file):
+        return memoryview(camera_file.data)
+
+    @staticmethod
+    def gp_camera_get_storageinfo(camera):
+        return camera.device.storage_info()
+
+    @staticmethod
+    def gp_camera_file_read(camera, folder, name, file_type, offset, buffer):
+        return camera.device.read_file(folder, name, offset, buffer)
+
+    @staticmethod
+    def gp_camera_file_delete(camera, folder, name):
+        camera.device.delete_file(folder, name)
+
+    @staticmethod
+    def gp_widget_count_children(widget):
+        return len(widget.children)
+
+    @staticmethod
+    def gp_widget_get_child(widget, index):
+        return widget.children[index]
+
+    @staticmethod
+    def gp_widget_get_child_by_name(widget, name):
+        for child in widget.walk():
+            if child.name == name:
+                return child
+        raise GPhoto2Error(-2)
+
+    @staticmethod
+    def gp_widget_get_name(widget):
+        return widget.name
+
+    @staticmethod
+    def gp_widget_get_type(widget):
+        return widget.type
+
+    @staticmethod
+    def gp_widget_count_choices(widget):
+        return len(widget.choices)
+
+    @staticmethod
+    def gp_widget_get_choice(widget, index):
+        return widget.choices[index]
+
+    @staticmethod
+    def gp_widget_get_value(widget):
+        return widget.value
+
+    @staticmethod
+    def gp_widget_set_value(widget, value):
+        widget.value = value
+        widget.changed = 1
+
+    @staticmethod
+    def gp_widget_set_changed(widget, changed):
+        widget.changed = changed
@@ -0,0 +1,485 @@
+"""
+Headless cart runtime.
+
+CartEngine owns the movement sensor, cameras, trigger dispatcher, GPS and session log and has no Qt dependency, so
+the cart can run over SSH or as a systemd service:
+
+    python engine.py nmsu_2023
+
+The GUI (cameracart.CameraCart) is one of possibly several observers of the engine.
+"""
+import argparse
+import datetime
+import os
+import signal
+import threading
+import time
+
+import camera_array
+import capture_monitor
+import coverage
+import field
+import gps
+import health
+import host_capture
+import ingest
+import preview
+import sensors
+import session
+import supervisor
+import timesync
+import transfer
+import triggering
+
+
+class CartEngine:
+    """
+    Everything the cart needs to take photos, without a user interface.
+
+    Observers are objects with any of the methods on_pulse(pulse_time, distance), on_trigger(event, camera, trigger),
+    on_gps(latitude, longitude) and on_camera_changed(index, camera), camera is None while it reconnects. They are
+    called from the sensor and camera threads, so they should return quickly and leave any slow work to their own
+    thread (the GUI only updates status.CartStatus counters and redraws on its own timer).
+    """
+
+    def __init__(self, field_name, movement_mode=sensors.MovementSensor.EDGE, photo_spacing=None, cameras=None,
+                 use_gps=False, gps_rate=10, location=None,
+                 pps_pin=None, ntp_server=None, layout=None, skip_alleys=False, alley_margin=0.0,
+                 capture_to_host=False, in_flight=2, set_camera_clocks=False):
+        """
+        :param field_name: name of the field being photographed
+        :param movement_mode: sensors.MovementSensor.EDGE or sensors.MovementSensor.POLL
+        :param photo_spacing: distance between photos in centimeters. If None, cameras are triggered on every wheel
+        pulse, otherwise captures are scheduled ahead of time so exposures land every photo_spacing centimeters.
+        :param cameras: list of camera_array.CameraSpec, defaults to the cameras in cameras.json
+        :param use_gps: read the GPS on the serial port
+        :param gps_rate: GPS fixes per second
+        :param location: (latitude, longitude) of the field, used for the sun position until there is a GPS fix
+        :param pps_pin: BCM pin the GPS's PPS output is connected to, if any
+        :param ntp_server: NTP server to try in the background, if the cart may have a network
+        :param layout: field.FieldLayout, defaults to fields/<field_name>.json if there is one
+        :param skip_alleys: take no photos in the alleys between ranges of the layout
+        :param alley_margin: centimeters from the nearest plot a photo is still taken, e.g. half its footprint
+        :param capture_to_host: capture to the cameras' RAM and download every photo right away instead of writing
+        to the cards, see host_capture
+        :param in_flight: with capture_to_host, captures per camera that may wait for their download
+        :param set_camera_clocks: set camera clocks that are more than a second off to UTC once the host clock is
+        synchronized, otherwise only their offsets are logged
+        """
+        # Colons in time replaced with hyphen due to colon being a prohibited character in file names in Windows
+        self.time = datetime.datetime.now().strftime("T%H-%M-%SZ")
+
+        self.field_name = field_name
+        self.location = location
+        self.photo_directory = os.path.join(os.path.expanduser('~'), 'CameraCart', field_name)
+        self.observers = []
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+
+        self.movement_sensor = sensors.MovementSensor(gpio_pin=10, movement_distance=19.5, mode=movement_mode)
+        self.movement_sensor.add_listener(self.on_pulse)
+
+        # Every pulse, trigger and capture is appended to the session log, so a crash does not lose the run
+        self.session_name = datetime.datetime.now().strftime('%Y-%m-%d') + self.time
+        self.recorder = session.SessionRecorder(os.path.join(self.photo_directory, 'sessions',
+                                                             f'{self.session_name}.ccsession'),
+                                                clock=self.movement_sensor.clock,
+                                                metadata={'field_name': field_name})
+
+        # Each camera gets its own worker thread and bounded trigger queue. If a camera is still busy when the
+        # next pulse arrives, only the latest trigger is kept and the others are counted as dropped. The workers
+        # release the cameras of a pulse together and the skew between them is logged for every shot.
+        # A capture monitor per camera confirms that every trigger actually produced a file.
+        self.layout = field.load(field_name) if layout is None else layout
+        skip = None
+        if skip_alleys and self.layout is not None:
+            skip = lambda position: self.layout.in_alley(position, alley_margin)
+        self.trigger_dispatcher = triggering.TriggerDispatcher(clock=self.movement_sensor.clock, skip=skip)
+        self.trigger_dispatcher.add_listener(self.recorder.on_trigger)
+        self.trigger_dispatcher.add_listener(self.on_trigger)
+        self.capture_monitors = {}
+        self.capture_to_host = capture_to_host
+        self.in_flight = in_flight
+        self.host_downloaders = {}
+
+        # Cameras that cannot be opened (not plugged in yet, or e.g. gphoto2.GPhoto2Error: [-53] Could not claim the
+        # USB device, which turning the camera off and on again resolves) are reconnected by the supervisor
+        self.camera_specs = camera_array.load() if cameras is None else list(cameras)
+        if capture_to_host:
+            for spec in self.camera_specs:
+                spec.overrides['capturetarget'] = host_capture.RAM
+        self.cameras = []  # None while a camera is being reconnected
+        self.carried_over = {}  # camera location -> (trigger stats, pending, missed) of a released camera
+        missing = []
+        for index, spec in enumerate(self.camera_specs):
+            try:
+                self.cameras.append(sensors.Camera(name=spec.model, location=spec.location, config=spec.config,
+                                                   serial_number=spec.serial_number))
+            except Exception as e:  # not plugged in, switched off or busy, the supervisor keeps trying
+                print(f'Could not open {spec.location} camera: {e}')
+                self.cameras.append(None)
+                missing.append(index)
+                continue
+            self.attach_camera(self.cameras[-1])
+        self.recorder.set_metadata('serial_numbers', {spec.location: spec.serial_number for spec in self.camera_specs})
+        # Frames of a burst share the trigger's sequence number, the bracket says which settings frame k used
+        self.recorder.set_metadata('bursts', {spec.location: spec.burst for spec in self.camera_specs if spec.burst})
+
+        # Every completed trigger is assigned to the plot under its camera
+        self.plot_assigner = None
+        if self.layout is not None:
+            self.plot_assigner = field.PlotAssigner(self.layout, self.recorder,
+                                                    {spec.location: spec.offset for spec in self.camera_specs})
+            self.trigger_dispatcher.add_listener(self.plot_assigner.on_trigger)
+            for spec in self.camera_specs:
+                if spec.offset is None:
+                    print(f'{spec.location} camera has no offset in the camera array file, its photos are assigned '
+                          f'to the row under the middle of the boom.')
+
+        # Photo transfers pause while the cart is moving
+        self.transfer_gate = transfer.MovementGate(clock=self.movement_sensor.clock)
+        self.transfers = {}
+        self.photo_indexer = None  # started with the first downloaded photo
+        self.previews = {}  # camera location -> preview.PreviewStream
+
+        self.predictive_trigger = None
+        if photo_spacing is not None:
+            self.predictive_trigger = triggering.PredictiveTrigger(self.trigger_dispatcher,
+                                                                   self.movement_sensor.movement_distance,
+                                                                   photo_spacing, clock=self.movement_sensor.clock)
+
+        # Reconnects cameras that were unplugged, stop working or are reset, without blocking the caller
+        self.supervisor = supervisor.CameraSupervisor(self)
+        for index in missing:
+            self.supervisor.mark_lost(index, 'not connected at startup')
+
+        # Every completed trigger is placed between the GPS fixes around it using the wheel distance, and its
+        # position is logged once the next fix has arrived
+        self.gps = None
+        self.positions = gps.PositionInterpolator()
+        self.trigger_locator = gps.TriggerLocator(self.positions, self.on_location)
+        if use_gps:
+            self.gps = sensors.GPS(rate=gps_rate, clock=self.movement_sensor.clock)
+            self.gps.listeners.append(self.on_fix)
+            self.trigger_dispatcher.add_listener(self.trigger_locator.on_trigger)
+
+        # UTC from GPS (or NTP if available) and the cameras' clock offsets, logged without delaying startup
+        self.time_service = timesync.TimeService(self, pps_pin=pps_pin, ntp_server=ntp_server,
+                                                 set_camera_clocks=set_camera_clocks)
+        self.trigger_dispatcher.add_listener(self.time_service.on_trigger)
+        if self.gps is not None:
+            self.gps.listeners.append(self.time_service.on_fix)
+
+        # Battery, card space, settings and clock of every camera, checked in parallel and cached for a while
+        self.health = health.HealthChecker(self)
+
+        # Along-track coverage of every camera's confirmed photos, with the overlap and any gaps shown live
+        self.coverage = coverage.CoverageMonitor(self.camera_specs, skip=skip)
+        self.add_observer(self.coverage)
+        for spec in self.camera_specs:
+            if spec.footprint() is None:
+                print(f'{spec.location} camera has no height and focal_length (or fov) in the camera array file, '
+                      f'its coverage and overlap are not shown.')
+            elif spec.offset is None and len(self.camera_specs) > 1:
+                print(f'{spec.location} camera has no offset in the camera array file, its side overlap is not shown.')
+        self.recorder.set_metadata('footprints', {spec.location: spec.footprint() for spec in self.camera_specs
+                                                  if spec.footprint() is not None})
+
+    def add_observer(self, observer):
+        self.observers.append(observer)
+
+    def notify(self, method, *args):
+        for observer in self.observers:
+            callback = getattr(observer, method, None)
+            if callback is not None:
+                callback(*args)
+
+    def start(self):
+        if self.predictive_trigger is not None:
+            self.predictive_trigger.start()
+        if self.gps is not None:
+            self.gps.start()
+        self.supervisor.start()
+        self.time_service.start()
+        self.movement_sensor.start()
+        self.health.check_in_background()
+
+    def stop(self):
+        self.stop_event.set()
+        self.movement_sensor.stop()
+        self.supervisor.stop()
+        self.time_service.stop()
+        self.health.stop()
+        if self.predictive_trigger is not None:
+            self.predictive_trigger.stop()
+        self.stop_preview()
+        for running in self.transfers.values():
+            running.stop()
+        if self.capture_to_host:
+            # The last captures are only in the cameras' RAM, give the monitors time to report them
+            deadline = time.monotonic() + 2
+            while time.monotonic() < deadline and any(monitor.pending for monitor in self.capture_monitors.values()):
+                time.sleep(0.05)
+        for monitor in self.capture_monitors.values():
+            monitor.stop()
+        self.trigger_dispatcher.stop()
+        for downloader in self.host_downloaders.values():
+            downloader.stop()
+        if self.photo_indexer is not None:
+            # After the downloads, which add their photos to the index
+            self.photo_indexer.stop()
+        if self.gps is not None:
+            self.gps.stop()
+            self.trigger_locator.flush()
+        self.recorder.close()
+
+    def run_forever(self):
+        """
+        Starts the engine and blocks until SIGINT or SIGTERM.
+        """
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda signum, frame: self.stop_event.set())
+        self.start()
+        print(f'Camera cart running for {self.field_name}, photos in {self.photo_directory}')
+        distance = 0
+        while not self.stop_event.wait(1):
+            if self.movement_sensor.cumulative_distance != distance:
+                distance = self.movement_sensor.cumulative_distance
+                print(f'Number of movements detected: {self.movement_sensor.cumulative_movements}, '
+                      f' Distance Traveled: {distance / 100} meters')
+        print('Stopping camera cart.')
+        self.stop()
+        for line in self.coverage.summary():
+            print(line)
+
+    def on_pulse(self, pulse_time, distance):
+        """
+        Movement sensor listener, runs on the movement sensor's thread.
+        """
+        self.recorder.record_pulse(pulse_time, distance)
+        self.positions.add_pulse(pulse_time, distance)
+        self.transfer_gate.moved(pulse_time)
+        if self.predictive_trigger is not None:
+            self.predictive_trigger.on_pulse(pulse_time, distance)
+        else:
+            self.trigger_dispatcher.dispatch(pulse_time, distance)
+        self.notify('on_pulse', pulse_time, distance)
+
+    def on_trigger(self, event, camera, trigger):
+        self.notify('on_trigger', event, camera, trigger)
+
+    def on_fix(self, fix):
+        """
+        GPS listener, runs on the GPS thread.
+        """
+        self.recorder.record_gps(fix.time, fix.latitude, fix.longitude, fix.altitude)
+        self.positions.add_fix(fix)
+        self.trigger_locator.on_fix(fix)
+        self.notify('on_gps', fix.latitude, fix.longitude)
+
+    def on_location(self, camera, trigger, latitude, longitude, interpolated):
+        """
+        Trigger locator callback, runs on the GPS thread.
+        """
+        self.recorder.record_location(camera, trigger, latitude, longitude, interpolated)
+        if self.plot_assigner is not None:
+            self.plot_assigner.on_location(camera, trigger, latitude, longitude, interpolated)
+
+    def attach_camera(self, camera):
+        """
+        Starts triggering a camera. A camera replacing a released one (same location) continues its counters and
+        unconfirmed triggers.
+        """
+        stats, pending, missed = self.carried_over.pop(camera.location, (None, [], []))
+        window = None
+        if self.capture_to_host:
+            window = host_capture.InFlightWindow(self.in_flight, clock=self.movement_sensor.clock)
+            self.host_downloaders[camera.location] = host_capture.HostDownloader(
+                camera, self.trigger_dispatcher, window, os.path.join(self.photo_directory, camera.location,
+                                                                      self.session_name))
+            self.host_downloaders[camera.location].listeners.append(self.index_photo)
+            self.host_downloaders[camera.location].start()
+        burst = None
+        for spec in self.camera_specs:
+            if spec.location == camera.location and spec.burst:
+                burst = triggering.Burst.from_dict(spec.burst)
+        self.trigger_dispatcher.add_camera(camera, policy=triggering.COALESCE, window=window, burst=burst, stats=stats)
+        monitor = capture_monitor.CaptureMonitor(camera, self.trigger_dispatcher)
+        # Same physical camera, so files of triggers sent before a swap are still matched
+        monitor.pending.extend(pending)
+        monitor.missed.extend(missed)
+        self.capture_monitors[camera.location] = monitor
+        monitor.start()
+
+    def detach_camera(self, camera):
+        self.capture_monitors.pop(camera.location).stop()
+        self.trigger_dispatcher.remove_camera(camera)
+        downloader = self.host_downloaders.pop(camera.location, None)
+        if downloader is not None:
+            downloader.stop()
+
+    def reset_camera(self, index):
+        """
+        Reconnects a camera in the background, e.g. after it was switched off and on again. Returns immediately.
+        :param index: index of the camera in self.cameras
+        """
+        self.supervisor.request_reset(index)
+
+    def release_camera(self, index):
+        """
+        Stops triggering a camera and closes its USB connection, so it can be opened again. Its counters and
+        unconfirmed triggers are kept for the camera that replaces it. self.cameras[index] is None until then.
+        :return: the released camera, None if it was already released
+        """
+        camera = self.cameras[index]
+        if camera is None:
+            return None
+        worker = self.trigger_dispatcher.worker(camera)
+        monitor = self.capture_monitors[camera.location]
+        self.carried_over[camera.location] = (worker.stats, list(monitor.pending), list(monitor.missed))
+        self.cameras[index] = None
+        self.detach_camera(camera)
+        try:
+            with camera.lock:
+                camera.camera.exit()
+        except Exception:  # Already gone
+            pass
+        self.notify('on_camera_changed', index, None)
+        return camera
+
+    def replace_camera(self, index, camera):
+        """
+        Swaps in a reconnected camera without stopping the others. The old camera, if any, is released first.
+        """
+        self.release_camera(index)
+        self.cameras[index] = camera
+        self.attach_camera(camera)
+        self.notify('on_camera_changed', index, camera)
+
+    def connected_cameras(self):
+        """
+        :return: the cameras that are open, cameras being reconnected are left out
+        """
+        return [camera for camera in self.cameras if camera is not None]
+
+    def transfer_photos(self, camera):
+        """
+        Starts downloading new photos from a camera in the background. Does nothing if a transfer from that camera
+        is still running. Transferred photos are added to the session's photo index (<session>.photos.csv).
+        :param camera: sensors.Camera, None if it is not connected
+        """
+        if camera is None:
+            print('The camera is not connected, its photos are transferred once it is back.')
+            return
+        running = self.transfers.get(camera.location)
+        if running is not None and running.is_alive():
+            print(f'{camera.location} camera transfer is already running.')
+            return
+        self.transfers[camera.location] = transfer.PhotoTransfer(camera, os.path.join(self.photo_directory,
+                                                                                      camera.location),
+                                                                 gate=self.transfer_gate)
+        self.transfers[camera.location].listeners.append(self.index_photo)
+        self.transfers[camera.location].start()
+
+    def index_photo(self, path):
+        """
+        Adds a downloaded photo to the session's photo index, see ingest.PhotoIndexer.
+        """
+        with self.lock:
+            if self.photo_indexer is None:
+                self.photo_indexer = ingest.PhotoIndexer(ingest.PhotoIndex(self.recorder.path,
+                                                                           self.recorder.path + '.photos.csv',
+                                                                           self.camera_specs, threads=True))
+                self.photo_indexer.start()
+        self.photo_indexer.submit(path)
+
+    def check_cameras(self):
+        """
+        Checks every camera in the background, results are in self.health and problems are printed.
+        """
+        self.health.check_in_background()
+
+    def focus_cameras(self):
+        """
+        Autofocuses every camera at the same time in the background, without taking photos. Start the preview to
+        see the result.
+        """
+        for camera in self.connected_cameras():
+            threading.Thread(target=preview.autofocus, args=(camera,), daemon=True,
+                             name=f'{camera.location} camera autofocus').start()
+
+    def start_preview(self, fps=5.0, decoder=None):
+        """
+        Starts live view on every camera, see preview.PreviewStream. Does nothing for cameras already previewing.
+        :param decoder: function returning a new decode function, called once per camera since the streams decode on
+        their own threads at the same time
+        :return: dict of camera location -> preview.PreviewStream
+        """
+        for camera in self.connected_cameras():
+            running = self.previews.get(camera.location)
+            if running is not None and running.is_alive() and running.camera is camera:
+                continue
+            decode = None if decoder is None else decoder()
+            self.previews[camera.location] = preview.PreviewStream(camera, fps=fps, decode=decode,
+                                                                   gate=self.transfer_gate,
+                                                                   clock=self.movement_sensor.clock)
+            self.previews[camera.location].start()
+        return dict(self.previews)
+
+    def stop_preview(self):
+        for stream in self.previews.values():
+            stream.stop_event.set()
+        for stream in self.previews.values():
+            stream.stop()
+        self.previews = {}
+
+
+def add_arguments(parser):
+    """
+    Adds the CartEngine options, all but the field name, to an argparse parser. See engine_kwargs.
+    """
+    parser.add_argument('--poll', action='store_true', help='poll the wheel sensor instead of edge detection')
+    parser.add_argument('--photo-spacing', type=float, help='centimeters between photos, default every wheel pulse')
+    parser.add_argument('--gps', action='store_true', help='read the GPS')
+    parser.add_argument('--pps-pin', type=int, help='BCM pin of the GPS PPS output')
+    parser.add_argument('--ntp-server', help='NTP server to try in the background')
+    parser.add_argument('--set-camera-clocks', action='store_true',
+                        help='set camera clocks to UTC when they are more than a second off')
+    parser.add_argument('--location', type=float, nargs=2, metavar=('LATITUDE', 'LONGITUDE'),
+                        help='field location, used until there is a GPS fix')
+    parser.add_argument('--cameras', default=camera_array.DEFAULT_PATH, help='camera array file')
+    parser.add_argument('--capture-to-host', action='store_true',
+                        help="capture to the cameras' RAM and download every photo right away")
+    parser.add_argument('--in-flight', type=int, default=2,
+                        help='with --capture-to-host, captures per camera that may wait for their download')
+    parser.add_argument('--skip-alleys', action='store_true',
+                        help='take no photos in the alleys of the field layout (fields/<field_name>.json)')
+    parser.add_argument('--alley-margin', type=float, default=0.0,
+                        help='centimeters from the nearest plot photos are still taken in alleys')
+
+
+def engine_kwargs(args):
+    """
+    :param args: parsed arguments of a parser set up with add_arguments
+    :return: dict of CartEngine keyword arguments
+    """
+    return dict(movement_mode=sensors.MovementSensor.POLL if args.poll else sensors.MovementSensor.EDGE,
+                photo_spacing=args.photo_spacing, cameras=camera_array.load(args.cameras), use_gps=args.gps,
+                location=args.location, pps_pin=args.pps_pin, ntp_server=args.ntp_server,
+                skip_alleys=args.skip_alleys, alley_margin=args.alley_margin,
+                capture_to_host=args.capture_to_host, in_flight=args.in_flight,
+                set_camera_clocks=args.set_camera_clocks)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the camera cart without a display.')
+    parser.add_argument('field_name', help='name of the field being photographed')
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    engine = CartEngine(args.field_name, **engine_kwargs(args))
+    engine.run_forever()
+
+
+if __name__ == '__main__':
+    main()
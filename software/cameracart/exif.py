@@ -0,0 +1,187 @@
+"""
+Minimal EXIF reader for NEF (TIFF based) and JPEG files.
+
+Only the IFD entries that are needed are read, with a seek for each, so a 25 MB NEF costs a few kilobytes of reads.
+"""
+import struct
+
+TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8}
+TYPE_FORMATS = {1: 'B', 3: 'H', 4: 'I', 6: 'b', 8: 'h', 9: 'i'}
+
+MAKE = 0x010F
+MODEL = 0x0110
+EXIF_IFD = 0x8769
+DATETIME_ORIGINAL = 0x9003
+SUBSEC_TIME_ORIGINAL = 0x9291
+MAKER_NOTE = 0x927C
+BODY_SERIAL_NUMBER = 0xA431
+
+NIKON_SERIAL_NUMBER = 0x001D
+NIKON_SHUTTER_COUNT = 0x00A7
+
+
+class TiffReader:
+    """
+    Reads IFDs of a TIFF structure that starts at base in an open file.
+    """
+
+    def __init__(self, f, base=0):
+        self.f = f
+        self.base = base
+        order = self.read(0, 2)
+        if order == b'II':
+            self.endian = '<'
+        elif order == b'MM':
+            self.endian = '>'
+        else:
+            raise ValueError('Not a TIFF header')
+        magic, self.first_ifd = struct.unpack(self.endian + 'HI', self.read(2, 6))
+        if magic != 42:
+            raise ValueError('Not a TIFF header')
+
+    def read(self, offset, length):
+        self.f.seek(self.base + offset)
+        data = self.f.read(length)
+        if len(data) != length:
+            raise ValueError('Truncated TIFF structure')
+        return data
+
+    def ifd(self, offset):
+        """
+        :return: dict of tag -> (type, count, value bytes or offset of the value)
+        """
+        count, = struct.unpack(self.endian + 'H', self.read(offset, 2))
+        data = self.read(offset + 2, count * 12)
+        entries = {}
+        for i in range(count):
+            tag, type_, n, value = struct.unpack(self.endian + 'HHI4s', data[i * 12:i * 12 + 12])
+            entries[tag] = (type_, n, value)
+        return entries
+
+    def value(self, entry):
+        type_, count, value = entry
+        size = TYPE_SIZES.get(type_, 1) * count
+        if size > 4:
+            value = self.read(struct.unpack(self.endian + 'I', value)[0], size)
+        else:
+            value = value[:size]
+        if type_ == 2:
+            return value.split(b'\x00', 1)[0].decode('ascii', errors='replace').strip()
+        if type_ in TYPE_FORMATS:
+            values = struct.unpack(self.endian + TYPE_FORMATS[type_] * count, value)
+            return values[0] if count == 1 else values
+        return value
+
+    def offset(self, entry):
+        return struct.unpack(self.endian + 'I', entry[2])[0]
+
+
+def tiff_base(f):
+    """
+    :return: offset of the TIFF header, 0 for NEF/TIFF files or inside the APP1 segment for JPEG files
+    """
+    f.seek(0)
+    start = f.read(2)
+    if start in (b'II', b'MM'):
+        return 0
+    if start != b'\xff\xd8':
+        raise ValueError('Not a TIFF or JPEG file')
+    offset = 2
+    while True:
+        f.seek(offset)
+        marker, length = struct.unpack('>2sH', f.read(4))
+        if marker[0] != 0xFF or marker == b'\xff\xda':
+            raise ValueError('No EXIF data')
+        if marker == b'\xff\xe1':
+            if f.read(6) == b'Exif\x00\x00':
+                return offset + 10
+        offset += 2 + length
+
+
+def read_exif(path):
+    """
+    :return: dict with make, model, datetime_original ('YYYY:MM:DD HH:MM:SS'), subsec, serial_number and
+    shutter_count (None where the file does not have them)
+    """
+    exif = {'make': None, 'model': None, 'datetime_original': None, 'subsec': None, 'serial_number': None,
+            'shutter_count': None}
+    with open(path, 'rb') as f:
+        tiff = TiffReader(f, tiff_base(f))
+        ifd0 = tiff.ifd(tiff.first_ifd)
+        if MAKE in ifd0:
+            exif['make'] = tiff.value(ifd0[MAKE])
+        if MODEL in ifd0:
+            exif['model'] = tiff.value(ifd0[MODEL])
+        if EXIF_IFD not in ifd0:
+            return exif
+
+        exif_ifd = tiff.ifd(tiff.offset(ifd0[EXIF_IFD]))
+        if DATETIME_ORIGINAL in exif_ifd:
+            exif['datetime_original'] = tiff.value(exif_ifd[DATETIME_ORIGINAL])
+        if SUBSEC_TIME_ORIGINAL in exif_ifd:
+            exif['subsec'] = tiff.value(exif_ifd[SUBSEC_TIME_ORIGINAL])
+        if BODY_SERIAL_NUMBER in exif_ifd:
+            exif['serial_number'] = tiff.value(exif_ifd[BODY_SERIAL_NUMBER])
+
+        if MAKER_NOTE in exif_ifd:
+            # Nikon type 3 maker note: 'Nikon\0', version, padding, then a TIFF structure of its own
+            type_, count, value = exif_ifd[MAKER_NOTE]
+            offset = tiff.offset(exif_ifd[MAKER_NOTE])
+            if tiff.read(offset, 6) == b'Nikon\x00':
+                note = TiffReader(f, tiff.base + offset + 10)
+                entries = note.ifd(note.first_ifd)
+                if NIKON_SERIAL_NUMBER in entries and exif['serial_number'] is None:
+                    exif['serial_number'] = note.value(entries[NIKON_SERIAL_NUMBER])
+                if NIKON_SHUTTER_COUNT in entries:
+                    exif['shutter_count'] = note.value(entries[NIKON_SHUTTER_COUNT])
+    return exif
+
+
+def write_tiff_header(fields, byte_order='<'):
+    """
+    Builds a TIFF header with the fields read_exif reads, used by the camera simulator.
+    :param fields: dict with any of the keys returned by read_exif
+    :return: bytes
+    """
+    def ascii_entry(tag, text):
+        return tag, 2, (text + '\x00').encode('ascii')
+
+    def ifd(entries, start, next_ifd=0):
+        """
+        :param entries: list of (tag, type, value bytes), sorted by tag
+        :return: bytes of the IFD and its out-of-line values, placed at start
+        """
+        data_offset = start + 2 + 12 * len(entries) + 4
+        table = struct.pack(byte_order + 'H', len(entries))
+        data = b''
+        for tag, type_, value in entries:
+            count = len(value) // TYPE_SIZES[type_]
+            if len(value) <= 4:
+                table += struct.pack(byte_order + 'HHI', tag, type_, count) + value.ljust(4, b'\x00')
+            else:
+                table += struct.pack(byte_order + 'HHII', tag, type_, count, data_offset + len(data))
+                data += value + b'\x00' * (len(value) % 2)
+        return table + struct.pack(byte_order + 'I', next_ifd) + data
+
+    note_entries = []
+    if fields.get('serial_number') is not None:
+        note_entries.append(ascii_entry(NIKON_SERIAL_NUMBER, str(fields['serial_number'])))
+    if fields.get('shutter_count') is not None:
+        note_entries.append((NIKON_SHUTTER_COUNT, 4, struct.pack(byte_order + 'I', fields['shutter_count'])))
+    order = b'II' if byte_order == '<' else b'MM'
+    maker_note = b'Nikon\x00\x02\x10\x00\x00' + order + struct.pack(byte_order + 'HI', 42, 8) + ifd(note_entries, 8)
+
+    exif_entries = []
+    if fields.get('datetime_original') is not None:
+        exif_entries.append(ascii_entry(DATETIME_ORIGINAL, fields['datetime_original']))
+    exif_entries.append((MAKER_NOTE, 7, maker_note))
+    if fields.get('subsec') is not None:
+        exif_entries.append(ascii_entry(SUBSEC_TIME_ORIGINAL, fields['subsec']))
+
+    ifd0_entries = [ascii_entry(MAKE, fields.get('make') or 'NIKON CORPORATION'),
+                    ascii_entry(MODEL, fields.get('model') or 'NIKON')]
+    ifd0_length = len(ifd(ifd0_entries + [(EXIF_IFD, 4, b'\x00' * 4)], 8))
+    exif_offset = 8 + ifd0_length
+    ifd0_entries.append((EXIF_IFD, 4, struct.pack(byte_order + 'I', exif_offset)))
+    return (order + struct.pack(byte_order + 'HI', 42, 8) + ifd(ifd0_entries, 8)
+            + ifd(exif_entries, exif_offset))
@@ -0,0 +1,183 @@
+"""
+Field layouts: which plot the cart is over, from the wheel distance or a GPS position.
+
+A layout is read from fields/<field name>.json next to this module:
+
+    {"rows": 12, "row_spacing": 76.2, "pass_row": 2,
+     "ranges": 20, "plot_length": 500.0, "alley_length": 150.0, "start": 100.0,
+     "origin": [32.28061, -106.74792], "heading": 0.0,
+     "plots": {"2-1": "1102"}}
+
+Distances are in centimeters. Ranges run along the direction of travel: range 1 starts start centimeters from where
+the run starts, every plot is plot_length long and ranges are separated by alleys of alley_length. Irregular fields
+list "range_starts" instead of ranges, alley_length and start. Rows run across the direction of travel, row 1 on the
+left, and pass_row is the row under the middle of the boom; each camera's boom offset gives the row it sees.
+origin (corner of row 1, range 1) and heading (direction of travel, degrees from north) are optional and place the
+layout on the map for GPS positions. plots optionally names plots by "<row>-<range>", by default a plot is named
+<range><row:02d>, e.g. 105 for row 5 of range 1.
+
+Ranges are found by bisecting their start distances and rows from the uniform row spacing, so every lookup is
+O(log ranges).
+"""
+import bisect
+import json
+import math
+import os
+
+import gps
+import session
+
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fields')
+
+
+class Plot:
+    def __init__(self, plot_id, row, range_):
+        self.id = plot_id
+        self.row = row
+        self.range = range_
+
+    def __eq__(self, other):
+        return isinstance(other, Plot) and (self.id, self.row, self.range) == (other.id, other.row, other.range)
+
+    def __repr__(self):
+        return f'Plot({self.id!r}, row={self.row}, range={self.range})'
+
+
+class FieldLayout:
+    def __init__(self, name, range_starts, plot_length, rows, row_spacing, pass_row=1, origin=None, heading=0.0,
+                 plot_ids=None):
+        """
+        :param name: field name
+        :param range_starts: distance in centimeters from the start of the run to the start of each range
+        :param plot_length: length of a plot along the direction of travel in centimeters
+        :param rows: number of rows
+        :param row_spacing: distance between rows in centimeters
+        :param pass_row: row under the middle of the boom
+        :param origin: (latitude, longitude) of the corner of row 1 and range 1, None if the field is not mapped
+        :param heading: direction of travel along the ranges, degrees from north
+        :param plot_ids: dict of (row, range) -> plot name, overriding the default names
+        """
+        self.name = name
+        self.range_starts = sorted(range_starts)
+        self.plot_length = plot_length
+        self.rows = rows
+        self.row_spacing = row_spacing
+        self.pass_row = pass_row
+        self.origin = origin
+        self.heading = heading
+        self.plot_ids = dict(plot_ids or {})
+
+    @classmethod
+    def from_dict(cls, name, layout):
+        if 'range_starts' in layout:
+            range_starts = layout['range_starts']
+        else:
+            period = layout['plot_length'] + layout.get('alley_length', 0.0)
+            range_starts = [layout.get('start', 0.0) + i * period for i in range(layout['ranges'])]
+        plot_ids = {}
+        for key, plot_id in layout.get('plots', {}).items():
+            row, range_ = key.split('-')
+            plot_ids[(int(row), int(range_))] = str(plot_id)
+        return cls(name, range_starts, layout['plot_length'], layout['rows'], layout['row_spacing'],
+                   layout.get('pass_row', 1), layout.get('origin'), layout.get('heading', 0.0), plot_ids)
+
+    def plot_id(self, row, range_):
+        return self.plot_ids.get((row, range_), f'{range_}{row:02d}')
+
+    def range_at(self, distance):
+        """
+        :param distance: distance along the direction of travel in centimeters
+        :return: range number, None in an alley or outside the field
+        """
+        i = bisect.bisect_right(self.range_starts, distance) - 1
+        if i < 0 or distance >= self.range_starts[i] + self.plot_length:
+            return None
+        return i + 1
+
+    def row_at(self, across):
+        """
+        :param across: distance to the right of row 1's left edge in centimeters
+        :return: row number, None outside the field
+        """
+        row = math.floor(across / self.row_spacing) + 1
+        return row if 1 <= row <= self.rows else None
+
+    def plot(self, row, range_):
+        if row is None or range_ is None:
+            return None
+        return Plot(self.plot_id(row, range_), row, range_)
+
+    def plot_at_distance(self, distance, offset=0.0):
+        """
+        :param distance: cumulative wheel distance in centimeters
+        :param offset: camera's distance from the middle of the boom in centimeters, negative to the left
+        :return: Plot, None in an alley or outside the field
+        """
+        return self.plot(self.row_at((self.pass_row - 0.5) * self.row_spacing + (offset or 0.0)),
+                         self.range_at(distance))
+
+    def plot_at(self, latitude, longitude):
+        """
+        :return: Plot at a GPS position, None in an alley, outside the field or if the field is not mapped
+        """
+        if self.origin is None:
+            return None
+        east, north = gps.offset_meters(latitude, longitude, *self.origin)
+        heading = math.radians(self.heading)
+        along = (east * math.sin(heading) + north * math.cos(heading)) * 100
+        across = (east * math.cos(heading) - north * math.sin(heading)) * 100
+        return self.plot(self.row_at(across), self.range_at(along + self.range_starts[0]))
+
+    def in_alley(self, distance, margin=0.0):
+        """
+        :param distance: cumulative wheel distance in centimeters
+        :param margin: centimeters around distance that must all be in the alley, e.g. half a photo's footprint
+        :return: True if distance is between two ranges and no plot is within margin
+        """
+        i = bisect.bisect_right(self.range_starts, distance) - 1
+        if i < 0 or i + 1 >= len(self.range_starts):
+            return False
+        return (distance - margin >= self.range_starts[i] + self.plot_length
+                and distance + margin < self.range_starts[i + 1])
+
+
+def load(field_name, directory=DEFAULT_DIRECTORY):
+    """
+    :return: FieldLayout from <directory>/<field_name>.json, None if there is no layout for the field
+    """
+    path = os.path.join(directory, f'{field_name}.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return FieldLayout.from_dict(field_name, json.load(f))
+
+
+class PlotAssigner:
+    """
+    Dispatcher listener that logs the plot of every completed trigger as a PLOT session event. Triggers that are
+    placed on the map by gps.TriggerLocator are logged again with the plot at their position if the field is
+    mapped, and that record replaces the first.
+    """
+
+    def __init__(self, layout, recorder, offsets=None):
+        """
+        :param layout: FieldLayout
+        :param recorder: session.SessionRecorder
+        :param offsets: dict of camera location -> boom offset in centimeters
+        """
+        self.layout = layout
+        self.recorder = recorder
+        self.offsets = dict(offsets or {})
+
+    def record(self, camera, trigger, plot):
+        if plot is not None:
+            self.recorder.record(session.PLOT, trigger.started, camera, trigger.sequence, trigger.frame,
+                                 trigger.position, plot.row, plot.range, plot.id)
+
+    def on_trigger(self, event, camera, trigger):
+        if event == 'completed' and trigger.position is not None:
+            self.record(camera, trigger,
+                        self.layout.plot_at_distance(trigger.position, self.offsets.get(camera.location)))
+
+    def on_location(self, camera, trigger, latitude, longitude, interpolated):
+        self.record(camera, trigger, self.layout.plot_at(latitude, longitude))
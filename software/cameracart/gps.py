@@ -0,0 +1,307 @@
+"""
+NMEA parsing and per-trigger positions.
+
+The GPS reader thread (sensors.GPS) turns the serial stream into Fix objects with NMEAParser. PositionInterpolator
+combines those fixes with the wheel encoder: the encoder distance at each fix is known from the pulse timestamps,
+so any cumulative distance (e.g. Trigger.position) can be placed between the two fixes around it. Past the last fix
+the cart is assumed to keep its heading, with the encoder giving the distance travelled.
+"""
+import bisect
+import collections
+import datetime
+import math
+import threading
+
+KNOTS = 0.514444  # meters per second
+METERS_PER_DEGREE_LATITUDE = 110540.0
+METERS_PER_DEGREE_LONGITUDE = 111320.0  # at the equator
+
+
+class Fix:
+    def __init__(self, time, latitude, longitude, altitude=math.nan, utc=None, quality=1, satellites=0,
+                 hdop=math.nan, speed=math.nan, course=math.nan):
+        """
+        :param time: monotonic time the fix was received
+        :param latitude: decimal degrees, negative south
+        :param longitude: decimal degrees, negative west
+        :param altitude: meters above mean sea level
+        :param utc: datetime (UTC) of the fix, None until the date is known from an RMC sentence
+        :param quality: GGA fix quality, 1 GPS, 2 DGPS, 4 RTK fixed, 5 RTK float
+        :param satellites: satellites used
+        :param hdop: horizontal dilution of precision
+        :param speed: meters per second over ground
+        :param course: degrees from true north
+        """
+        self.time = time
+        self.latitude = latitude
+        self.longitude = longitude
+        self.altitude = altitude
+        self.utc = utc
+        self.quality = quality
+        self.satellites = satellites
+        self.hdop = hdop
+        self.speed = speed
+        self.course = course
+
+
+def checksum(sentence):
+    """
+    :param sentence: sentence without '$' and '*hh'
+    :return: two digit hex checksum
+    """
+    value = 0
+    for char in sentence.encode('ascii'):
+        value ^= char
+    return f'{value:02X}'
+
+
+def pmtk(command):
+    """
+    :param command: e.g. 'PMTK220,100'
+    :return: complete sentence to send to the GPS
+    """
+    return f'${command}*{checksum(command)}\r\n'.encode('ascii')
+
+
+def parse_coordinate(value, hemisphere):
+    if not value:
+        return None
+    degrees_length = value.index('.') - 2
+    coordinate = int(value[:degrees_length]) + float(value[degrees_length:]) / 60
+    return -coordinate if hemisphere in ('S', 'W') else coordinate
+
+
+def parse_time(value):
+    """
+    :return: datetime.time of an hhmmss.ss field
+    """
+    seconds = float(value[4:])
+    return datetime.time(int(value[:2]), int(value[2:4]), int(seconds), int(round(seconds % 1 * 1e6)) % 1000000)
+
+
+def parse_float(value):
+    return float(value) if value else math.nan
+
+
+class NMEAParser:
+    """
+    Turns NMEA sentences into fixes, one per GGA sentence. RMC sentences supply the date, speed and course.
+    """
+
+    def __init__(self):
+        self.date = None
+        self.date_time = None  # time of day of the RMC sentence the date is from
+        self.speed = math.nan
+        self.course = math.nan
+        self.errors = 0
+
+    def parse(self, line, receive_time):
+        """
+        :param line: one sentence, str or bytes
+        :param receive_time: monotonic time the sentence was received
+        :return: Fix for a GGA sentence with a fix, otherwise None
+        """
+        if isinstance(line, bytes):
+            line = line.decode('ascii', errors='replace')
+        line = line.strip()
+        if not line.startswith('$') or '*' not in line:
+            return None
+        sentence, _, expected = line[1:].partition('*')
+        if checksum(sentence) != expected[:2].upper():
+            self.errors += 1
+            return None
+
+        fields = sentence.split(',')
+        kind = fields[0][2:]
+        try:
+            if kind == 'RMC' and len(fields) >= 10:
+                if fields[9]:
+                    self.date = datetime.date(2000 + int(fields[9][4:6]), int(fields[9][2:4]), int(fields[9][:2]))
+                    self.date_time = parse_time(fields[1]) if fields[1] else None
+                self.speed = parse_float(fields[7]) * KNOTS
+                self.course = parse_float(fields[8])
+            elif kind == 'GGA' and len(fields) >= 10:
+                quality = int(fields[6] or 0)
+                if quality == 0 or not fields[2] or not fields[4]:
+                    return None
+                utc = None
+                if self.date is not None and fields[1]:
+                    time_of_day = parse_time(fields[1])
+                    date = self.date
+                    # At midnight the first GGA sentence of the new day comes before the RMC sentence with its date
+                    if self.date_time is not None and time_of_day.hour < 12 <= self.date_time.hour:
+                        date += datetime.timedelta(days=1)
+                    utc = datetime.datetime.combine(date, time_of_day, tzinfo=datetime.timezone.utc)
+                return Fix(receive_time, parse_coordinate(fields[2], fields[3]),
+                           parse_coordinate(fields[4], fields[5]), parse_float(fields[9]), utc, quality,
+                           int(fields[7] or 0), parse_float(fields[8]), self.speed, self.course)
+        except ValueError:
+            self.errors += 1
+        return None
+
+
+def offset_meters(latitude, longitude, origin_latitude, origin_longitude):
+    """
+    :return: (east, north) in meters from origin, good for the few hundred meters between fixes
+    """
+    east = (longitude - origin_longitude) * METERS_PER_DEGREE_LONGITUDE * math.cos(math.radians(origin_latitude))
+    north = (latitude - origin_latitude) * METERS_PER_DEGREE_LATITUDE
+    return east, north
+
+
+class PositionInterpolator:
+    """
+    Places cumulative wheel distances on the map using GPS fixes.
+    """
+
+    def __init__(self, fix_latency=0.0, min_baseline=1.0, history=10000):
+        """
+        :param fix_latency: seconds between a fix's epoch and its sentence being received
+        :param min_baseline: meters the cart must have moved between two fixes to estimate its heading
+        :param history: number of fixes and pulses kept
+        """
+        self.fix_latency = fix_latency
+        self.min_baseline = min_baseline
+        self.lock = threading.Lock()
+        self.pulse_times = collections.deque(maxlen=history)
+        self.pulse_distances = collections.deque(maxlen=history)
+        self.fix_distances = collections.deque(maxlen=history)  # encoder distance at each fix, increasing
+        self.fixes = collections.deque(maxlen=history)
+
+    def add_pulse(self, pulse_time, distance):
+        with self.lock:
+            self.pulse_times.append(pulse_time)
+            self.pulse_distances.append(distance)
+
+    def distance_at(self, t):
+        """
+        :return: encoder distance in centimeters at monotonic time t, interpolated between pulses
+        """
+        times, distances = self.pulse_times, self.pulse_distances
+        if not times:
+            return 0.0
+        i = bisect.bisect_right(times, t)
+        if i == 0:
+            # Before the first pulse, the cart was at most one pulse spacing behind it
+            return max(distances[0] - self._pulse_spacing(), 0.0)
+        if i == len(times):
+            if len(times) < 2:
+                return distances[-1]
+            # Continue at the speed of the last pulse interval until the next pulse is overdue (cart stopped)
+            fraction = (t - times[-1]) / (times[-1] - times[-2])
+            if fraction >= 1:
+                return distances[-1]
+            return distances[-1] + fraction * (distances[-1] - distances[-2])
+        t0, t1 = times[i - 1], times[i]
+        return distances[i - 1] + (distances[i] - distances[i - 1]) * (t - t0) / (t1 - t0)
+
+    def _pulse_spacing(self):
+        if len(self.pulse_distances) < 2:
+            return 0.0
+        return self.pulse_distances[1] - self.pulse_distances[0]
+
+    def add_fix(self, fix):
+        """
+        :return: encoder distance at the fix in centimeters
+        """
+        with self.lock:
+            distance = self.distance_at(fix.time - self.fix_latency)
+            if self.fix_distances and distance < self.fix_distances[-1]:
+                distance = self.fix_distances[-1]
+            if self.fix_distances and distance == self.fix_distances[-1]:
+                # Standing still, the newest fix replaces the last one
+                self.fixes[-1] = fix
+            else:
+                self.fix_distances.append(distance)
+                self.fixes.append(fix)
+            return distance
+
+    def covered(self, distance):
+        """
+        :return: True if a fix at or beyond distance has been received, so locate(distance) interpolates
+        """
+        return bool(self.fix_distances) and self.fix_distances[-1] >= distance
+
+    def heading(self, end):
+        """
+        :return: (east, north) unit vector of the cart's direction at fix index end, None if unknown
+        """
+        last = self.fixes[end]
+        for i in range(end - 1, -1, -1):
+            east, north = offset_meters(last.latitude, last.longitude, self.fixes[i].latitude,
+                                        self.fixes[i].longitude)
+            length = math.hypot(east, north)
+            if length >= self.min_baseline:
+                return east / length, north / length
+        if not math.isnan(last.course):
+            return math.sin(math.radians(last.course)), math.cos(math.radians(last.course))
+        return None
+
+    def locate(self, distance):
+        """
+        :param distance: cumulative encoder distance in centimeters
+        :return: (latitude, longitude, interpolated), interpolated is False if the position was extrapolated from
+        the nearest fix. None if there is no fix yet.
+        """
+        with self.lock:
+            if not self.fixes:
+                return None
+            i = bisect.bisect_left(self.fix_distances, distance)
+            if i < len(self.fixes) and self.fix_distances[i] == distance:
+                return self.fixes[i].latitude, self.fixes[i].longitude, True
+            if 0 < i < len(self.fixes):
+                a, b = self.fixes[i - 1], self.fixes[i]
+                f = (distance - self.fix_distances[i - 1]) / (self.fix_distances[i] - self.fix_distances[i - 1])
+                return a.latitude + (b.latitude - a.latitude) * f, a.longitude + (b.longitude - a.longitude) * f, True
+
+            # Before the first or after the last fix: continue along the heading for the encoder distance
+            end = 0 if i == 0 else len(self.fixes) - 1
+            fix = self.fixes[end]
+            heading = self.heading(len(self.fixes) - 1) if end else self.heading(min(1, len(self.fixes) - 1))
+            if heading is None:
+                return fix.latitude, fix.longitude, False
+            meters = (distance - self.fix_distances[end]) / 100
+            north = heading[1] * meters
+            east = heading[0] * meters
+            return (fix.latitude + north / METERS_PER_DEGREE_LATITUDE,
+                    fix.longitude + east / (METERS_PER_DEGREE_LONGITUDE * math.cos(math.radians(fix.latitude))),
+                    False)
+
+
+class TriggerLocator:
+    """
+    Dispatcher listener that gives every completed trigger a position once the fix after it has arrived, so
+    locating never delays a trigger. callback(camera, trigger, latitude, longitude, interpolated) is called from the
+    GPS thread (or from flush).
+    """
+
+    def __init__(self, interpolator, callback):
+        self.interpolator = interpolator
+        self.callback = callback
+        self.pending = collections.deque()  # completed triggers with a position, in order of position
+
+    def on_trigger(self, event, camera, trigger):
+        if event == 'completed' and trigger.position is not None:
+            self.pending.append((camera, trigger))
+
+    def on_fix(self, fix):
+        self.resolve(lambda position: self.interpolator.covered(position))
+
+    def flush(self):
+        """
+        Locates the remaining triggers by extrapolation, e.g. when the run ends.
+        """
+        self.resolve(lambda position: True)
+
+    def resolve(self, ready):
+        while True:
+            try:
+                camera, trigger = self.pending[0]
+            except IndexError:
+                return
+            if not ready(trigger.position):
+                return
+            self.pending.popleft()
+            location = self.interpolator.locate(trigger.position)
+            if location is not None:
+                self.callback(camera, trigger, *location)
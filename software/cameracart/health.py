@@ -0,0 +1,212 @@
+"""
+Pre-run camera checks: is every camera connected, charged, set up as its profile says, with room on its card and
+its clock close to UTC.
+
+All cameras are checked at the same time, one thread each, and a check costs two USB requests per camera (the
+config tree, which holds the battery level, shots remaining and clock, and the storage information). Results are
+kept for ttl seconds, so pressing Check Cameras again or asking for the status from several places does not query
+the cameras again.
+"""
+import concurrent.futures
+import threading
+import time
+
+import sensors
+
+
+class CameraHealth:
+    """
+    Result of checking one camera.
+    """
+
+    def __init__(self, location, checked):
+        self.location = location
+        self.checked = checked  # monotonic time of the check
+        self.connected = False
+        self.battery = None  # percent
+        self.available_shots = None
+        self.free_space = None  # bytes free on the card
+        self.config_mismatches = {}  # config item -> (expected, actual)
+        self.clock_offset = None  # camera clock - UTC in seconds
+        self.problems = []
+
+    @property
+    def ok(self):
+        return self.connected and not self.problems
+
+    def summary(self):
+        if not self.connected:
+            return '\n'.join(self.problems) or 'Not connected'
+        parts = []
+        if self.battery is not None:
+            parts.append(f'Battery {self.battery}%')
+        if self.available_shots is not None:
+            parts.append(f'{self.available_shots} shots')
+        if self.free_space is not None:
+            parts.append(f'{self.free_space / 1e9:.1f} GB free')
+        if self.clock_offset is not None:
+            parts.append(f'clock {self.clock_offset:+.1f} s')
+        text = ', '.join(parts)
+        if self.problems:
+            text += '\n' + '\n'.join(self.problems)
+        return text
+
+
+def parse_number(value):
+    """
+    :return: leading integer of a widget value such as '75%' or '1,234', None if there is none
+    """
+    digits = ''
+    for char in str(value).replace(',', '').strip():
+        if not char.isdigit():
+            break
+        digits += char
+    return int(digits) if digits else None
+
+
+class HealthChecker:
+    def __init__(self, engine, ttl=30.0, min_battery=25, min_shots=500, max_clock_offset=1.0, timeout=10.0,
+                 clock=time.monotonic):
+        """
+        :param engine: engine.CartEngine
+        :param ttl: seconds a result is reused before the camera is checked again
+        :param min_battery: battery percentage below which a camera is reported
+        :param min_shots: shots remaining below which a camera is reported
+        :param max_clock_offset: seconds the camera's clock may be off UTC
+        :param timeout: seconds to wait for a camera before it is reported as not responding
+        :param clock: monotonic clock
+        """
+        self.engine = engine
+        self.ttl = ttl
+        self.min_battery = min_battery
+        self.min_shots = min_shots
+        self.max_clock_offset = max_clock_offset
+        self.timeout = timeout
+        self.clock = clock
+
+        self.lock = threading.Lock()
+        self.results = {}  # camera location -> CameraHealth
+        self.checking = set()  # camera locations being checked
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(len(engine.cameras), 1),
+                                                              thread_name_prefix='camera check')
+
+    def check_camera(self, camera):
+        health = CameraHealth(camera.location, self.clock())
+        if self.engine.supervisor.state(camera.location) != self.engine.supervisor.OK:
+            health.problems.append(f'Camera is {self.engine.supervisor.state(camera.location)}')
+            return health
+        try:
+            with camera.lock:
+                camera.config_cache.refresh()
+                values = {}
+                for name in ('batterylevel', 'availableshots', 'datetime'):
+                    try:
+                        values[name] = camera.config_cache.get_value(name)
+                    except KeyError:
+                        pass
+                read_time = self.engine.time_service.utc()
+                mismatches = {}
+                if camera.config is not None:
+                    for name, value in camera.config.items():
+                        try:
+                            expected = camera.config_cache.resolve(name, value)
+                            actual = camera.config_cache.get_value(name)
+                        except (KeyError, ValueError) as e:
+                            health.problems.append(str(e))
+                            continue
+                        if actual != expected:
+                            mismatches[name] = (expected, actual)
+                storage = sensors.gp.check_result(sensors.gp.gp_camera_get_storageinfo(camera.camera))
+        except Exception as e:  # gphoto error, camera off or unplugged
+            health.problems.append(f'Not responding: {e}')
+            return health
+
+        health.connected = True
+        health.battery = parse_number(values.get('batterylevel'))
+        health.available_shots = parse_number(values.get('availableshots'))
+        if storage:
+            health.free_space = sum(info.freekbytes for info in storage) * 1024
+        health.config_mismatches = mismatches
+        health.clock_offset = self.engine.time_service.camera_offset(camera)
+        if health.clock_offset is None and 'datetime' in values:
+            # Whole seconds, rounded down, timesync's estimate is used once it has one
+            health.clock_offset = values['datetime'] + 0.5 - read_time
+
+        if health.battery is not None and health.battery < self.min_battery:
+            health.problems.append(f'Battery low ({health.battery}%)')
+        if health.available_shots is not None and health.available_shots < self.min_shots:
+            health.problems.append(f'Card almost full ({health.available_shots} shots)')
+        for name, (expected, actual) in mismatches.items():
+            health.problems.append(f'{name} is {actual}, expected {expected}')
+        if health.clock_offset is not None and abs(health.clock_offset) > self.max_clock_offset:
+            health.problems.append(f'Clock off by {health.clock_offset:+.1f} s')
+        return health
+
+    def check(self, force=False):
+        """
+        Checks every camera whose result is older than ttl (or all of them with force), in parallel. Blocks until
+        all are done, at most timeout seconds.
+        :return: dict of camera location -> CameraHealth
+        """
+        if self.engine.transfer_gate.is_moving():
+            # Same as transfers, USB requests would compete with triggers
+            print('Cameras are only checked while the cart is stopped.')
+            with self.lock:
+                return dict(self.results)
+
+        now = self.clock()
+        cameras = []
+        with self.lock:
+            for camera in self.engine.connected_cameras():
+                result = self.results.get(camera.location)
+                stale = force or result is None or now - result.checked > self.ttl
+                if stale and camera.location not in self.checking:
+                    self.checking.add(camera.location)
+                    cameras.append(camera)
+
+        futures = {self.executor.submit(self.check_camera, camera): camera for camera in cameras}
+        done, not_done = concurrent.futures.wait(futures, timeout=self.timeout)
+        results = {}
+        for future in done:
+            results[futures[future].location] = future.result()
+        for future in not_done:
+            # The thread keeps waiting for the camera, its result replaces this one when it arrives
+            health = CameraHealth(futures[future].location, now)
+            health.problems.append('Not responding')
+            results[health.location] = health
+            future.add_done_callback(self.store)
+
+        with self.lock:
+            self.results.update(results)
+            self.checking.difference_update(camera.location for camera in cameras)
+            return dict(self.results)
+
+    def store(self, future):
+        health = future.result()
+        with self.lock:
+            self.results[health.location] = health
+
+    def check_in_background(self, force=True):
+        """
+        Runs check on another thread and prints any problems, e.g. from a button or when the cart starts.
+        """
+        def run():
+            for location, health in self.check(force).items():
+                if not health.ok:
+                    print(f'{location} camera: ' + '; '.join(health.problems))
+            print('Camera check finished.')
+
+        threading.Thread(target=run, daemon=True, name='camera check').start()
+
+    def status(self, location):
+        """
+        :return: text for a camera's health label, 'Checking...' while its check is running
+        """
+        with self.lock:
+            if location in self.checking:
+                return 'Checking...'
+            result = self.results.get(location)
+        return '' if result is None else result.summary()
+
+    def stop(self):
+        self.executor.shutdown(wait=False)
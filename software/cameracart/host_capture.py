@@ -0,0 +1,187 @@
+"""
+Capture to host: photos go to the camera's RAM instead of its card and are downloaded to the cart's storage right
+after each capture, then deleted from the camera.
+
+The card's write speed no longer limits the sustained shot rate and nothing is left to transfer after the run, in
+exchange for USB bandwidth during the run. The camera's RAM holds only a few frames, so every camera has an
+InFlightWindow: a trigger is only released once fewer than size earlier captures are still waiting to be
+downloaded, and while it waits the worker's queue coalesces new triggers as usual. A camera that cannot keep up
+therefore drops (and counts) triggers instead of failing them with "camera busy".
+"""
+import collections
+import os
+import threading
+import time
+
+from sensors import Camera, gp
+
+RAM = 0  # capturetarget choice index of 'Internal RAM'
+
+
+class InFlightWindow:
+    """
+    Counting semaphore for captures that have been triggered but not yet downloaded.
+    """
+
+    def __init__(self, size=2, clock=time.monotonic):
+        """
+        :param size: captures that may wait in the camera's RAM at the same time
+        :param clock: monotonic clock, for the time spent waiting
+        """
+        self.size = size
+        self.clock = clock
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        self.waits = 0  # times a trigger had to wait for a slot
+        self.wait_time = 0.0  # total seconds triggers waited
+
+    def acquire(self, timeout=None):
+        """
+        :return: True once a slot is taken, False if none became free within timeout
+        """
+        with self.condition:
+            if self.in_flight >= self.size:
+                start = self.clock()
+                self.waits += 1
+                if not self.condition.wait_for(lambda: self.in_flight < self.size, timeout):
+                    self.wait_time += self.clock() - start
+                    return False
+                self.wait_time += self.clock() - start
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self.condition:
+            self.in_flight = max(self.in_flight - 1, 0)
+            self.condition.notify()
+
+
+class HostDownloader(threading.Thread):
+    """
+    Downloads the captures of one camera as the capture monitor confirms them, and releases their window slots.
+
+    Downloads go chunk by chunk and give way whenever the camera has a trigger waiting, so they add at most one
+    chunk's transfer time to a trigger's delay. Listeners are called with the path of every file written.
+    """
+
+    def __init__(self, camera, dispatcher, window, destination, chunk_size=256 * 1024, confirm_timeout=5.0):
+        """
+        :param camera: sensors.Camera with capturetarget set to RAM
+        :param dispatcher: triggering.TriggerDispatcher the camera is attached to
+        :param window: InFlightWindow of the camera's worker
+        :param destination: directory the photos are saved in, as <sequence>_<file name>
+        :param chunk_size: bytes per USB request
+        :param confirm_timeout: seconds after which a capture that was never reported gives back its slot
+        """
+        super().__init__(daemon=True, name=f'{camera.location} camera host download')
+        self.camera = camera
+        self.dispatcher = dispatcher
+        self.window = window
+        self.destination = destination
+        self.chunk_size = chunk_size
+        self.confirm_timeout = confirm_timeout
+
+        self.condition = threading.Condition()
+        self.captures = collections.deque()  # confirmed captures waiting for download
+        self.unconfirmed = collections.OrderedDict()  # trigger -> time completed, waiting for its file
+        self.stopped = False
+
+        self.downloaded = 0
+        self.bytes = 0
+        self.download_time = 0.0
+        self.errors = []
+        self.listeners = []
+
+        self.dispatcher.add_listener(self.on_trigger)
+
+    def on_trigger(self, event, camera, trigger):
+        if camera is not self.camera:
+            return
+        with self.condition:
+            if event == 'completed' and trigger.capture is None:
+                self.unconfirmed[trigger] = trigger.completed
+            elif event == 'confirmed':
+                self.unconfirmed.pop(trigger, None)
+                self.captures.append(trigger.capture)
+                self.condition.notify()
+
+    def expire(self):
+        """
+        Gives back the slots of triggers whose file was never reported.
+        """
+        now = self.dispatcher.clock()
+        with self.condition:
+            while self.unconfirmed:
+                trigger, completed = next(iter(self.unconfirmed.items()))
+                if now - completed <= self.confirm_timeout:
+                    break
+                del self.unconfirmed[trigger]
+                self.window.release()
+
+    def yield_to_triggers(self):
+        """
+        before_chunk callback of Camera.save, waits while the worker has a trigger it can run. A trigger waiting for
+        a window slot has to wait for this download, so it is not waited for.
+        """
+        try:
+            worker = self.dispatcher.worker(self.camera)
+        except KeyError:
+            return True
+        while worker.ready() and not worker.stopped:
+            time.sleep(0.002)
+        return True
+
+    def download(self, capture):
+        start = time.monotonic()
+        paths = [capture.path] + capture.extra_files
+        for path in paths:
+            folder, _, name = path.rpartition('/')
+            folder = folder or '/'
+            target = os.path.join(self.destination, f'{capture.trigger.sequence:06d}_{name}')
+            result = self.camera.save(folder, name, target, chunk_size=self.chunk_size,
+                                      before_chunk=self.yield_to_triggers)
+            with self.camera.lock:
+                gp.check_result(gp.gp_camera_file_delete(self.camera.camera, folder, name))
+            if result == Camera.SAVED:
+                self.bytes += os.path.getsize(target)
+                for listener in self.listeners:
+                    listener(target)
+        self.downloaded += 1
+        self.download_time += time.monotonic() - start
+
+    def pending(self):
+        with self.condition:
+            return len(self.captures)
+
+    def run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.captures or self.stopped, timeout=0.5)
+                if not self.captures:
+                    if self.stopped:
+                        return
+                    capture = None
+                else:
+                    capture = self.captures.popleft()
+            self.expire()
+            if capture is None:
+                continue
+            try:
+                self.download(capture)
+            except Exception as e:  # gphoto error, the file stays in the camera's RAM until it is switched off
+                print(f'Could not download {capture.path} from {self.camera.location} camera: {e}')
+                self.errors.append((capture.path, str(e)))
+            self.window.release()
+
+    def stop(self, timeout=30.0):
+        """
+        Finishes the downloads that are already queued, at most timeout seconds, as the files are lost when the
+        camera is switched off.
+        """
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        if self.is_alive():
+            self.join(timeout)
+        if self.on_trigger in self.dispatcher.listeners:
+            self.dispatcher.listeners.remove(self.on_trigger)
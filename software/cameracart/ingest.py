@@ -0,0 +1,466 @@
+"""
+Per-photo index of a run: which trigger every transferred file belongs to, and where and when it was taken.
+
+EXIF headers are read in a pool of processes, or of threads inside the cart (only the few IFD entries needed, never
+the image data). Each file is matched to its trigger by camera serial number and EXIF time, corrected for the
+camera's clock offset that timesync logged in the session. Photos downloaded during the run (host_capture) carry
+their trigger's sequence number in front of the file name, which identifies the trigger directly. Rows are appended
+to a CSV file, so the index grows as files are transferred and files already in it are skipped:
+
+    python ingest.py ~/CameraCart/nmsu_2023/sessions/2023-06-01T09-00-00Z.ccsession ~/CameraCart/nmsu_2023
+"""
+import argparse
+import bisect
+import calendar
+import collections
+import csv
+import datetime
+import math
+import multiprocessing
+import multiprocessing.pool
+import os
+import queue
+import re
+import threading
+import time
+
+import numpy as np
+
+import camera_array
+import exif
+import session
+import solar
+
+EXTENSIONS = ('.nef', '.jpg', '.jpeg')
+
+COLUMNS = ('path', 'camera', 'serial_number', 'shutter_count', 'exif_time', 'time', 'sequence', 'frame', 'distance',
+           'latitude', 'longitude', 'sun_elevation', 'sun_azimuth', 'plot', 'match')
+
+# How the file was matched to its trigger
+SEQUENCE = 'sequence'  # sequence number host_capture saved in front of the file name
+NAME = 'name'  # file name logged by the capture monitor, at a time consistent with the EXIF time
+TIME = 'time'  # nearest trigger of the camera
+UNMATCHED = ''
+
+# <sequence>_<file name on the camera>, see host_capture.HostDownloader
+HOST_FILE_NAME = re.compile(r'^(\d{6,})_(.+)$')
+
+
+def read_header(path):
+    """
+    Pool worker.
+    :return: (path, dict from exif.read_exif or None if the file has no readable EXIF header)
+    """
+    try:
+        return path, exif.read_exif(path)
+    except (OSError, ValueError):
+        return path, None
+
+
+def exif_timestamp(fields):
+    """
+    :return: camera clock at the exposure as seconds since the epoch, or None. Camera clocks are only set to UTC when
+    the cart runs with set_camera_clocks, otherwise the logged camera offset is the only correction applied.
+    """
+    if not fields or not fields.get('datetime_original'):
+        return None
+    try:
+        t = datetime.datetime.strptime(fields['datetime_original'], '%Y:%m:%d %H:%M:%S')
+    except ValueError:
+        return None
+    subsec = fields.get('subsec') or ''
+    fraction = int(subsec) / 10 ** len(subsec) if subsec.isdigit() else 0.0
+    return calendar.timegm(t.timetuple()) + fraction
+
+
+class SessionTriggers:
+    """
+    Triggers of a session log with their UTC times, positions and captured file names.
+
+    update() reads only the records appended since the last call, so keeping one instance while a run is being
+    indexed costs time in proportion to the new records, not to the length of the session.
+    """
+
+    def __init__(self, path, cameras=None):
+        """
+        :param path: session log
+        :param cameras: list of camera_array.CameraSpec for serial numbers missing from the session's metadata
+        """
+        self.path = path
+        self.cameras = list(cameras or [])
+        header = session.read_header(path)
+        # Host clock before any UTC offset was logged
+        self.start_offset = header['wall_start'] - header['monotonic_start']
+        self.reset()
+        self.update()
+
+    def reset(self):
+        self.read = 0  # records processed
+        # Host clock: the UTC offset logged before each event
+        self.offset_times = np.zeros(0)
+        self.offsets = np.zeros(0)
+        # Camera clocks: the last estimate is the narrowest
+        self.camera_offsets = {}
+        self.camera_uncertainties = {}
+        self.triggers = collections.defaultdict(list)  # camera location -> [(start, end, sequence, frame, position)]
+        self.starts = collections.defaultdict(list)  # camera location -> start of every trigger, sorted
+        self.longest = collections.defaultdict(float)  # camera location -> longest trigger duration
+        self.sequences = collections.defaultdict(list)  # (camera location, sequence) -> triggers, one per frame
+        self.names = collections.defaultdict(list)  # (camera location, file name) -> [(sequence, frame)]
+        self.positions = {}  # (camera location, sequence, frame) -> (latitude, longitude)
+        self.plots = {}  # (camera location, sequence, frame) -> plot name, a later record replaces an earlier one
+        self.fix_times = np.zeros(0)
+        self.fix_latitudes = np.zeros(0)
+        self.fix_longitudes = np.zeros(0)
+
+    def update(self):
+        """
+        Adds the records logged since the last update.
+        """
+        metadata = session.read_metadata(self.path)
+        self.locations = list(metadata['cameras'])
+        self.serial_numbers = {}  # serial number -> camera location
+        for spec in self.cameras:
+            self.serial_numbers[str(spec.serial_number)] = spec.location
+        for location, serial_number in metadata.get('serial_numbers', {}).items():
+            self.serial_numbers[str(serial_number)] = location
+        if self.read == 0:
+            self.camera_offsets.update(metadata.get('camera_clock_offsets', {}))
+
+        records = session.read_session(self.path)
+        records = records[self.read:]
+        clock = records[records['event'] == session.CLOCK]
+        host = clock[clock['camera'] == session.NO_CAMERA]
+        if len(host) and len(self.offsets) == 0 and self.read > 0:
+            # Events before the first logged offset use that offset, so convert them again
+            self.reset()
+            self.update()
+            return
+        self.read += len(records)
+
+        self.offset_times = np.concatenate([self.offset_times, host['time']])
+        self.offsets = np.concatenate([self.offsets, host['value1']])
+        for record in clock[clock['camera'] != session.NO_CAMERA]:
+            location = self.location(record['camera'])
+            self.camera_offsets[location] = float(record['value1'])
+            self.camera_uncertainties[location] = float(record['value3'])
+
+        for record in records[records['event'] == session.TRIGGER]:
+            location = self.location(record['camera'])
+            start = self.utc(record['time'])
+            trigger = (start, start + float(record['value3']), int(record['sequence']), int(record['frame']),
+                       float(record['value1']))
+            # Triggers are logged nearly in order, so this inserts at or near the end
+            i = bisect.bisect_right(self.triggers[location], trigger)
+            self.triggers[location].insert(i, trigger)
+            self.starts[location].insert(i, start)
+            self.longest[location] = max(self.longest[location], trigger[1] - trigger[0])
+            self.sequences[location, trigger[2]].append(trigger)
+
+        for record in records[records['event'] == session.CAPTURE]:
+            name = bytes(record['label']).rstrip(b'\x00').decode()
+            key = (self.location(record['camera']), name)
+            self.names[key].append((int(record['sequence']), int(record['frame'])))
+        for record in records[records['event'] == session.LOCATION]:
+            key = (self.location(record['camera']), int(record['sequence']), int(record['frame']))
+            self.positions[key] = (float(record['value1']), float(record['value2']))
+        for record in records[records['event'] == session.PLOT]:
+            key = (self.location(record['camera']), int(record['sequence']), int(record['frame']))
+            self.plots[key] = bytes(record['label']).rstrip(b'\x00').decode()
+
+        fixes = records[records['event'] == session.GPS]
+        if len(fixes):
+            self.fix_times = np.concatenate([self.fix_times, [self.utc(t) for t in fixes['time']]])
+            self.fix_latitudes = np.concatenate([self.fix_latitudes, fixes['value1']])
+            self.fix_longitudes = np.concatenate([self.fix_longitudes, fixes['value2']])
+
+    def location(self, camera_index):
+        camera_index = int(camera_index)
+        return self.locations[camera_index] if camera_index < len(self.locations) else str(camera_index)
+
+    def utc(self, t):
+        i = np.searchsorted(self.offset_times, t, side='right')
+        if len(self.offsets) == 0:
+            return float(t) + self.start_offset
+        return float(t) + float(self.offsets[max(i - 1, 0)])
+
+    def position(self, location, sequence, frame, utc):
+        """
+        :return: (latitude, longitude) logged for the trigger, otherwise interpolated between GPS fixes, or None
+        """
+        position = self.positions.get((location, sequence, frame))
+        if position is None and len(self.fix_times):
+            position = (float(np.interp(utc, self.fix_times, self.fix_latitudes)),
+                        float(np.interp(utc, self.fix_times, self.fix_longitudes)))
+        return position
+
+    def match(self, location, name, utc, tolerance, used):
+        """
+        :param location: camera location
+        :param name: file name, with the sequence number in front if host_capture saved it
+        :param utc: exposure time from the EXIF header, corrected for the camera's clock offset
+        :param tolerance: seconds an exposure may be outside its trigger's start and end
+        :param used: set of (location, sequence, frame) already matched to a file, updated
+        :return: ((start, end, sequence, frame, position), match) or (None, UNMATCHED)
+        """
+        triggers = self.triggers.get(location, [])
+        tolerance += self.camera_uncertainties.get(location, 0.0)
+
+        def error(trigger):
+            return max(trigger[0] - utc, utc - trigger[1], 0.0)
+
+        stored = HOST_FILE_NAME.match(name)
+        if stored:
+            sequence, name = int(stored.group(1)), stored.group(2)
+            frames = [trigger for trigger in self.sequences.get((location, sequence), [])
+                      if (location, *trigger[2:4]) not in used]
+            if frames:
+                # The frames of a burst share the sequence, the logged name or the EXIF time tells them apart
+                named = set(self.names.get((location, name), []))
+                by_name = [trigger for trigger in frames if trigger[2:4] in named]
+                if by_name:
+                    trigger = by_name[0]
+                elif utc is not None:
+                    trigger = min(frames, key=error)
+                else:
+                    trigger = min(frames, key=lambda trigger: trigger[3])
+                used.add((location, trigger[2], trigger[3]))
+                return trigger, SEQUENCE
+
+        # File names repeat every 10000 photos, so a logged name only counts if its trigger fits the EXIF time
+        named = set(self.names.get((location, name), []))
+        candidates = []
+        if utc is not None:
+            i = bisect.bisect_left(self.starts.get(location, []), utc - tolerance - self.longest.get(location, 0.0))
+            while i < len(triggers) and triggers[i][0] <= utc + tolerance:
+                if error(triggers[i]) <= tolerance and (location, *triggers[i][2:4]) not in used:
+                    candidates.append(triggers[i])
+                i += 1
+        elif named:
+            candidates = [trigger for trigger in triggers if trigger[2:4] in named]
+
+        if not candidates:
+            return None, UNMATCHED
+        by_name = [trigger for trigger in candidates if trigger[2:4] in named]
+        if by_name:
+            trigger, how = by_name[0], NAME
+        else:
+            trigger, how = min(candidates, key=error), TIME
+        used.add((location, trigger[2], trigger[3]))
+        return trigger, how
+
+
+class PhotoIndex:
+    """
+    CSV index of the photos of one session, see the module docstring.
+    """
+
+    def __init__(self, session_path, index_path, cameras=None, processes=None, tolerance=1.0, threads=False):
+        """
+        :param session_path: session log the photos were taken in
+        :param index_path: CSV file, appended to if it exists
+        :param cameras: list of camera_array.CameraSpec, defaults to the cameras in cameras.json
+        :param processes: processes reading EXIF headers, defaults to the number of CPUs
+        :param tolerance: seconds an exposure may be outside its trigger, camera clocks only log whole seconds
+        without a SubSecTimeOriginal tag
+        :param threads: read headers in threads instead of processes. Spawned processes import the main script again,
+        which inside the cart would open the cameras a second time.
+        """
+        self.session_path = session_path
+        self.index_path = index_path
+        self.cameras = camera_array.load() if cameras is None else list(cameras)
+        self.processes = processes
+        self.tolerance = tolerance
+        self.threads = threads
+        self.pool = None
+        self.triggers = None  # SessionTriggers, read up to the end of the log at the last batch
+        self.lock = threading.Lock()
+
+        self.indexed = set()
+        self.used = set()  # (camera location, sequence, frame) of matched triggers
+        if os.path.exists(index_path):
+            with open(index_path, newline='') as f:
+                for row in csv.DictReader(f):
+                    self.indexed.add(os.path.abspath(row['path']))
+                    if row['match']:
+                        self.used.add((row['camera'], int(row['sequence']), int(row['frame'])))
+
+    def start_pool(self):
+        if self.pool is None:
+            if self.threads:
+                # Header reads mostly wait for the disk, so threads keep up
+                self.pool = multiprocessing.pool.ThreadPool(self.processes)
+            else:
+                # Forking a process that runs threads could copy locks that are held
+                self.pool = multiprocessing.get_context('spawn').Pool(self.processes)
+        return self.pool
+
+    def scan(self, directory):
+        """
+        :return: photos below directory that are not indexed yet
+        """
+        paths = []
+        for root, _, names in os.walk(directory):
+            for name in names:
+                path = os.path.abspath(os.path.join(root, name))
+                if name.lower().endswith(EXTENSIONS) and path not in self.indexed:
+                    paths.append(path)
+        return sorted(paths)
+
+    def camera_location(self, fields, path, triggers):
+        serial_number = (fields or {}).get('serial_number')
+        if serial_number is not None:
+            location = triggers.serial_numbers.get(str(serial_number).lstrip('0'))
+            if location is not None:
+                return location
+        # Transfers save files below <photo directory>/<camera location>
+        parts = os.path.normpath(path).split(os.sep)
+        return next((part for part in reversed(parts[:-1]) if part in triggers.triggers), None)
+
+    def add(self, paths):
+        """
+        Reads, matches and appends the files that are not indexed yet.
+        :return: list of the new rows
+        """
+        with self.lock:
+            paths = sorted({os.path.abspath(path) for path in paths} - self.indexed)
+            if not paths:
+                return []
+            headers = dict(self.start_pool().imap_unordered(read_header, paths, chunksize=16))
+            # Read the log after the headers, so it includes every trigger flushed in the meantime
+            if self.triggers is None:
+                self.triggers = SessionTriggers(self.session_path, self.cameras)
+            else:
+                self.triggers.update()
+            triggers = self.triggers
+
+            rows = []
+            for path in paths:
+                fields = headers[path]
+                location = self.camera_location(fields, path, triggers)
+                camera_time = exif_timestamp(fields)
+                utc = None
+                if camera_time is not None:
+                    utc = camera_time - triggers.camera_offsets.get(location, 0.0)
+                trigger, how = triggers.match(location, os.path.basename(path), utc, self.tolerance, self.used)
+
+                row = dict.fromkeys(COLUMNS, '')
+                row.update(path=path, camera=location or '', match=how)
+                if fields:
+                    row.update(serial_number=fields['serial_number'] or '', shutter_count=fields['shutter_count'] or '',
+                               exif_time=fields['datetime_original'] or '')
+                if trigger is not None:
+                    start, end, sequence, frame, position = trigger
+                    utc = (start + end) / 2 if utc is None else utc
+                    row.update(sequence=sequence, frame=frame, distance='' if math.isnan(position) else position,
+                               plot=triggers.plots.get((location, sequence, frame), ''))
+                    position = triggers.position(location, sequence, frame, utc)
+                    if position is not None:
+                        elevation, azimuth = solar.position(utc, *position)
+                        row.update(latitude=f'{position[0]:.8f}', longitude=f'{position[1]:.8f}',
+                                   sun_elevation=f'{elevation:.2f}', sun_azimuth=f'{azimuth:.2f}')
+                if utc is not None:
+                    row['time'] = f'{utc:.3f}'
+                rows.append(row)
+
+            new_file = not os.path.exists(self.index_path)
+            os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+            with open(self.index_path, 'a', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=COLUMNS)
+                if new_file:
+                    writer.writeheader()
+                writer.writerows(rows)
+            self.indexed.update(paths)
+            return rows
+
+    def update(self, directory):
+        """
+        Indexes the new photos below directory.
+        :return: list of the new rows
+        """
+        return self.add(self.scan(directory))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+
+class PhotoIndexer(threading.Thread):
+    """
+    Indexes files as they are transferred. submit(path) is a transfer.PhotoTransfer listener; files are
+    collected for batch_interval seconds so the pool reads them in batches.
+    """
+
+    def __init__(self, index, batch_interval=2.0):
+        """
+        :param index: PhotoIndex
+        :param batch_interval: seconds between batches
+        """
+        super().__init__(daemon=True, name='photo indexer')
+        self.index = index
+        self.batch_interval = batch_interval
+        self.queue = queue.Queue()
+        self.stop_event = threading.Event()
+
+    def submit(self, path):
+        self.queue.put(path)
+
+    def index_queued(self):
+        paths = []
+        while True:
+            try:
+                paths.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if paths:
+            try:
+                self.index.add(paths)
+            except Exception as e:  # unreadable session log or index, the files are indexed on the next run
+                print(f'Could not index {len(paths)} photos: {e}')
+
+    def run(self):
+        while not self.stop_event.wait(self.batch_interval):
+            self.index_queued()
+        self.index_queued()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.is_alive():
+            self.join()
+        self.index.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Index the photos of a CameraCart session.')
+    parser.add_argument('session', help='session log (.ccsession)')
+    parser.add_argument('photos', help='directory the photos were transferred to')
+    parser.add_argument('--index', help='CSV index, defaults to <session>.photos.csv')
+    parser.add_argument('--cameras', default=camera_array.DEFAULT_PATH, help='camera array JSON file')
+    parser.add_argument('--processes', type=int, help='processes reading EXIF headers')
+    parser.add_argument('--watch', type=float, metavar='SECONDS',
+                        help='keep indexing new files, checking every SECONDS')
+    args = parser.parse_args()
+
+    index = PhotoIndex(args.session, args.index or args.session + '.photos.csv', camera_array.load(args.cameras),
+                       args.processes)
+    try:
+        while True:
+            start = time.monotonic()
+            rows = index.update(args.photos)
+            if rows:
+                matched = sum(1 for row in rows if row['match'])
+                print(f'Indexed {len(rows)} photos in {time.monotonic() - start:.1f} s, {matched} matched to '
+                      f'triggers.')
+            if args.watch is None:
+                break
+            time.sleep(args.watch)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        index.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -66,5 +66,7 @@ def collect_photos_as_fast_as_possible():
     p2.join()
 
 
-while True:
-    collect_photos_as_fast_as_possible()
\ No newline at end of file
+# Superseded by benchmark.py, kept for reference
+if __name__ == '__main__':
+    while True:
+        collect_photos_as_fast_as_possible()
\ No newline at end of file
@@ -1,7 +1,26 @@
-import cameracart
+import argparse
 
-# Check that cameras are on
+# Cameras are checked when the cart starts (problems are printed) and with the Check Cameras button
 
-cart = cameracart.CameraCart('nmsu_2023')
-cart.window.show()
-cart.app.exec_()
+
+def main():
+    import engine
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--headless', action='store_true', help='run without the window, e.g. over SSH')
+    engine.add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.headless:
+        engine.CartEngine('nmsu_2023', **engine.engine_kwargs(args)).run_forever()
+    else:
+        import cameracart
+
+        cart = cameracart.CameraCart('nmsu_2023', **engine.engine_kwargs(args))
+        cart.window.show()
+        cart.app.exec_()
+
+
+# Worker processes (e.g. ingest's header pool) import this module again, they must not start a second cart
+if __name__ == '__main__':
+    main()
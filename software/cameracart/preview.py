@@ -0,0 +1,118 @@
+"""
+Live view from all cameras, for checking focus and framing without taking photos.
+
+Each camera gets a thread that pulls live view frames (gp_camera_capture_preview, small JPEGs that never touch the
+card) at most fps times per second and hands them to a decode function on that same thread, so the GUI thread only
+draws finished frames. Frame data is copied into a buffer that is reused, and decode gets the older of two frames to
+decode into, so memory stays flat however long the preview runs. Live view is closed when the preview stops or the
+cart starts moving.
+"""
+import threading
+import time
+
+import sensors
+
+
+class PreviewStream(threading.Thread):
+    def __init__(self, camera, fps=5.0, decode=None, gate=None, clock=time.monotonic):
+        """
+        :param camera: sensors.Camera
+        :param fps: frames per second at most
+        :param decode: function(data, frame) -> frame run on this thread for every frame. data is a memoryview of
+        the JPEG, only valid during the call; frame is the object returned two frames earlier (None for the first
+        two) and may be reused. Without decode, frames are the JPEG bytes.
+        :param gate: transfer.MovementGate, the preview stops when the cart moves
+        :param clock: monotonic clock
+        """
+        super().__init__(daemon=True, name=f'{camera.location} camera preview')
+        self.camera = camera
+        self.interval = 1 / fps
+        self.decode = decode
+        self.gate = gate
+        self.clock = clock
+        self.stop_event = threading.Event()
+
+        self.lock = threading.Lock()
+        self.buffer = bytearray(256 * 1024)
+        self.frames = [None, None]
+        self.current = None  # index of the newest frame in frames
+        self.frame_number = 0
+        self.error = None
+
+    def latest(self):
+        """
+        :return: (frame number, frame), frame is None before the first one. Hold self.lock while using a frame
+        that decode reuses.
+        """
+        with self.lock:
+            return self.frame_number, None if self.current is None else self.frames[self.current]
+
+    def capture(self):
+        """
+        Pulls one live view frame into the buffer.
+        :return: memoryview of the frame's data
+        """
+        with self.camera.lock:
+            camera_file = sensors.gp.check_result(sensors.gp.gp_camera_capture_preview(self.camera.camera))
+            data = sensors.gp.check_result(sensors.gp.gp_file_get_data_and_size(camera_file))
+            size = len(data)
+            if size > len(self.buffer):
+                self.buffer = bytearray(size)
+            self.buffer[:size] = data
+        return memoryview(self.buffer)[:size]
+
+    def run(self):
+        next_frame = self.clock()
+        try:
+            while not self.stop_event.is_set():
+                if self.gate is not None and self.gate.is_moving():
+                    print(f'{self.camera.location} camera preview stopped, the cart is moving.')
+                    break
+                data = self.capture()
+                slot = 0 if self.current != 0 else 1
+                if self.decode is None:
+                    frame = bytes(data)
+                else:
+                    frame = self.decode(data, self.frames[slot])
+                data.release()
+                with self.lock:
+                    self.frames[slot] = frame
+                    self.current = slot
+                    self.frame_number += 1
+
+                next_frame = max(next_frame + self.interval, self.clock())
+                self.stop_event.wait(next_frame - self.clock())
+        except Exception as e:  # gphoto error, e.g. camera unplugged
+            self.error = e
+            print(f'{self.camera.location} camera preview stopped: {e}')
+        finally:
+            self.close_live_view()
+
+    def close_live_view(self):
+        try:
+            with self.camera.lock:
+                # The camera opened live view by itself, so the cached config still has it closed
+                self.camera.config_cache.refresh()
+                self.camera.set_config2({'viewfinder': 0})
+        except Exception as e:  # camera gone, live view ends with it
+            print(f'Could not close live view of {self.camera.location} camera: {e}')
+
+    def stop(self):
+        self.stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()
+
+
+def autofocus(camera, settle=1.0):
+    """
+    Focuses with the camera's autofocus and switches back to manual focus, so the focus stays put during the run.
+    Nothing is captured, so the card is not touched; with the preview running the result shows within seconds.
+    :param settle: seconds for the lens to focus
+    """
+    camera.set_config({'focusmode2': 0})  # AF-S
+    try:
+        camera.set_config2({'autofocusdrive': 1})
+        time.sleep(settle)
+    finally:
+        camera.set_config2({'autofocusdrive': 0})
+        camera.set_config({'focusmode2': 4})  # MF (selection)
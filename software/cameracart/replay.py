@@ -0,0 +1,269 @@
+import bisect
+import csv
+import heapq
+import random
+import threading
+import time
+
+import gps
+import session
+
+REAL_TIME = 1.0
+AS_FAST_AS_POSSIBLE = None
+
+
+class ReplayClock:
+    """
+    Monotonic clock for replayed runs.
+
+    With a scale, replay time runs that many times faster than real time. Without one (AS_FAST_AS_POSSIBLE) time
+    is virtual and only moves when the replay engine advances it, so runs are exactly reproducible.
+    Pass clock.now as the clock of MovementSensor, TriggerDispatcher etc. and clock.sleep as their sleep function
+    (TriggerDispatcher, emulators.GPhoto2Simulator.set_clock) so they all see replay time. With a virtual clock,
+    a thread in sleep() blocks until the replay engine has advanced time to its wake-up time.
+    """
+
+    def __init__(self, scale=REAL_TIME, start=0.0):
+        self.scale = scale
+        self.start = start
+        self.virtual_time = start
+        self.real_start = time.monotonic()
+        self.condition = threading.Condition()
+        self.wake_times = []  # heap of the times threads in sleep() wake up at, only with a virtual clock
+
+    @property
+    def virtual(self):
+        return self.scale is None
+
+    def now(self):
+        if self.virtual:
+            return self.virtual_time
+        return self.start + (time.monotonic() - self.real_start) * self.scale
+
+    def sleep(self, seconds):
+        """
+        Waits seconds of replay time.
+        """
+        if not self.virtual:
+            time.sleep(max(seconds, 0) / self.scale)
+            return
+        with self.condition:
+            wake_time = self.virtual_time + seconds
+            if wake_time <= self.virtual_time:
+                return
+            heapq.heappush(self.wake_times, wake_time)
+            self.condition.wait_for(lambda: self.virtual_time >= wake_time)
+
+    def sleeping(self):
+        """
+        :return: number of threads waiting in sleep() for virtual time to advance
+        """
+        with self.condition:
+            return len(self.wake_times)
+
+    def next_wake_time(self):
+        with self.condition:
+            return self.wake_times[0] if self.wake_times else None
+
+    def advance(self, t):
+        """
+        Moves virtual time forward to t and wakes the threads sleeping until then.
+        """
+        with self.condition:
+            self.virtual_time = max(self.virtual_time, t)
+            while self.wake_times and self.wake_times[0] <= self.virtual_time:
+                heapq.heappop(self.wake_times)
+            self.condition.notify_all()
+
+    def sleep_until(self, t, stop_event=None):
+        """
+        :return: False if stop_event was set while waiting
+        """
+        if self.virtual:
+            self.advance(t)
+            return True
+        delay = (t - self.now()) / self.scale
+        if delay <= 0:
+            return True
+        if stop_event is None:
+            time.sleep(delay)
+            return True
+        return not stop_event.wait(delay)
+
+
+class Timeline:
+    """
+    Recorded (or generated) wheel pulse and GPS timestamps, in seconds from the start of the run.
+    """
+
+    def __init__(self, pulses=(), gps=()):
+        """
+        :param pulses: pulse times
+        :param gps: (time, latitude, longitude, altitude) tuples
+        """
+        self.pulses = sorted(pulses)
+        self.gps = sorted(gps)
+        start = min(self.pulses[:1] + [fix[0] for fix in self.gps[:1]], default=0)
+        self.pulses = [t - start for t in self.pulses]
+        self.gps = [(t - start,) + tuple(fix) for t, *fix in self.gps]
+
+    @property
+    def duration(self):
+        return max(self.pulses[-1:] + [fix[0] for fix in self.gps[-1:]], default=0)
+
+    def events(self):
+        """
+        :return: time ordered list of ('pulse', time, None) and ('gps', time, (latitude, longitude, altitude))
+        """
+        events = [('pulse', t, None) for t in self.pulses] + [('gps', t, tuple(fix)) for t, *fix in self.gps]
+        events.sort(key=lambda event: event[1])
+        return events
+
+    @classmethod
+    def from_session(cls, path):
+        pulses = []
+        gps = []
+        for row in session.iter_rows(path):
+            if row['event'] == 'pulse':
+                pulses.append(float(row['time']))
+            elif row['event'] == 'gps':
+                gps.append((float(row['time']), float(row['value1']), float(row['value2']), float(row['value3'])))
+        return cls(pulses, gps)
+
+    @classmethod
+    def from_csv(cls, path):
+        """
+        Reads a CSV written by session.export_csv (only the time, event and value columns are needed).
+        """
+        pulses = []
+        gps = []
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                if row['event'] == 'pulse':
+                    pulses.append(float(row['time']))
+                elif row['event'] == 'gps':
+                    gps.append((float(row['time']), float(row['value1']), float(row['value2']),
+                                float(row['value3'])))
+        return cls(pulses, gps)
+
+    @classmethod
+    def constant_speed(cls, speed, distance, movement_distance=19.5, jitter=0.0, seed=None):
+        """
+        Generates pulses for a cart moving at a constant speed.
+        :param speed: centimeters per second
+        :param distance: centimeters travelled
+        :param movement_distance: centimeters between pulses
+        :param jitter: relative standard deviation of the time between pulses
+        :param seed: random seed
+        """
+        rng = random.Random(seed)
+        period = movement_distance / speed
+        pulses = []
+        t = 0.0
+        for _ in range(int(distance // movement_distance)):
+            t += max(period * (1 + rng.gauss(0, jitter)) if jitter else period, 0)
+            pulses.append(t)
+        return cls(pulses)
+
+    def slice(self, start, end):
+        i, j = bisect.bisect_left(self.pulses, start), bisect.bisect_left(self.pulses, end)
+        return Timeline(self.pulses[i:j], [fix for fix in self.gps if start <= fix[0] < end])
+
+
+class ReplayEngine:
+    """
+    Feeds a timeline into the real pipeline.
+
+    Pulses enter through MovementSensor.edge_callback, the same entry point the GPIO library uses, so debouncing,
+    distance counting, triggering and recording all run as they would on the cart. GPS fixes are passed to the
+    fix listeners as gps.Fix, like sensors.GPS does (e.g. CartEngine.on_fix).
+
+    When the clock is virtual, pulses are processed synchronously and time only moves on once the pipeline is
+    idle: every thread busy() counts is asleep in clock.sleep. Time then jumps to the next pulse, fix, scheduler
+    due time or wake-up time, whichever is first, so a run takes as long as its computation and its results do
+    not depend on thread timing.
+    """
+
+    def __init__(self, timeline, movement_sensor, clock, schedulers=(), busy=None, idle_timeout=10.0):
+        """
+        :param timeline: Timeline to replay
+        :param movement_sensor: sensors.MovementSensor, created with clock=clock.now
+        :param clock: ReplayClock
+        :param schedulers: objects with a poll(now) method returning the next due time, e.g.
+        triggering.PredictiveTrigger (only polled by the engine when the clock is virtual)
+        :param busy: callable returning the number of threads with work left when the clock is virtual, e.g. the
+        camera workers with pending triggers of a TriggerDispatcher created with sleep=clock.sleep
+        :param idle_timeout: real seconds to wait for the pipeline to become idle before giving up
+        """
+        self.timeline = timeline
+        self.movement_sensor = movement_sensor
+        self.clock = clock
+        self.schedulers = list(schedulers)
+        self.busy = busy
+        self.idle_timeout = idle_timeout
+        self.fix_listeners = []  # called with a gps.Fix for every replayed fix
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.pulses_replayed = 0
+
+    def wait_idle(self):
+        """
+        Waits (in real time) until every busy thread is asleep in clock.sleep.
+        """
+        if self.busy is None:
+            return
+        deadline = time.monotonic() + self.idle_timeout
+        while self.busy() > self.clock.sleeping():
+            if time.monotonic() > deadline:
+                raise RuntimeError(f'Replay pipeline still busy after {self.idle_timeout} s at replay time '
+                                   f'{self.clock.now():.3f}')
+            time.sleep(0.0001)
+
+    def run_until(self, until):
+        """
+        Advances virtual time through every scheduler due time and wake-up time up to until.
+        """
+        while not self.stop_event.is_set():
+            self.wait_idle()
+            due = [t for t in (scheduler.poll(self.clock.now()) for scheduler in self.schedulers) if t is not None]
+            # Triggers the schedulers dispatched may be about to sleep until their release time
+            self.wait_idle()
+            wake_time = self.clock.next_wake_time()
+            if wake_time is not None:
+                due.append(wake_time)
+            if not due or min(due) > until:
+                break
+            self.clock.advance(min(due))
+        if until != float('inf'):
+            self.clock.advance(until)
+
+    def run(self):
+        start = self.clock.now()
+        for event, t, data in self.timeline.events():
+            if self.clock.virtual:
+                self.run_until(start + t)
+            if not self.clock.sleep_until(start + t, self.stop_event):
+                break
+
+            if event == 'pulse':
+                self.movement_sensor.edge_callback(self.movement_sensor.GPIO_PIN)
+                if self.clock.virtual:
+                    self.movement_sensor.process_pulses()
+                self.pulses_replayed += 1
+            else:
+                latitude, longitude, altitude = data
+                fix = gps.Fix(self.clock.now(), latitude, longitude, altitude)
+                for listener in self.fix_listeners:
+                    listener(fix)
+
+        if self.clock.virtual:
+            self.run_until(float('inf'))
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True, name='replay')
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
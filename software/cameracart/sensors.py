@@ -1,86 +1,133 @@
-from PyQt5 import QtCore
+import collections
+import json
+import os
 import platform
 import time
-import ntplib
-import gphoto2 as gp
 import emulators
+import gps
 import re
+import sys
+import threading
 
 
-def wait_for_time_sync():
-    """
-    By including this function at the front of the file, proper time synchronization with NTP will occur first,
-    but requires use of internet. It's possible time could be obtained in another manner, such as through camera.
-    """
-
-    max_wait_time = 60  # seconds
-    now = time.time()
-    timeout = now + max_wait_time
-    remaining = timeout - now
-    print_connection_error = True
-    synchronized = False
-
-    while remaining >= 0:
-        try:
-            c = ntplib.NTPClient()
-            response = c.request('pool.ntp.org', version=3)
-        except Exception as e:
-            print(f'Error connecting to pool.ntp.org: {e}')
-        try:
-            difference = response.tx_time - time.time()
-            if abs(difference) < 10:
-                print(f"System time is synchronized with an NTP server ({round(difference, 2)}s offset).")
-                synchronized = True
-                break
-            elif abs(difference) > 10:
-                print("System time is not yet synchronized with an NTP server. Please wait...")
-        except NameError:
-            if print_connection_error:
-                print("Error checking NTP server. Are you connected to the internet?")
-                print_connection_error = False
-        remaining = timeout - time.time()
-        print(f"Waiting for NTP synchronization. ({round(remaining)}s remaining)              ", end="\r")
-        time.sleep(1)
-
-    return synchronized
-
-#wait_for_time_sync()
-
 if platform.node() == 'cameracart':
     import RPi.GPIO as GPIO
-    import adafruit_gps
     import serial
 else:
-    print(f'Simulating GPIO library because hostname is {platform.node()} and assumed not to be a raspberry pi!')
+    # Diagnostics go to stderr, so tools that write results to stdout (e.g. benchmark.py) stay parseable
+    print(f'Simulating GPIO library because hostname is {platform.node()} and assumed not to be a raspberry pi!',
+          file=sys.stderr)
     GPIO = emulators.GPIOSimulator()
-    adafruit_gps = emulators.GPSSimulator()
     serial = emulators.SerialSimulatior()
 
+# Cameras are simulated if gphoto2 is not installed or CAMERACART_SIMULATE_CAMERAS is set, e.g. for benchmarks
+if os.environ.get('CAMERACART_SIMULATE_CAMERAS'):
+    gp = emulators.GPhoto2Simulator()
+else:
+    try:
+        import gphoto2 as gp
+    except ImportError:
+        print('Simulating cameras because the gphoto2 library is not installed!', file=sys.stderr)
+        gp = emulators.GPhoto2Simulator()
+
 
 def gpio_setup(gpio_pin):
     GPIO.setmode(GPIO.BCM)
     GPIO.setup(gpio_pin, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
 
 
-class MovementSensor(QtCore.QObject):
-    moved = QtCore.pyqtSignal()
-
-    def __init__(self, gpio_pin, movement_distance):
-        super().__init__()
+class MovementSensor:
+    POLL = 'poll'
+    EDGE = 'edge'
 
+    def __init__(self, gpio_pin, movement_distance, mode=POLL, debounce=0.005, poll_interval=0.05,
+                 clock=time.monotonic):
+        """
+        :param gpio_pin: BCM pin the wheel magnet sensor is connected to
+        :param movement_distance: distance travelled between magnet pulses, in centimeters
+        :param mode: MovementSensor.EDGE uses GPIO edge callbacks, MovementSensor.POLL calls moved_ every
+        poll_interval (fallback if edge detection is unavailable)
+        :param debounce: minimum time in seconds between two accepted pulses
+        :param poll_interval: seconds between checks of the magnet in MovementSensor.POLL mode. If the magnet fails,
+        set it to between 0.5 and 1 s and uncomment the lines in moved_
+        :param clock: monotonic clock used to timestamp pulses
+        """
         self.GPIO_PIN = gpio_pin
         gpio_setup(self.GPIO_PIN)
 
         self.movement_distance = movement_distance  # in centimeters
+        self.mode = mode
+        self.debounce = debounce  # in seconds
+        self.poll_interval = poll_interval  # in seconds
+        self.clock = clock
 
         self.cumulative_movements = 0
         self.cumulative_distance = 0
 
+        # Timestamps of accepted pulses, newest last
+        self.pulse_times = collections.deque(maxlen=64)
+        self.last_pulse_time = None
+        self.bounces = 0
+
+        # Called with (pulse time, cumulative distance) for every pulse, from the sensor's thread
+        self.listeners = []
+
+        # Pulses are appended by the GPIO callback thread and popped by the sensor's thread.
+        # deque.append and deque.popleft are atomic, so no lock is needed between the two.
+        self.pulse_queue = collections.deque()
+        self.pulse_event = threading.Event()
+        self._last_edge_time = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
         # Magnet state refers to whether magnet was detected or not
         self.previous_magnet_state = self.detect_magnet()
-        self.magnet_state = self.detect_magnet()
+        self.magnet_state = self.previous_magnet_state
 
-        #self.moved_q = multiprocessing.Queue()
+        if self.mode == MovementSensor.EDGE:
+            self.start_edge_detection()
+
+    def add_listener(self, listener):
+        """
+        :param listener: callable(pulse_time, cumulative_distance), should return quickly
+        """
+        self.listeners.append(listener)
+
+    def start(self):
+        """
+        Starts the sensor's thread, which processes edges (or polls the magnet in MovementSensor.POLL mode).
+        """
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True, name='movement sensor')
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.pulse_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        if self.mode == MovementSensor.EDGE:
+            self.stop_edge_detection()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            if self.mode == MovementSensor.EDGE:
+                self.pulse_event.wait()
+                self.pulse_event.clear()
+                self.process_pulses()
+            else:
+                self.moved_()
+                self.stop_event.wait(self.poll_interval)
+
+    def start_edge_detection(self):
+        try:
+            GPIO.add_event_detect(self.GPIO_PIN, GPIO.RISING, callback=self.edge_callback)
+        except RuntimeError as e:
+            print(f'Could not add edge detection on GPIO pin {self.GPIO_PIN}, falling back to polling: {e}')
+            self.mode = MovementSensor.POLL
+
+    def stop_edge_detection(self):
+        GPIO.remove_event_detect(self.GPIO_PIN)
 
     def detect_magnet(self):
         """
@@ -92,141 +139,292 @@ class MovementSensor(QtCore.QObject):
         else:
             return False
 
-    @QtCore.pyqtSlot()
+    def edge_callback(self, channel=None):
+        """
+        Called from the GPIO library's callback thread on a rising edge. Only timestamps and debounces the pulse,
+        everything else happens in process_pulses on the sensor's thread.
+        """
+        now = self.clock()
+        if self._last_edge_time is not None and now - self._last_edge_time < self.debounce:
+            self.bounces += 1
+            return
+        self._last_edge_time = now
+        self.pulse_queue.append(now)
+        self.pulse_event.set()
+
+    def process_pulses(self):
+        """
+        Drains pulses queued by edge_callback.
+        """
+        while True:
+            try:
+                pulse_time = self.pulse_queue.popleft()
+            except IndexError:
+                break
+            self.register_movement(pulse_time)
+
+    def register_movement(self, pulse_time):
+        """
+        Updates self.cumulative_movements and self.cumulative_distance for one pulse and notifies the listeners.
+        :param pulse_time: monotonic timestamp of the pulse
+        """
+        self.cumulative_movements += 1
+        self.cumulative_distance = self.cumulative_movements * self.movement_distance
+        self.last_pulse_time = pulse_time
+        self.pulse_times.append(pulse_time)
+        # Nothing is printed here, this runs between the pulse and the triggers; the window and
+        # CartEngine.run_forever show the distance on their own schedule
+        for listener in self.listeners:
+            listener(pulse_time, self.cumulative_distance)
+
     def moved_(self):
         """
         Checks for change in magnet state (cart moved). If magnet state changed from False to True, self.cumulative_movements
-        and self.cumulative_distance are updated.
+        and self.cumulative_distance are updated. Only used in MovementSensor.POLL mode.
         :return: True
         """
         self.previous_magnet_state = self.magnet_state
         magnet_state = self.detect_magnet()
         
         # Uncomment these two lines if magnet fails
-        # Then set timer to run every 1 second or so (1000 ms)
+        # Then set poll_interval to 1 second or so
         #self.previous_magnet_state = False
         #magnet_state = True
 
         if magnet_state:
             if not self.previous_magnet_state:
-                print('\a', end='\r')
-                self.cumulative_movements += 1
-                self.cumulative_distance = self.cumulative_movements * self.movement_distance
                 self.magnet_state = magnet_state
-                print(f'Number of movements detected: {self.cumulative_movements}, '
-                      f' Distance Traveled: {self.cumulative_distance / 100} meters')
-                self.moved.emit()
+                self.register_movement(self.clock())
         else:
             self.magnet_state = magnet_state
 
 
-class GPS(QtCore.QObject):
-    gps_lat = QtCore.pyqtSignal([float])
-    gps_lon = QtCore.pyqtSignal([float])
+class GPS(threading.Thread):
+    """
+    Reads the GPS's NMEA stream on its own thread.
+
+    Sentences are parsed as they arrive and every fix is passed to the listeners together with the monotonic time
+    its sentence was received, so fixes can be lined up with wheel pulses.
+    """
+
+    def __init__(self, port='/dev/ttyS0', baudrate=9600, rate=10, fast_baudrate=57600, clock=time.monotonic):
+        """
+        :param port: serial port of the GPS
+        :param baudrate: baud rate the GPS starts with
+        :param rate: fixes per second, at most 10
+        :param fast_baudrate: baud rate switched to for more than 5 fixes per second, 9600 baud is too slow for
+        GGA and RMC at 10 Hz
+        :param clock: monotonic clock, should be the same one the movement sensor uses
+        """
+        super().__init__(daemon=True, name='gps')
+        self.port = port
+        self.rate = rate
+        self.clock = clock
+        self.parser = gps.NMEAParser()
+        self.fix = None
+        self.fixes = 0
+        self.stop_event = threading.Event()
+
+        # Called with a gps.Fix for every fix
+        self.listeners = []
+
+        self.uart = serial.Serial(port, baudrate=baudrate, timeout=1)
+        if rate > 5 and fast_baudrate != baudrate:
+            self.uart.write(gps.pmtk(f'PMTK251,{fast_baudrate}'))
+            self.uart.flush()
+            time.sleep(0.1)
+            self.uart.close()
+            self.uart = serial.Serial(port, baudrate=fast_baudrate, timeout=1)
+
+        # Only GGA (position) and RMC (date, speed, course)
+        self.uart.write(gps.pmtk('PMTK314,0,1,0,1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0'))
+        self.uart.write(gps.pmtk(f'PMTK220,{int(1000 / rate)}'))
+
+    @property
+    def current_lat(self):
+        return None if self.fix is None else self.fix.latitude
+
+    @property
+    def current_lon(self):
+        return None if self.fix is None else self.fix.longitude
+
+    def update(self):
+        """
+        Reads and handles one sentence.
+        """
+        line = self.uart.readline()
+        if not line:
+            return
+        fix = self.parser.parse(line, self.clock())
+        if fix is None:
+            return
+        self.fix = fix
+        self.fixes += 1
+        for listener in self.listeners:
+            listener(fix)
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.update()
+            except Exception as e:  # serial error
+                print(f'GPS error: {e}')
+                self.stop_event.wait(1)
+        self.uart.close()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.is_alive():
+            self.join()
+
 
+class IMU:
     def __init__(self):
-        super().__init__()
+        self.direction = None
 
-        uart = serial.Serial("/dev/ttyS0", baudrate=9600, timeout=3000)
-        self.gps = adafruit_gps.GPS(uart, debug=False)
 
-        self.gps.send_command(b'PMTK314,0,1,0,1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0')
+class CameraConfig:
+    """
+    Cached copy of a camera's configuration widget tree.
 
-        # 1000 = update every 1000 ms
-        self.gps.send_command(b'PMTK220, 1000')
+    The tree is fetched from the camera once, so looking up widgets and choices does not cost a USB round trip.
+    Changes are applied to the cached tree and pushed to the camera with a single gp_camera_set_config call.
+    """
 
-        self.current_lon = None
-        self.current_lat = None
+    def __init__(self, camera):
+        self.camera = camera
+        self.tree = None
+        self.widgets = {}  # name -> widget
+        self.choices = {}  # name -> list of choices, only for radio and menu widgets
 
-    @QtCore.pyqtSlot()
-    def update(self):
-        self.gps.update()
+    def refresh(self):
+        """
+        Fetches the widget tree from the camera and rebuilds the name and choice lookups.
+        """
+        self.tree = gp.check_result(gp.gp_camera_get_config(self.camera))
+        self.widgets = {}
+        self.choices = {}
+        self._index(self.tree)
+
+    def _index(self, widget):
+        for i in range(gp.check_result(gp.gp_widget_count_children(widget))):
+            child = gp.check_result(gp.gp_widget_get_child(widget, i))
+            name = gp.check_result(gp.gp_widget_get_name(child))
+            widget_type = gp.check_result(gp.gp_widget_get_type(child))
+            if widget_type in (gp.GP_WIDGET_WINDOW, gp.GP_WIDGET_SECTION):
+                self._index(child)
+                continue
+            self.widgets[name] = child
+            if widget_type in (gp.GP_WIDGET_RADIO, gp.GP_WIDGET_MENU):
+                count = gp.check_result(gp.gp_widget_count_choices(child))
+                self.choices[name] = [gp.check_result(gp.gp_widget_get_choice(child, n)) for n in range(count)]
+
+    def widget(self, key):
+        if self.tree is None:
+            self.refresh()
+        try:
+            return self.widgets[key]
+        except KeyError:
+            raise KeyError(f'Camera has no config item named {key}') from None
 
-        if not self.gps.has_fix:
-            pass
-        else:
-            self.current_lat = self.gps.latitude
-            self.current_lon = self.gps.longitude
+    def get_value(self, key):
+        return gp.check_result(gp.gp_widget_get_value(self.widget(key)))
+
+    def resolve(self, key, value):
+        """
+        Converts a choice index into the choice itself. Values of widgets without choices are returned unchanged.
+        """
+        self.widget(key)
+        if key not in self.choices:
+            return value
+        choices = self.choices[key]
+        if value < 0 or value >= len(choices):
+            raise ValueError(f'Parameter out of range: {key} has {len(choices)} choices, got {value}')
+        return choices[value]
+
+    def diff(self, dict_, by_index=True):
+        """
+        :return: dict of the items in dict_ that differ from the camera's current values, with resolved values
+        """
+        changes = {}
+        for key, value in dict_.items():
+            if by_index:
+                value = self.resolve(key, value)
+            if self.get_value(key) != value:
+                changes[key] = value
+        return changes
+
+    def apply(self, dict_, by_index=True):
+        """
+        Sets every changed item of dict_ and pushes them to the camera in one round trip.
+        :param dict_: config item name -> value
+        :param by_index: if True, values of radio and menu widgets are choice indices
+        :return: dict of the items that were changed, with resolved values
+        """
+        changes = self.diff(dict_, by_index=by_index)
+        if not changes:
+            return changes
 
-            self.gps_lat.emit(self.current_lat)
-            self.gps_lon.emit(self.current_lon)
+        for key, value in changes.items():
+            gp.check_result(gp.gp_widget_set_value(self.widgets[key], value))
+        try:
+            gp.check_result(gp.gp_camera_set_config(self.camera, self.tree))
+        except gp.GPhoto2Error:
+            # Cached tree may be stale (e.g. a dial was turned), so fetch it again on the next call
+            self.tree = None
+            raise
+        for key in changes:
+            gp.check_result(gp.gp_widget_set_changed(self.widgets[key], 0))
 
+        return changes
 
-class IMU:
-    def __init__(self):
-        self.direction = None
 
+class Camera:
+    # Results of save
+    SAVED = 'saved'
+    SKIPPED = 'skipped'  # the file was already there with the same size
+    STOPPED = 'stopped'  # before_chunk stopped the download
 
-class Camera(QtCore.QObject):
     def __init__(self, name=None, location=None, config=None, serial_number=None):
-        super().__init__()
-
         self.camera, self.name, self.address = self.load_camera_from_serial_number(name, serial_number)
         self.location = location
         self.photos_df = None
         self.config = config
+        self.config_cache = CameraConfig(self.camera)
+        self.lock = threading.RLock()  # gphoto2 calls on the same camera must not overlap
         self.trigger_lock = False  # Prevent camera from being retriggered before prior trigger finished
         self.triggers = 0
+        self.refused = False  # the last trigger failed because the camera was busy
 
         if self.config is not None:
             self.set_config(self.config)
 
     def set_config(self, dict_):
-        for key, value in dict_.items():
-            # get camera's config
-            config = gp.check_result(gp.gp_camera_get_config(self.camera))
-
-            # find the config item
-            config_item = gp.check_result(gp.gp_widget_get_child_by_name(config, key))
-
-            # check if value is in range
-            count = gp.check_result(gp.gp_widget_count_choices(config_item))
-            if value < 0 or value >= count:
-                print('Parameter out of range')
-
-            # set value
-            value = gp.check_result(gp.gp_widget_get_choice(config_item, value))
-            gp.check_result(gp.gp_widget_set_value(config_item, value))
-
-            # set config
-            gp.check_result(gp.gp_camera_set_config(self.camera, config))
-
+        """
+        Sets config items by choice index. Items that already have the requested value are skipped and all others
+        are sent to the camera at once.
+        """
+        with self.lock:
+            changes = self.config_cache.apply(dict_)
+        for key, value in changes.items():
             print(f'{self.location} camera {key} set to {value}.')
-            
-    def set_config2(self, dict_):
-        for key, value in dict_.items():
-            # get camera's config
-            config = gp.check_result(gp.gp_camera_get_config(self.camera))
-
-            # find the config item
-            config_item = gp.check_result(gp.gp_widget_get_child_by_name(config, key))
-
-            # check if value is in range
-            #count = gp.check_result(gp.gp_widget_count_choices(config_item))
-            #if value < 0 or value >= count:
-            #    print('Parameter out of range')
-
-            # set value
-            #value = gp.check_result(gp.gp_widget_get_choice(config_item, value))
-            gp.check_result(gp.gp_widget_set_value(config_item, value))
-
-            # set config
-            gp.check_result(gp.gp_camera_set_config(self.camera, config))
 
+    def set_config2(self, dict_):
+        """
+        Same as set_config, but values are set as given instead of by choice index.
+        """
+        with self.lock:
+            changes = self.config_cache.apply(dict_, by_index=False)
+        for key, value in changes.items():
             print(f'{self.location} camera {key} set to {value}.')
 
     def load_camera_from_serial_number(self, name, serial_number):
-        # camera_list = read_cameras()
-        global camera_list
-        for camera in camera_list:
-            name_ = camera[0]
-            address_ = camera[1]
-            serial_number_ = camera[2]
-            if name_ == name and serial_number_ == serial_number:
-                camera_ = self.load_camera(name_, address_)
-                print(name_, address_)
-                return camera_, name_, address_
-        raise ValueError(f'{name} with serial number {serial_number} could not be loaded!')
+        address_ = get_camera_registry().lookup(name, serial_number)
+        if address_ is None:
+            raise ValueError(f'{name} with serial number {serial_number} could not be loaded!')
+        camera_ = self.load_camera(name, address_)
+        print(name, address_)
+        return camera_, name, address_
 
     @staticmethod
     def load_camera(name, address):
@@ -247,19 +445,97 @@ class Camera(QtCore.QObject):
             return camera
 
     def trigger(self):
+        """
+        :return: True if the camera was triggered. If not, refused is True if the camera was busy.
+        """
         self.trigger_lock = True
+        success = False
+        self.refused = False
         try:
-            self.camera.trigger_capture()
+            with self.lock:
+                self.camera.trigger_capture()
             self.triggers += 1
+            success = True
         except Exception as e:  # gphoto error
+            # Busy: the camera's buffer is full, it works but cannot take another photo yet
+            self.refused = getattr(e, 'code', None) == gp.GP_ERROR_CAMERA_BUSY
             print(f'{self.location} camera could not trigger, error: {e}.')
         self.trigger_lock = False
+        return success
 
-    def take_and_transfer_photo(self):
-        pass
-
-    def save(self, **kwargs):
-        pass
+    def take_and_transfer_photo(self, directory):
+        """
+        Takes a photo and downloads it.
+        :param directory: directory the photo is saved in
+        :return: path of the saved photo
+        """
+        with self.lock:
+            file_path = gp.check_result(gp.gp_camera_capture(self.camera, gp.GP_CAPTURE_IMAGE))
+        self.triggers += 1
+        path = os.path.join(directory, file_path.name)
+        self.save(file_path.folder, file_path.name, path)
+        return path
+
+    def list_files(self, folder='/'):
+        """
+        :return: list of (folder, name) of every file on the camera below folder
+        """
+        files = []
+        with self.lock:
+            for name, _ in gp.check_result(gp.gp_camera_folder_list_files(self.camera, folder)):
+                files.append((folder, name))
+            folders = [name for name, _ in gp.check_result(gp.gp_camera_folder_list_folders(self.camera, folder))]
+        for name in folders:
+            files.extend(self.list_files(folder.rstrip('/') + '/' + name))
+        return files
+
+    def file_size(self, folder, name):
+        with self.lock:
+            info = gp.check_result(gp.gp_camera_file_get_info(self.camera, folder, name))
+        return info.file.size
+
+    def save(self, folder, name, path, chunk_size=1024 * 1024, before_chunk=None):
+        """
+        Downloads a file in chunks straight to disk. The download goes to path + '.part' first, so an interrupted
+        download is resumed from where it stopped, and the file is only moved to path once its size is verified.
+        :param folder: folder of the file on the camera
+        :param name: name of the file on the camera
+        :param path: where to save the file
+        :param chunk_size: bytes read per USB request, the camera lock is released between chunks
+        :param before_chunk: optional callable run before each chunk, e.g. to pause while the cart is moving.
+        If it returns False the download is stopped.
+        :return: Camera.SAVED, Camera.SKIPPED or Camera.STOPPED
+        """
+        size = self.file_size(folder, name)
+        if os.path.exists(path) and os.path.getsize(path) == size:
+            return Camera.SKIPPED
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        part_path = path + '.part'
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if offset > size:
+            offset = 0
+            os.remove(part_path)
+
+        buffer = bytearray(chunk_size)
+        view = memoryview(buffer)
+        with open(part_path, 'ab') as f:
+            while offset < size:
+                if before_chunk is not None and before_chunk() is False:
+                    return Camera.STOPPED
+                with self.lock:
+                    n = gp.check_result(gp.gp_camera_file_read(self.camera, folder, name, gp.GP_FILE_TYPE_NORMAL,
+                                                               offset, view))
+                if n == 0:
+                    break
+                f.write(view[:n])
+                offset += n
+
+        if os.path.getsize(part_path) != size:
+            raise IOError(f'{self.location} camera {folder}/{name}: expected {size} bytes, '
+                          f'got {os.path.getsize(part_path)}')
+        os.replace(part_path, path)
+        return Camera.SAVED
 
     @staticmethod
     def detect_cameras():
@@ -278,16 +554,104 @@ class Camera(QtCore.QObject):
             # based on IDs
 
 
-def read_cameras():
-    cameras = list(gp.Camera.autodetect())
-    camera_info = []
-    for i, info in enumerate(cameras):
-        name = info[0]
-        address = info[1]
-        serial_number = get_camera_serial_number(name, address)
-        camera_info.append((name, address, serial_number))
+REGISTRY_PATH = os.path.join(os.path.expanduser('~'), '.cameracart', 'camera_registry.json')
+
+
+class CameraRegistry:
+    """
+    On-disk mapping of camera serial number -> model name and USB port.
+
+    Reading a serial number requires opening the camera and parsing its summary, which takes seconds per camera.
+    The registry is checked against gp.Camera.autodetect() (cheap, cameras are not opened) and only cameras on ports
+    that are new or whose model changed are probed again.
+    """
 
-    return camera_info
+    def __init__(self, path=REGISTRY_PATH):
+        self.path = path
+        self.entries = {}  # serial number -> {'name': model name, 'address': USB port}
+        self.validated = False
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                self.entries = {int(serial_number): entry for serial_number, entry in json.load(f).items()}
+        except (OSError, ValueError) as e:
+            self.entries = {}
+            if os.path.exists(self.path):
+                print(f'Could not read camera registry {self.path}: {e}')
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({str(serial_number): entry for serial_number, entry in self.entries.items()}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def update(self):
+        """
+        Validates the registry against the cameras currently connected, probing serial numbers only where needed.
+        """
+        known = {(entry['name'], entry['address']): serial_number for serial_number, entry in self.entries.items()}
+        entries = {}
+        for name, address in gp.Camera.autodetect():
+            serial_number = known.get((name, address))
+            if serial_number is None:
+                try:
+                    serial_number = get_camera_serial_number(name, address)
+                except Exception as e:  # gphoto error, camera busy or summary without serial number
+                    print(f'Could not read serial number of {name} at {address}: {e}')
+                    continue
+            entries[serial_number] = {'name': name, 'address': address}
+
+        if entries != self.entries:
+            self.entries = entries
+            self.save()
+        self.validated = True
+
+    def invalidate(self):
+        """
+        Forces the registry to be validated again on the next lookup, e.g. after a camera was unplugged.
+        """
+        self.validated = False
+
+    def lookup(self, name, serial_number):
+        """
+        :return: USB port of the camera, or None if it is not connected
+        """
+        entry = self.entries.get(serial_number) if self.validated else None
+        if entry is None or entry['name'] != name:
+            # Not validated yet, or the camera was connected after the last validation
+            self.update()
+            entry = self.entries.get(serial_number)
+        if entry is None or entry['name'] != name:
+            return None
+        return entry['address']
+
+    def cameras(self):
+        """
+        :return: list of (name, address, serial_number) of the connected cameras
+        """
+        if not self.validated:
+            self.update()
+        return [(entry['name'], entry['address'], serial_number) for serial_number, entry in self.entries.items()]
+
+
+_camera_registry = None
+
+
+def get_camera_registry():
+    """
+    Registry is created on first use so that importing this module does not touch the cameras.
+    """
+    global _camera_registry
+    if _camera_registry is None:
+        _camera_registry = CameraRegistry()
+    return _camera_registry
+
+
+def read_cameras():
+    return get_camera_registry().cameras()
 
 
 def get_camera_serial_number(name, address):
@@ -315,7 +679,5 @@ def get_camera_serial_number(name, address):
     return serial_number
 
 
-camera_list = read_cameras()
-
 if __name__ == '__main__':
     print('This file is not intended to be executed on its own!')
@@ -0,0 +1,290 @@
+import csv
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Event types
+PULSE = 1  # value1: cumulative distance (cm)
+TRIGGER = 2  # value1: position (cm), value2: delay from issue to capture (s), value3: trigger duration (s)
+CAPTURE = 3  # value1: position (cm), value2: capture latency (s), label: file name
+GPS = 4  # value1: latitude, value2: longitude, value3: altitude (m)
+DROPPED = 5  # value1: position (cm)
+FAILED = 6  # value1: position (cm), value2: delay from issue to capture (s)
+SHOT = 7  # value1: position (cm), value2: release skew between cameras (s), value3: shutter skew between cameras (s)
+LOCATION = 8  # value1: latitude, value2: longitude, value3: position (cm), label: 'interpolated' or 'extrapolated'
+# Without a camera: value1: UTC - event time (s), value2: system clock error (s), value3: uncertainty (s),
+# label: time source. With a camera: value1: camera clock - UTC (s), value3: uncertainty (s)
+CLOCK = 9
+PLOT = 10  # value1: position (cm), value2: row, value3: range, label: plot name
+
+EVENT_NAMES = {PULSE: 'pulse', TRIGGER: 'trigger', CAPTURE: 'capture', GPS: 'gps', DROPPED: 'dropped',
+               FAILED: 'failed', SHOT: 'shot', LOCATION: 'location',
+               CLOCK: 'clock', PLOT: 'plot'}
+
+NO_CAMERA = 255
+
+MAGIC = b'CCSESS01'
+HEADER = struct.Struct('<8sIIdd32x')  # magic, version, record size, wall clock start, monotonic clock start
+RECORD = struct.Struct('<dBBHIddd32s')  # time, event, camera, frame, sequence, value1, value2, value3, label
+VERSION = 1
+
+if np is not None:
+    RECORD_DTYPE = np.dtype([('time', '<f8'), ('event', 'u1'), ('camera', 'u1'), ('frame', '<u2'),
+                             ('sequence', '<u4'), ('value1', '<f8'), ('value2', '<f8'), ('value3', '<f8'),
+                             ('label', 'S32')])
+
+FIELDS = ('time', 'event', 'camera', 'frame', 'sequence', 'value1', 'value2', 'value3', 'label')
+
+
+class SessionRecorder:
+    """
+    Append-only log of everything that happens during a run, written as fixed-width binary records.
+
+    Records are packed into a buffer and written in batches by a background thread, which also fsyncs the file
+    periodically. After a power loss the file ends in at most one partial record, which readers ignore, so at most
+    fsync_interval seconds of events are lost. Camera names and start times are kept in a JSON file next to the log.
+    """
+
+    def __init__(self, path, clock=time.monotonic, batch_size=256, flush_interval=1.0, fsync_interval=5.0,
+                 metadata=None):
+        """
+        :param path: file the session is written to
+        :param clock: monotonic clock used for event times, should be the same one the movement sensor uses
+        :param batch_size: records buffered before the buffer is written regardless of flush_interval
+        :param flush_interval: seconds between writes of the buffer
+        :param fsync_interval: seconds between fsyncs
+        :param metadata: dict saved in the metadata file, e.g. field name
+        """
+        self.path = path
+        self.clock = clock
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+
+        self.buffer = bytearray(RECORD.size * batch_size)
+        self.buffered = 0
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.last_fsync = time.monotonic()
+
+        self.cameras = []  # camera index -> location
+        self.metadata = dict(metadata or {})
+        self.metadata['wall_start'] = time.time()
+        self.metadata['monotonic_start'] = self.clock()
+        self.metadata['cameras'] = self.cameras
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, self.metadata['wall_start'],
+                                        self.metadata['monotonic_start']))
+        self.save_metadata()
+
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True, name='session recorder')
+        self.thread.start()
+
+    def save_metadata(self):
+        tmp_path = metadata_path(self.path) + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.metadata, f, indent=2)
+        os.replace(tmp_path, metadata_path(self.path))
+
+    def set_metadata(self, key, value):
+        with self.lock:
+            if self.metadata.get(key) == value:
+                return
+            self.metadata[key] = value
+            self.save_metadata()
+
+    def camera_index(self, camera):
+        if camera is None:
+            return NO_CAMERA
+        with self.lock:
+            if camera.location not in self.cameras:
+                self.cameras.append(camera.location)
+                self.save_metadata()
+            return self.cameras.index(camera.location)
+
+    def record(self, event, event_time=None, camera=None, sequence=0, frame=0, value1=math.nan, value2=math.nan,
+               value3=math.nan, label=''):
+        if event_time is None:
+            event_time = self.clock()
+        camera_index = self.camera_index(camera)
+        with self.lock:
+            if (self.buffered + 1) * RECORD.size > len(self.buffer):
+                # Another thread is about to flush, grow rather than wait for it
+                self.buffer.extend(bytes(RECORD.size * self.batch_size))
+            RECORD.pack_into(self.buffer, self.buffered * RECORD.size, event_time, event, camera_index, frame,
+                             sequence, value1, value2, value3, label.encode()[:32])
+            self.buffered += 1
+            full = self.buffered >= self.batch_size
+        if full:
+            self.flush()
+
+    def record_pulse(self, pulse_time, distance):
+        self.record(PULSE, pulse_time, value1=distance)
+
+    def record_gps(self, fix_time, latitude, longitude, altitude=math.nan):
+        self.record(GPS, fix_time, value1=latitude, value2=longitude, value3=altitude)
+
+    def record_location(self, camera, trigger, latitude, longitude, interpolated):
+        """
+        Callback for gps.TriggerLocator.
+        """
+        self.record(LOCATION, trigger.started, camera, trigger.sequence, trigger.frame, latitude, longitude,
+                    trigger.position, 'interpolated' if interpolated else 'extrapolated')
+
+    def on_trigger(self, event, camera, trigger):
+        """
+        Listener for triggering.TriggerDispatcher.
+        """
+        if event == 'shot':
+            shot = trigger
+            position = next((t.position for t in shot.triggers if t.position is not None), math.nan)
+            self.record(SHOT, None, None, shot.sequence, 0, position, shot.release_skew, shot.skew)
+            return
+        position = math.nan if trigger.position is None else trigger.position
+        if event == 'completed':
+            self.record(TRIGGER, trigger.started, camera, trigger.sequence, trigger.frame, position, trigger.delay,
+                        trigger.completed - trigger.started)
+        elif event == 'failed':
+            self.record(FAILED, trigger.started, camera, trigger.sequence, trigger.frame, position, trigger.delay)
+        elif event == 'dropped':
+            self.record(DROPPED, trigger.issued, camera, trigger.sequence, trigger.frame, position)
+        elif event == 'confirmed':
+            capture = trigger.capture
+            self.record(CAPTURE, capture.confirmed, camera, trigger.sequence, trigger.frame, position, capture.latency,
+                        label=capture.name)
+
+    def flush(self):
+        with self.write_lock:
+            with self.lock:
+                data = bytes(self.buffer[:self.buffered * RECORD.size])
+                self.buffered = 0
+            if data:
+                self.file.write(data)
+                self.file.flush()
+            if time.monotonic() - self.last_fsync >= self.fsync_interval:
+                os.fsync(self.file.fileno())
+                self.last_fsync = time.monotonic()
+
+    def run(self):
+        while not self.stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join()
+        self.flush()
+        with self.write_lock:
+            os.fsync(self.file.fileno())
+            self.file.close()
+
+
+def metadata_path(path):
+    return path + '.json'
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        magic, version, record_size, wall_start, monotonic_start = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f'{path} is not a session log')
+    if record_size != RECORD.size:
+        raise ValueError(f'{path} has {record_size} byte records, expected {RECORD.size}')
+    return {'version': version, 'wall_start': wall_start, 'monotonic_start': monotonic_start}
+
+
+def read_metadata(path):
+    try:
+        with open(metadata_path(path)) as f:
+            return json.load(f)
+    except OSError:
+        return {'cameras': []}
+
+
+def record_count(path):
+    """
+    :return: number of complete records, a partial record left by a power loss is ignored
+    """
+    return (os.path.getsize(path) - HEADER.size) // RECORD.size
+
+
+def read_session(path):
+    """
+    Memory-maps a session log.
+    :return: numpy structured array (memory-mapped) if numpy is installed, otherwise a list of tuples
+    """
+    read_header(path)
+    count = record_count(path)
+    if np is not None:
+        if count == 0:
+            return np.zeros(0, dtype=RECORD_DTYPE)
+        return np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER.size, shape=(count,))
+
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            end = HEADER.size + count * RECORD.size
+            return list(RECORD.iter_unpack(m[HEADER.size:end]))
+
+
+def utc(header, records, times):
+    """
+    Converts event times to UTC with the host clock offsets timesync logged (CLOCK records without a camera), the
+    same way ingest.SessionTriggers does. Events before the first offset use that offset. Without any offset the
+    wall clock at the start is used, which is only right if the system clock was set. Requires numpy.
+    :param header: dict from read_header
+    :param records: array from read_session
+    :param times: event times, scalar or array
+    :return: seconds since the epoch
+    """
+    clock = records[(records['event'] == CLOCK) & (records['camera'] == NO_CAMERA)]
+    times = np.asarray(times, dtype=float)
+    if len(clock) == 0:
+        return times + (header['wall_start'] - header['monotonic_start'])
+    i = np.searchsorted(clock['time'], times, side='right')
+    return times + clock['value1'][np.maximum(i - 1, 0)]
+
+
+def iter_rows(path):
+    """
+    Yields one dict per record with wall clock time, event name and camera location resolved.
+    """
+    header = read_header(path)
+    cameras = read_metadata(path)['cameras']
+    offset = header['wall_start'] - header['monotonic_start']
+    for record in read_session(path):
+        row = dict(zip(FIELDS, (record[name] for name in FIELDS) if np is not None else record))
+        row['wall_time'] = float(row['time']) + offset
+        row['event'] = EVENT_NAMES.get(int(row['event']), str(row['event']))
+        camera = int(row['camera'])
+        row['camera'] = cameras[camera] if camera < len(cameras) else ''
+        row['label'] = bytes(row['label']).rstrip(b'\x00').decode()
+        yield row
+
+
+def export_csv(path, csv_path):
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=('wall_time',) + FIELDS)
+        writer.writeheader()
+        for row in iter_rows(path):
+            writer.writerow(row)
+
+
+def export_parquet(path, parquet_path):
+    """
+    Requires pandas with pyarrow or fastparquet.
+    """
+    import pandas as pd
+
+    pd.DataFrame(list(iter_rows(path))).to_parquet(parquet_path)
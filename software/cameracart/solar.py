@@ -0,0 +1,143 @@
+"""
+Sun position from time and location, after NOAA's solar calculator (Meeus), accurate to about 0.01 degrees for
+years 1800-2100 without any network access.
+
+Every function works on scalars as well as NumPy arrays, so a whole session can be annotated in one call:
+
+    elevation, azimuth = solar.position(unix_times, latitudes, longitudes)
+"""
+import threading
+import time
+
+import numpy as np
+
+import session
+
+
+def julian_day(unix_time):
+    return np.asarray(unix_time, dtype=float) / 86400.0 + 2440587.5
+
+
+def refraction(elevation):
+    """
+    :param elevation: geometric elevation in degrees
+    :return: atmospheric refraction correction in degrees
+    """
+    elevation = np.asarray(elevation, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.tan(np.radians(elevation))
+        correction = np.select(
+            [elevation > 85, elevation > 5, elevation > -0.575],
+            [0.0,
+             58.1 / t - 0.07 / t ** 3 + 0.000086 / t ** 5,
+             1735 + elevation * (-518.2 + elevation * (103.4 + elevation * (-12.79 + elevation * 0.711)))],
+            -20.772 / t)
+    return correction / 3600.0
+
+
+def position(unix_time, latitude, longitude, refract=True):
+    """
+    :param unix_time: seconds since the epoch (UTC), scalar or array
+    :param latitude: decimal degrees, negative south
+    :param longitude: decimal degrees, negative west
+    :param refract: correct the elevation for atmospheric refraction
+    :return: (elevation, azimuth) in degrees, azimuth clockwise from north. Arrays broadcast like the arguments.
+    """
+    jd = julian_day(unix_time)
+    latitude = np.radians(np.asarray(latitude, dtype=float))
+    longitude = np.asarray(longitude, dtype=float)
+    jc = (jd - 2451545.0) / 36525.0
+
+    mean_longitude = np.radians((280.46646 + jc * (36000.76983 + jc * 0.0003032)) % 360)
+    mean_anomaly = np.radians(357.52911 + jc * (35999.05029 - 0.0001537 * jc))
+    eccentricity = 0.016708634 - jc * (0.000042037 + 0.0000001267 * jc)
+    center = (np.sin(mean_anomaly) * (1.914602 - jc * (0.004817 + 0.000014 * jc))
+              + np.sin(2 * mean_anomaly) * (0.019993 - 0.000101 * jc)
+              + np.sin(3 * mean_anomaly) * 0.000289)
+    omega = np.radians(125.04 - 1934.136 * jc)
+    apparent_longitude = np.radians(np.degrees(mean_longitude) + center - 0.00569 - 0.00478 * np.sin(omega))
+    mean_obliquity = 23 + (26 + (21.448 - jc * (46.815 + jc * (0.00059 - jc * 0.001813))) / 60) / 60
+    obliquity = np.radians(mean_obliquity + 0.00256 * np.cos(omega))
+    declination = np.arcsin(np.sin(obliquity) * np.sin(apparent_longitude))
+
+    y = np.tan(obliquity / 2) ** 2
+    equation_of_time = 4 * np.degrees(y * np.sin(2 * mean_longitude)
+                                      - 2 * eccentricity * np.sin(mean_anomaly)
+                                      + 4 * eccentricity * y * np.sin(mean_anomaly) * np.cos(2 * mean_longitude)
+                                      - 0.5 * y ** 2 * np.sin(4 * mean_longitude)
+                                      - 1.25 * eccentricity ** 2 * np.sin(2 * mean_anomaly))  # minutes
+
+    minutes = ((jd + 0.5) % 1) * 1440
+    true_solar_time = (minutes + equation_of_time + 4 * longitude) % 1440
+    hour_angle = np.radians(true_solar_time / 4 - 180)
+
+    cos_zenith = (np.sin(latitude) * np.sin(declination)
+                  + np.cos(latitude) * np.cos(declination) * np.cos(hour_angle))
+    zenith = np.arccos(np.clip(cos_zenith, -1, 1))
+    elevation = 90 - np.degrees(zenith)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cos_azimuth = ((np.sin(latitude) * np.cos(zenith) - np.sin(declination))
+                       / (np.cos(latitude) * np.sin(zenith)))
+    angle = np.degrees(np.arccos(np.clip(np.nan_to_num(cos_azimuth), -1, 1)))
+    azimuth = np.where(hour_angle > 0, (angle + 180) % 360, (540 - angle) % 360)
+
+    if refract:
+        elevation = elevation + refraction(elevation)
+    if elevation.ndim == 0:
+        return float(elevation), float(azimuth)
+    return elevation, azimuth
+
+
+class SolarCache:
+    """
+    Sun position for the live display, computed at most once per second.
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.key = None
+        self.value = None
+
+    def position(self, latitude, longitude):
+        """
+        :return: (elevation, azimuth) in degrees for the current second
+        """
+        second = int(self.clock())
+        key = (second, round(latitude, 3), round(longitude, 3))
+        with self.lock:
+            if key != self.key:
+                self.value = position(second, latitude, longitude)
+                self.key = key
+            return self.value
+
+
+def annotate_session(path):
+    """
+    Sun position at every trigger of a session log, located from the session's GPS fixes and timed with the UTC
+    offsets timesync logged (session.utc). The sun moves about 0.01 degrees per kilometer, so the fixes around a
+    trigger are more than precise enough.
+    :return: numpy structured array with the camera index, sequence, frame, unix time, latitude, longitude,
+    elevation and azimuth of every trigger. Empty if the session has no GPS fixes.
+    """
+    header = session.read_header(path)
+    records = session.read_session(path)
+    fixes = records[records['event'] == session.GPS]
+    triggers = records[records['event'] == session.TRIGGER]
+
+    result = np.zeros(len(triggers) if len(fixes) else 0,
+                      dtype=[('camera', 'u1'), ('sequence', '<u4'), ('frame', '<u2'), ('time', '<f8'),
+                             ('latitude', '<f8'), ('longitude', '<f8'), ('elevation', '<f8'), ('azimuth', '<f8')])
+    if len(result) == 0:
+        return result
+
+    result['camera'] = triggers['camera']
+    result['sequence'] = triggers['sequence']
+    result['frame'] = triggers['frame']
+    # Not the wall clock at the start, the system clock may not have been set yet (no RTC or network)
+    result['time'] = session.utc(header, records, triggers['time'])
+    result['latitude'] = np.interp(triggers['time'], fixes['time'], fixes['value1'])
+    result['longitude'] = np.interp(triggers['time'], fixes['time'], fixes['value2'])
+    result['elevation'], result['azimuth'] = position(result['time'], result['latitude'], result['longitude'])
+    return result
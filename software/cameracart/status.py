@@ -0,0 +1,92 @@
+import collections
+import datetime
+import threading
+
+import solar
+
+
+class CartStatus:
+    """
+    What the window shows, kept up to date by the engine.
+
+    The engine calls the on_* methods from the sensor and camera threads; they only update counters so they never
+    slow down triggering. The window reads labels() at its own frame rate.
+    """
+
+    def __init__(self, engine):
+        """
+        :param engine: engine.CartEngine, the status is added as one of its observers
+        """
+        self.engine = engine
+        self.lock = threading.Lock()
+
+        self.distance = 0  # in centimeters
+        self.pulses = 0
+        self.confirmed = collections.Counter()  # camera location -> confirmed captures
+        self.failed = collections.Counter()
+        self.dropped = collections.Counter()
+        self.latitude = None
+        self.longitude = None
+        self.sun = solar.SolarCache()
+
+        self.engine.add_observer(self)
+
+    def on_pulse(self, pulse_time, distance):
+        self.distance = distance
+        self.pulses += 1
+
+    def on_trigger(self, event, camera, trigger):
+        if event in ('confirmed', 'failed', 'dropped'):
+            with self.lock:
+                getattr(self, event)[camera.location] += 1
+
+    def on_gps(self, latitude, longitude):
+        self.latitude, self.longitude = latitude, longitude
+
+    def location(self):
+        """
+        :return: (latitude, longitude) of the last GPS fix, or the engine's default location
+        """
+        if self.latitude is not None:
+            return self.latitude, self.longitude
+        return self.engine.location
+
+    def photos_taken(self, location):
+        """
+        :return: confirmed captures plus any unconfirmed triggers, and the camera's state if it is not connected
+        """
+        monitor = self.engine.capture_monitors.get(location)
+        unconfirmed = len(monitor.unconfirmed()) if monitor is not None else 0
+        text = str(self.confirmed[location])
+        if unconfirmed:
+            text += f' ({unconfirmed} unconfirmed)'
+        state = self.engine.supervisor.state(location)
+        if state != self.engine.supervisor.OK:
+            text += f' ({state})'
+        return text
+
+    def labels(self, now=None):
+        """
+        :param now: datetime shown in the time label, defaults to now
+        :return: dict of label name -> text, names are those of the main window's labels plus
+        photos_taken_<camera location>, health_<camera location> and coverage_<camera location>
+        """
+        if now is None:
+            now = datetime.datetime.now()
+        labels = {'time_label': now.strftime("%H:%M:%S"),
+                  'distance_traveled_label': str(self.distance),
+                  'latitude_label': '' if self.latitude is None else f'{self.latitude:.6f}',
+                  'longitude_label': '' if self.longitude is None else f'{self.longitude:.6f}',
+                  'solar_elevation_label': '',
+                  'solar_azimuth_label': ''}
+        location = self.location()
+        if location is not None:
+            elevation, azimuth = self.sun.position(*location)
+            labels['solar_elevation_label'] = f'{elevation:.1f}°'
+            labels['solar_azimuth_label'] = f'{azimuth:.1f}°'
+        with self.lock:
+            for spec in self.engine.camera_specs:
+                labels[f'photos_taken_{spec.location}'] = self.photos_taken(spec.location)
+                labels[f'health_{spec.location}'] = self.engine.health.status(spec.location)
+                labels[f'coverage_{spec.location}'] = self.engine.coverage.status(spec.location)
+        return labels
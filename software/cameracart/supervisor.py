@@ -0,0 +1,142 @@
+import threading
+
+import sensors
+
+
+class CameraSupervisor(threading.Thread):
+    """
+    Reconnects cameras in the background.
+
+    A camera counts as lost when its USB port disappears from autodetect, when max_failures triggers in a row fail,
+    or when a reset is requested. Lost cameras are looked up again by serial number (they usually come back on a
+    different port) and replace the old camera in the engine; only that camera's worker and capture monitor are
+    restarted, the other cameras keep triggering. Camera.set_config only sends settings that differ from the
+    camera's current ones, so a camera that kept its settings is not reconfigured.
+    """
+    OK = 'ok'
+    LOST = 'lost'
+    RECONNECTING = 'reconnecting'
+
+    def __init__(self, engine, interval=2.0, max_failures=3):
+        """
+        :param engine: engine.CartEngine whose cameras are supervised
+        :param interval: seconds between checks
+        :param max_failures: consecutive failed triggers after which a camera is reconnected
+        """
+        super().__init__(daemon=True, name='camera supervisor')
+        self.engine = engine
+        self.interval = interval
+        self.max_failures = max_failures
+
+        self.lock = threading.Lock()
+        self.states = {spec.location: CameraSupervisor.OK for spec in engine.camera_specs}
+        self.failures = {spec.location: 0 for spec in engine.camera_specs}
+        self.lost = set()  # indices of cameras to reconnect
+        self.unreachable = set()  # indices of lost cameras that could not be reconnected yet, reported once
+        self.reconnects = 0
+        self.wake = threading.Event()
+        self.stop_event = threading.Event()
+
+        self.engine.trigger_dispatcher.add_listener(self.on_trigger)
+
+    def index(self, location):
+        for index, spec in enumerate(self.engine.camera_specs):
+            if spec.location == location:
+                return index
+        raise KeyError(location)
+
+    def state(self, location):
+        return self.states.get(location, CameraSupervisor.OK)
+
+    def on_trigger(self, event, camera, trigger):
+        if camera is None or event not in ('completed', 'failed') or trigger.busy:
+            # A busy camera is working, it only needs time to write its buffer
+            return
+        with self.lock:
+            if event == 'completed':
+                self.failures[camera.location] = 0
+                return
+            self.failures[camera.location] += 1
+            lost = self.failures[camera.location] >= self.max_failures
+        if lost:
+            self.mark_lost(self.index(camera.location), f'{self.max_failures} triggers failed')
+
+    def mark_lost(self, index, reason):
+        location = self.engine.camera_specs[index].location
+        with self.lock:
+            if index in self.lost:
+                return
+            self.lost.add(index)
+            self.states[location] = CameraSupervisor.LOST
+        print(f'{location} camera lost ({reason}), reconnecting in the background.')
+        self.wake.set()
+
+    def request_reset(self, index):
+        """
+        Reconnects a camera in the background, returns immediately.
+        """
+        self.mark_lost(index, 'reset requested')
+
+    def check(self):
+        """
+        Marks cameras whose port has disappeared as lost and tries to reconnect every lost camera once.
+        """
+        try:
+            connected = {address for _, address in sensors.gp.Camera.autodetect()}
+        except Exception as e:  # gphoto error
+            print(f'Could not list cameras: {e}')
+            connected = None
+        if connected is not None:
+            for index, camera in enumerate(list(self.engine.cameras)):
+                if camera is not None and camera.address not in connected:
+                    self.mark_lost(index, 'disconnected')
+
+        with self.lock:
+            lost = sorted(self.lost)
+        for index in lost:
+            if self.stop_event.is_set():
+                return
+            self.reconnect(index)
+
+    def reconnect(self, index):
+        spec = self.engine.camera_specs[index]
+        with self.lock:
+            self.states[spec.location] = CameraSupervisor.RECONNECTING
+        # The old connection still claims the USB device, opening the camera again would fail with -53
+        self.engine.release_camera(index)
+        sensors.get_camera_registry().invalidate()
+        try:
+            camera = sensors.Camera(name=spec.model, location=spec.location, config=spec.config,
+                                    serial_number=spec.serial_number)
+        except Exception as e:  # not connected yet, or gphoto error
+            with self.lock:
+                self.states[spec.location] = CameraSupervisor.LOST
+                reported = index in self.unreachable
+                self.unreachable.add(index)
+            if not reported:
+                print(f'Could not reconnect {spec.location} camera, retrying every {self.interval:g} s: {e}')
+            return False
+
+        self.engine.replace_camera(index, camera)
+        with self.lock:
+            self.lost.discard(index)
+            self.unreachable.discard(index)
+            self.failures[spec.location] = 0
+            self.states[spec.location] = CameraSupervisor.OK
+            self.reconnects += 1
+        print(f'{spec.location} camera reconnected at {camera.address}.')
+        return True
+
+    def run(self):
+        while not self.stop_event.is_set():
+            self.check()
+            self.wake.wait(self.interval)
+            self.wake.clear()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake.set()
+        if self.is_alive():
+            self.join()
+        if self.on_trigger in self.engine.trigger_dispatcher.listeners:
+            self.engine.trigger_dispatcher.listeners.remove(self.on_trigger)
@@ -0,0 +1,11 @@
+"""
+The modules are imported flat (import sensors), as the cart runs them from software/cameracart. Cameras are always
+simulated and the camera registry goes to a temporary home directory.
+"""
+import os
+import sys
+import tempfile
+
+os.environ['CAMERACART_SIMULATE_CAMERAS'] = '1'
+os.environ['HOME'] = tempfile.mkdtemp(prefix='cameracart-tests-')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
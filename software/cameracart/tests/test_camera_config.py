@@ -0,0 +1,76 @@
+import pytest
+
+import sensors
+
+
+@pytest.fixture
+def device():
+    device = sensors.gp.devices[2]
+    settings = {name: device.value(name) for name in ('iso', 'shutterspeed', 'f-number')}
+    yield device
+    for widget in device.config.walk():
+        if widget.name in settings:
+            widget.value = settings[widget.name]
+
+
+@pytest.fixture
+def camera(device):
+    camera = sensors.Camera(name=device.model, location='right', serial_number=device.serial_number)
+    yield camera
+    camera.camera.exit()
+
+
+def test_round_trip(camera, device):
+    config = camera.config_cache
+    iso = device.CHOICES['iso']
+    changes = config.apply({'iso': 2, 'shutterspeed': 9})
+    assert changes == {'iso': iso[2], 'shutterspeed': device.CHOICES['shutterspeed'][9]}
+    assert (device.value('iso'), device.value('shutterspeed')) == (iso[2], '1/500')
+    # The cached tree is up to date, so the camera's values read back without a USB request
+    round_trips = device.round_trips
+    assert config.get_value('iso') == iso[2]
+    assert config.diff({'iso': 2, 'shutterspeed': 9}) == {}
+    assert device.round_trips == round_trips
+
+
+def test_only_changes_are_sent(camera, device):
+    config = camera.config_cache
+    config.apply({'iso': 1})
+    round_trips = device.round_trips
+    assert config.apply({'iso': 1}) == {}
+    assert device.round_trips == round_trips
+    # Several changes go in one request
+    assert config.apply({'iso': 3, 'shutterspeed': 10, 'f-number': 7}, by_index=True).keys() == {
+        'iso', 'shutterspeed', 'f-number'}
+    assert device.round_trips == round_trips + 1
+
+
+def test_values_as_given(camera, device):
+    assert camera.config_cache.apply({'f-number': 'f/11'}, by_index=False) == {'f-number': 'f/11'}
+    assert device.value('f-number') == 'f/11'
+
+
+def test_set_config_prints_changes(camera, device, capsys):
+    camera.set_config({'iso': 4})
+    camera.set_config({'iso': 4})
+    assert capsys.readouterr().out == f'right camera iso set to {device.CHOICES["iso"][4]}.\n'
+
+
+def test_bad_items(camera, device):
+    config = camera.config_cache
+    with pytest.raises(ValueError):
+        config.apply({'iso': len(device.CHOICES['iso'])})
+    with pytest.raises(KeyError):
+        config.apply({'flash': 1})
+
+
+def test_refused_change_refreshes_tree(camera, device):
+    config = camera.config_cache
+    with pytest.raises(sensors.gp.GPhoto2Error):
+        config.apply({'iso': '50'}, by_index=False)
+    assert config.tree is None
+    # A dial turned on the camera is seen once the tree is fetched again
+    for widget in device.config.walk():
+        if widget.name == 'iso':
+            widget.value = device.CHOICES['iso'][5]
+    assert config.diff({'iso': 5}) == {}
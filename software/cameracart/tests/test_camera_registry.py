@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+import sensors
+
+
+@pytest.fixture
+def probes(monkeypatch):
+    """
+    :return: list of the (name, address) of every camera opened to read its serial number
+    """
+    probed = []
+    get_camera_serial_number = sensors.get_camera_serial_number
+
+    def probe(name, address):
+        probed.append((name, address))
+        return get_camera_serial_number(name, address)
+
+    monkeypatch.setattr(sensors, 'get_camera_serial_number', probe)
+    return probed
+
+
+@pytest.fixture
+def devices():
+    ports = [device.port for device in sensors.gp.devices]
+    yield sensors.gp.devices
+    for device, port in zip(sensors.gp.devices, ports):
+        device.plug(port)
+
+
+def test_known_cameras_are_not_opened(tmp_path, probes, devices):
+    path = str(tmp_path / 'camera_registry.json')
+    registry = sensors.CameraRegistry(path)
+    assert registry.lookup(devices[0].model, devices[0].serial_number) == devices[0].port
+    assert len(probes) == len(devices)
+    with open(path) as f:
+        assert sorted(map(int, json.load(f))) == sorted(device.serial_number for device in devices)
+
+    del probes[:]
+    registry = sensors.CameraRegistry(path)
+    assert sorted(registry.cameras()) == sorted((device.model, device.port, device.serial_number)
+                                                for device in devices)
+    assert registry.lookup(devices[1].model, devices[1].serial_number) == devices[1].port
+    assert probes == []
+
+
+def test_only_moved_camera_is_probed_again(tmp_path, probes, devices):
+    registry = sensors.CameraRegistry(str(tmp_path / 'camera_registry.json'))
+    registry.update()
+    del probes[:]
+    devices[1].unplug()
+    devices[1].plug('usb:001,009')
+    registry.invalidate()
+    assert registry.lookup(devices[1].model, devices[1].serial_number) == 'usb:001,009'
+    assert probes == [(devices[1].model, 'usb:001,009')]
+
+
+def test_unplugged_camera(tmp_path, probes, devices):
+    registry = sensors.CameraRegistry(str(tmp_path / 'camera_registry.json'))
+    registry.update()
+    devices[2].unplug()
+    registry.invalidate()
+    assert registry.lookup(devices[2].model, devices[2].serial_number) is None
+    assert devices[2].serial_number not in registry.entries
+    # Another model with the same serial number is a different camera
+    assert registry.lookup('Nikon DSC D7000', devices[0].serial_number) is None
+
+
+def test_unreadable_registry(tmp_path, probes, devices, capsys):
+    path = tmp_path / 'camera_registry.json'
+    path.write_text('{"3534517": ')
+    registry = sensors.CameraRegistry(str(path))
+    assert registry.entries == {}
+    assert 'Could not read camera registry' in capsys.readouterr().out
+    registry.update()
+    assert len(json.loads(path.read_text())) == len(devices)
+
+
+def test_camera_that_cannot_be_probed(tmp_path, monkeypatch, devices, capsys):
+    def probe(name, address):
+        if address == devices[0].port:
+            raise sensors.gp.GPhoto2Error(-53)
+        return devices[[device.port for device in devices].index(address)].serial_number
+
+    monkeypatch.setattr(sensors, 'get_camera_serial_number', probe)
+    registry = sensors.CameraRegistry(str(tmp_path / 'camera_registry.json'))
+    assert registry.lookup(devices[0].model, devices[0].serial_number) is None
+    assert f'Could not read serial number of {devices[0].model} at {devices[0].port}' in capsys.readouterr().out
+    assert len(registry.entries) == len(devices) - 1
@@ -0,0 +1,136 @@
+import time
+import types
+
+import pytest
+
+import capture_monitor
+import sensors
+import triggering
+
+
+class Dispatcher:
+    """
+    Stand-in for triggering.TriggerDispatcher with a settable clock, records the events the monitor reports.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.listeners = []
+        self.events = []
+
+    def clock(self):
+        return self.now
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def notify(self, event, camera, trigger):
+        self.events.append((event, trigger.sequence))
+
+
+CAMERA = types.SimpleNamespace(location='left')
+
+
+def monitor(confirm_timeout=5.0):
+    dispatcher = Dispatcher()
+    return capture_monitor.CaptureMonitor(CAMERA, dispatcher, confirm_timeout=confirm_timeout), dispatcher
+
+
+def start(monitor_, sequence, started):
+    trigger = triggering.Trigger(sequence, started)
+    trigger.started = started
+    monitor_.on_trigger('started', CAMERA, trigger)
+    return trigger
+
+
+def test_files_matched_in_trigger_order():
+    monitor_, dispatcher = monitor()
+    triggers = [start(monitor_, sequence, sequence * 0.5) for sequence in (1, 2)]
+    dispatcher.now = 1.2
+    monitor_.file_added('/store_00010001/DCIM/100NIKON', 'DSC_0001.NEF')
+    dispatcher.now = 1.5
+    monitor_.file_added('/store_00010001/DCIM/100NIKON', 'DSC_0002.NEF')
+    assert [trigger.capture.name for trigger in triggers] == ['DSC_0001.NEF', 'DSC_0002.NEF']
+    assert triggers[0].capture.path == '/store_00010001/DCIM/100NIKON/DSC_0001.NEF'
+    assert monitor_.latencies() == pytest.approx([0.7, 0.5])
+    assert dispatcher.events == [('confirmed', 1), ('confirmed', 2)]
+    assert monitor_.confirmed == 2
+
+
+def test_raw_and_jpeg_are_one_capture():
+    monitor_, dispatcher = monitor()
+    trigger = start(monitor_, 1, 0.0)
+    monitor_.file_added('/store_00010001/DCIM/100NIKON', 'DSC_0001.NEF')
+    monitor_.file_added('/store_00010001/DCIM/100NIKON', 'DSC_0001.JPG')
+    assert trigger.capture.extra_files == ['/store_00010001/DCIM/100NIKON/DSC_0001.JPG']
+    assert monitor_.confirmed == 1
+
+
+def test_failed_triggers_expect_no_file():
+    monitor_, dispatcher = monitor()
+    failed = start(monitor_, 1, 0.0)
+    monitor_.on_trigger('failed', CAMERA, failed)
+    trigger = start(monitor_, 2, 0.5)
+    monitor_.on_trigger('started', types.SimpleNamespace(location='right'), triggering.Trigger(2, 0.5))
+    monitor_.file_added('/', 'DSC_0001.NEF')
+    assert failed.capture is None
+    assert trigger.capture.name == 'DSC_0001.NEF'
+    assert list(monitor_.pending) == []
+
+
+def test_file_without_trigger(capsys):
+    monitor_, dispatcher = monitor()
+    monitor_.file_added('/', 'DSC_0001.NEF')
+    assert 'without a matching trigger' in capsys.readouterr().out
+    assert monitor_.confirmed == 0
+
+
+def test_confirm_timeout():
+    # A trigger the camera never wrote a file for is skipped, so it does not take the next trigger's file
+    monitor_, dispatcher = monitor(confirm_timeout=2.0)
+    missed = start(monitor_, 1, 0.0)
+    trigger = start(monitor_, 2, 1.5)
+    dispatcher.now = 1.9
+    assert monitor_.unconfirmed() == []
+    dispatcher.now = 2.5
+    assert monitor_.unconfirmed() == [missed]
+    monitor_.file_added('/', 'DSC_0001.NEF')
+    assert missed.capture is None and trigger.capture.name == 'DSC_0001.NEF'
+    assert list(monitor_.missed) == [missed]
+    dispatcher.now = 10.0
+    assert monitor_.unconfirmed() == [missed]
+
+
+def test_stop_removes_listener():
+    monitor_, dispatcher = monitor()
+    monitor_.stop()
+    monitor_.stop()
+    assert dispatcher.listeners == []
+
+
+def test_simulated_camera(monkeypatch):
+    device = sensors.gp.devices[0]
+    monkeypatch.setattr(device, 'capture_latency', 0.02)
+    monkeypatch.setattr(device, 'write_time', 0.05)
+    camera = sensors.Camera(name=device.model, location='left', serial_number=device.serial_number)
+    dispatcher = triggering.TriggerDispatcher()
+    worker = dispatcher.add_camera(camera)
+    monitor_ = capture_monitor.CaptureMonitor(camera, dispatcher)
+    monitor_.start()
+    try:
+        for _ in range(3):
+            dispatcher.dispatch()
+            time.sleep(0.15)
+        deadline = time.monotonic() + 5
+        while monitor_.confirmed < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        monitor_.stop()
+        monitor_.join()
+        dispatcher.stop()
+        camera.camera.exit()
+    assert worker.stats.completed == 3
+    names = [capture.name for capture in monitor_.captures]
+    assert len(names) == 3 and names == sorted(names)
+    assert all(0 < latency < 1 for latency in monitor_.latencies())
+    assert monitor_.unconfirmed() == []
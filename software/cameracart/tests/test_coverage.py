@@ -0,0 +1,108 @@
+import math
+import types
+
+import pytest
+
+import camera_array
+import coverage
+
+
+def test_overlapping_photos_merge():
+    coverage_map = coverage.CoverageMap(100)
+    for position in range(0, 1000, 40):
+        coverage_map.add(position)
+    assert coverage_map.starts == [-50]
+    assert coverage_map.ends == [1010]
+    assert coverage_map.gaps() == []
+    assert coverage_map.covered() == 1060
+
+
+def test_touching_photos_leave_no_gap():
+    coverage_map = coverage.CoverageMap(100)
+    coverage_map.add(0)
+    coverage_map.add(100)
+    assert coverage_map.gaps() == []
+    assert coverage_map.covered() == 200
+
+
+def test_gap():
+    coverage_map = coverage.CoverageMap(100)
+    for position in (0, 80, 300, 380):
+        coverage_map.add(position)
+    assert list(zip(coverage_map.starts, coverage_map.ends)) == [(-50, 130), (250, 430)]
+    assert coverage_map.gaps() == [(130, 250)]
+    assert coverage_map.covered() == 360
+
+
+def test_photo_out_of_order_fills_gap():
+    coverage_map = coverage.CoverageMap(100)
+    for position in (0, 200, 400):
+        coverage_map.add(position)
+    assert len(coverage_map.gaps()) == 2
+    coverage_map.add(300)
+    assert coverage_map.gaps() == [(50, 150)]
+    coverage_map.add(100)
+    assert coverage_map.gaps() == []
+    assert coverage_map.starts == [-50]
+
+
+def test_same_position_twice():
+    # The frames of a burst are all taken at the trigger's position
+    coverage_map = coverage.CoverageMap(100)
+    coverage_map.add(0)
+    coverage_map.add(0)
+    assert coverage_map.covered() == 100
+
+
+def test_ignored_gaps():
+    coverage_map = coverage.CoverageMap(100)
+    for position in (0, 400, 1000):
+        coverage_map.add(position)
+    assert coverage_map.gaps(lambda distance: 600 <= distance <= 800) == [(50, 350)]
+
+
+class Spec:
+    def __init__(self, location, offset, footprint):
+        self.location = location
+        self.offset = offset
+        self._footprint = footprint
+
+    def footprint(self):
+        return self._footprint
+
+
+def confirm(monitor, location, position):
+    monitor.on_trigger('confirmed', types.SimpleNamespace(location=location), types.SimpleNamespace(position=position))
+
+
+def test_monitor_overlap_and_gaps():
+    monitor = coverage.CoverageMonitor([Spec('left', -60, (80, 100)), Spec('right', 0, (80, 100))])
+    for position in (0, 20, 40):
+        confirm(monitor, 'left', position)
+    assert monitor.overlaps['left'] == pytest.approx(0.8)
+    assert monitor.status('left') == 'Overlap 80%'
+
+    confirm(monitor, 'left', 190)
+    assert monitor.overlaps['left'] == pytest.approx(-0.5)
+    assert monitor.gaps('left') == [(90, 140)]
+    assert monitor.status('left') == 'Overlap -50% (slow down), 1 gap (0.5 m)'
+
+    # Events other than confirmations and cameras without a footprint are ignored
+    monitor.on_trigger('started', types.SimpleNamespace(location='left'), types.SimpleNamespace(position=500))
+    confirm(monitor, 'center', 0)
+    assert monitor.gaps('left') == [(90, 140)]
+    assert monitor.status('center') == ''
+
+
+def test_side_overlap():
+    monitor = coverage.CoverageMonitor([Spec('left', -60, (80, 100)), Spec('right', 0, (80, 100))])
+    # Footprints 80 cm wide, centers 60 cm apart: 20 cm of 80 shared
+    assert monitor.side_overlaps == [('left', 'right', pytest.approx(0.25))]
+
+
+def test_footprint_from_spec():
+    spec = camera_array.CameraSpec('Nikon DSC D3500', 3534517, 'left', 'd3500', height=150.0, focal_length=18.0)
+    assert spec.footprint() == pytest.approx((150 * 23.5 / 18, 150 * 15.6 / 18))
+    spec = camera_array.CameraSpec('Nikon DSC D3500', 3534517, 'left', 'd3500', height=100.0, fov=[90.0, 60.0])
+    assert spec.footprint() == pytest.approx((200.0, 200 * math.tan(math.radians(30))))
+    assert camera_array.CameraSpec('Nikon DSC D3500', 3534517, 'left', 'd3500', height=150.0).footprint() is None
@@ -0,0 +1,72 @@
+import struct
+
+import pytest
+
+import exif
+
+FIELDS = {'make': 'NIKON CORPORATION', 'model': 'NIKON D3500', 'datetime_original': '2023:06:01 09:15:42',
+          'subsec': '37', 'serial_number': '3534517', 'shutter_count': 12345}
+
+
+def jpeg(tiff):
+    """
+    :return: JPEG start with an APP0 segment before the APP1 segment holding the TIFF header
+    """
+    app0 = b'\xff\xe0' + struct.pack('>H', 16) + b'JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00'
+    app1 = b'\xff\xe1' + struct.pack('>H', 2 + 6 + len(tiff)) + b'Exif\x00\x00' + tiff
+    return b'\xff\xd8' + app0 + app1 + b'\xff\xda\x00\x02'
+
+
+@pytest.mark.parametrize('byte_order', ['<', '>'])
+def test_nef(tmp_path, byte_order):
+    path = tmp_path / 'DSC_0001.NEF'
+    # Image data after the header is never read
+    path.write_bytes(exif.write_tiff_header(FIELDS, byte_order) + b'\x00' * 4096)
+    assert exif.read_exif(path) == FIELDS
+
+
+def test_jpeg(tmp_path):
+    path = tmp_path / 'DSC_0001.JPG'
+    path.write_bytes(jpeg(exif.write_tiff_header(FIELDS)))
+    assert exif.read_exif(path) == FIELDS
+
+
+def test_fixture_header(tmp_path):
+    # Built by hand, big endian like Nikon's NEF files: IFD0 with Make and the EXIF IFD pointer, the EXIF IFD with
+    # DateTimeOriginal and a type 3 maker note whose own IFD has the serial number and the shutter count
+    maker_ifd = (struct.pack('>H', 2)
+                 + struct.pack('>HHII', exif.NIKON_SERIAL_NUMBER, 2, 8, 38)
+                 + struct.pack('>HHII', exif.NIKON_SHUTTER_COUNT, 4, 1, 4711)
+                 + struct.pack('>I', 0) + b'0012345\x00')
+    maker_note = b'Nikon\x00\x02\x10\x00\x00' + b'MM' + struct.pack('>HI', 42, 8) + maker_ifd
+    exif_ifd = (struct.pack('>H', 2)
+                + struct.pack('>HHII', exif.DATETIME_ORIGINAL, 2, 20, 56 + 30)
+                + struct.pack('>HHII', exif.MAKER_NOTE, 7, len(maker_note), 56 + 50)
+                + struct.pack('>I', 0))
+    ifd0 = (struct.pack('>H', 2)
+            + struct.pack('>HHI', exif.MAKE, 2, 4) + b'ABC\x00'
+            + struct.pack('>HHII', exif.EXIF_IFD, 4, 1, 56)
+            + struct.pack('>I', 0))
+    header = b'MM' + struct.pack('>HI', 42, 8) + ifd0
+    header = header.ljust(56, b'\x00') + exif_ifd
+    header = header.ljust(56 + 30, b'\x00') + b'2023:06:01 09:15:42\x00'
+    header = header.ljust(56 + 50, b'\x00') + maker_note
+    path = tmp_path / 'DSC_0002.NEF'
+    path.write_bytes(header)
+
+    assert exif.read_exif(path) == {'make': 'ABC', 'model': None, 'datetime_original': '2023:06:01 09:15:42',
+                                    'subsec': None, 'serial_number': '0012345', 'shutter_count': 4711}
+
+
+def test_not_an_image(tmp_path):
+    path = tmp_path / 'notes.txt'
+    path.write_bytes(b'not a photo')
+    with pytest.raises(ValueError):
+        exif.read_exif(path)
+
+
+def test_truncated(tmp_path):
+    path = tmp_path / 'DSC_0004.NEF'
+    path.write_bytes(exif.write_tiff_header(FIELDS)[:40])
+    with pytest.raises(ValueError):
+        exif.read_exif(path)
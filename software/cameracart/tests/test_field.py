@@ -0,0 +1,78 @@
+import math
+import types
+
+import pytest
+
+import field
+import gps
+import session
+
+
+@pytest.fixture
+def layout():
+    """
+    fields/example.json: 20 ranges of 500 cm plots with 150 cm alleys, range 1 starting at 100 cm.
+    """
+    return field.load('example')
+
+
+@pytest.mark.parametrize('distance, range_', [(0.0, None), (99.9, None), (100.0, 1), (599.9, 1), (600.0, None),
+                                              (749.9, None), (750.0, 2), (12949.9, 20), (12950.0, None),
+                                              (1e6, None)])
+def test_range_at(layout, distance, range_):
+    assert layout.range_at(distance) == range_
+
+
+@pytest.mark.parametrize('distance, margin, alley', [(650.0, 0.0, True), (600.0, 0.0, True), (749.9, 0.0, True),
+                                                     (599.9, 0.0, False), (750.0, 0.0, False),
+                                                     (675.0, 70.0, True), (650.0, 60.0, False),
+                                                     (700.0, 60.0, False), (50.0, 0.0, False),
+                                                     (13000.0, 0.0, False)])
+def test_in_alley(layout, distance, margin, alley):
+    # Before the first and after the last range the cart is not between plots
+    assert layout.in_alley(distance, margin) == alley
+
+
+def test_plot_under_each_camera(layout):
+    assert layout.plot_at_distance(300.0) == field.Plot('1102', 2, 1)
+    assert layout.plot_at_distance(300.0, offset=-76.2) == field.Plot('101', 1, 1)
+    assert layout.plot_at_distance(1000.0, offset=76.2) == field.Plot('203', 3, 2)
+    assert layout.plot_at_distance(300.0, offset=-200.0) is None
+    assert layout.plot_at_distance(650.0) is None
+
+
+def test_plot_at_position(layout):
+    latitude, longitude = layout.origin
+    east, north = 1.2, 2.0  # in row 2, 200 cm into range 1
+    position = (latitude + north / gps.METERS_PER_DEGREE_LATITUDE,
+                longitude + east / (gps.METERS_PER_DEGREE_LONGITUDE * math.cos(math.radians(latitude))))
+    assert layout.plot_at(*position) == field.Plot('1102', 2, 1)
+    assert layout.plot_at(latitude - 1.0 / gps.METERS_PER_DEGREE_LATITUDE, longitude) is None
+    layout.origin = None
+    assert layout.plot_at(*position) is None
+
+
+def test_irregular_ranges():
+    layout = field.FieldLayout.from_dict('irregular', {'range_starts': [900.0, 0.0, 400.0], 'plot_length': 300.0,
+                                                       'rows': 4, 'row_spacing': 100.0})
+    assert [layout.range_at(distance) for distance in (0.0, 350.0, 450.0, 800.0, 950.0, 1200.0)] == [
+        1, None, 2, None, 3, None]
+    assert layout.in_alley(800.0, margin=50.0) and not layout.in_alley(800.0, margin=150.0)
+
+
+def test_no_layout(tmp_path):
+    assert field.load('example', str(tmp_path)) is None
+
+
+def test_plots_logged(tmp_path, layout):
+    recorder = session.SessionRecorder(str(tmp_path / 'run.ccsession'), clock=lambda: 0.0)
+    assigner = field.PlotAssigner(layout, recorder, offsets={'left': -76.2})
+    camera = types.SimpleNamespace(location='left')
+    for sequence, position in ((1, 300.0), (2, 650.0), (3, None)):
+        trigger = types.SimpleNamespace(sequence=sequence, frame=0, position=position, started=sequence * 0.5)
+        assigner.on_trigger('completed', camera, trigger)
+    recorder.close()
+    records = session.read_session(recorder.path)
+    assert list(records['event']) == [session.PLOT]
+    assert (records['sequence'][0], records['value2'][0], records['value3'][0]) == (1, 1, 1)
+    assert records['label'][0] == b'101'
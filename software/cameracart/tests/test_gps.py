@@ -0,0 +1,168 @@
+import datetime
+import math
+import types
+
+import pytest
+
+import gps
+
+# Example sentences from the NMEA 0183 standard
+GGA = '$GPGGA,123519,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,*47'
+RMC = '$GPRMC,123519,A,4807.038,N,01131.000,E,022.4,084.4,230394,003.1,W*6A'
+
+
+def sentence(body):
+    return f'${body}*{gps.checksum(body)}'
+
+
+def gga(time_of_day, quality=1):
+    return sentence(f'GPGGA,{time_of_day},3216.836,N,10644.874,W,{quality},09,1.0,1186.0,M,-24.0,M,,')
+
+
+def rmc(time_of_day, date):
+    return sentence(f'GPRMC,{time_of_day},A,3216.836,N,10644.874,W,1.0,90.0,{date},,,A')
+
+
+def test_checksum():
+    assert gps.checksum(GGA[1:-3]) == '47'
+    assert gps.checksum(RMC[1:-3]) == '6A'
+
+
+def test_fix():
+    parser = gps.NMEAParser()
+    assert parser.parse(RMC, 1.0) is None
+    fix = parser.parse(GGA.encode('ascii') + b'\r\n', 2.0)
+    assert fix.time == 2.0
+    assert math.isclose(fix.latitude, 48 + 7.038 / 60)
+    assert math.isclose(fix.longitude, 11 + 31.0 / 60)
+    assert fix.altitude == 545.4
+    assert fix.satellites == 8
+    assert fix.hdop == 0.9
+    # The example is from 1994, two digit years are read as 20yy
+    assert fix.utc == datetime.datetime(2094, 3, 23, 12, 35, 19, tzinfo=datetime.timezone.utc)
+    assert math.isclose(fix.speed, 22.4 * gps.KNOTS)
+    assert fix.course == 84.4
+    assert parser.errors == 0
+
+
+def test_western_hemisphere():
+    fix = gps.NMEAParser().parse(gga('000000.00'), 0.0)
+    assert fix.latitude > 0 > fix.longitude
+    assert math.isclose(fix.longitude, -(106 + 44.874 / 60))
+
+
+def test_bad_checksum():
+    parser = gps.NMEAParser()
+    assert parser.parse(GGA[:-2] + '48', 0.0) is None
+    assert parser.parse(GGA.replace('545.4', '545.5'), 0.0) is None
+    assert parser.errors == 2
+
+
+def test_lowercase_checksum():
+    parser = gps.NMEAParser()
+    parser.parse(RMC[:-2] + '6a', 0.0)
+    assert parser.errors == 0
+    assert parser.date == datetime.date(2094, 3, 23)
+
+
+def test_partial_sentences():
+    # A serial read that times out returns part of a sentence, the rest arrives with the next read
+    parser = gps.NMEAParser()
+    assert parser.parse(GGA[:30], 0.0) is None
+    assert parser.parse(GGA[30:], 0.0) is None
+    assert parser.parse(GGA[:-1], 0.0) is None
+    assert parser.parse('', 0.0) is None
+    assert parser.parse(b'\xff\xfe$GP', 0.0) is None
+    assert parser.errors == 1  # only the sentence cut inside its checksum fails the check
+    assert parser.parse(GGA, 1.0) is not None
+
+
+def test_no_fix():
+    parser = gps.NMEAParser()
+    assert parser.parse(gga('120000.00', quality=0), 0.0) is None
+    assert parser.parse(sentence('GPGGA,120000.00,,,,,0,00,99.9,,M,,M,,'), 0.0) is None
+    assert parser.errors == 0
+
+
+def test_no_date_before_rmc():
+    assert gps.NMEAParser().parse(gga('120000.00'), 0.0).utc is None
+
+
+def test_fractional_seconds():
+    parser = gps.NMEAParser()
+    parser.parse(rmc('120000.00', '010623'), 0.0)
+    assert parser.parse(gga('120001.25'), 0.0).utc == datetime.datetime(2023, 6, 1, 12, 0, 1, 250000,
+                                                                       tzinfo=datetime.timezone.utc)
+
+
+def test_midnight_rollover():
+    # The receiver sends GGA before RMC, so the first fix of a day arrives with the previous day's date
+    parser = gps.NMEAParser()
+    parser.parse(gga('235959.90'), 0.0)
+    parser.parse(rmc('235959.90', '311223'), 0.0)
+    fix = parser.parse(gga('000000.00'), 0.1)
+    assert fix.utc == datetime.datetime(2024, 1, 1, 0, 0, 0, tzinfo=datetime.timezone.utc)
+    parser.parse(rmc('000000.00', '010124'), 0.1)
+    fix = parser.parse(gga('000000.10'), 0.2)
+    assert fix.utc == datetime.datetime(2024, 1, 1, 0, 0, 0, 100000, tzinfo=datetime.timezone.utc)
+
+
+def test_pmtk():
+    assert gps.pmtk('PMTK220,100') == b'$PMTK220,100*2F\r\n'
+
+
+def driving_north(speed=1.0, seconds=2.0):
+    """
+    :return: PositionInterpolator with a pulse every 10 cm and a fix every second, driving north at speed m/s
+    """
+    interpolator = gps.PositionInterpolator()
+    pulses = int(seconds * speed * 10)
+    for i in range(pulses + 1):
+        interpolator.add_pulse(i * 0.1 / speed, i * 10.0)
+    for t in range(int(seconds) + 1):
+        interpolator.add_fix(gps.Fix(t, 32.0 + t * speed / gps.METERS_PER_DEGREE_LATITUDE, -106.0))
+    return interpolator
+
+
+def test_interpolated_position():
+    interpolator = driving_north()
+    assert list(interpolator.fix_distances) == pytest.approx([0.0, 100.0, 200.0])
+    latitude, longitude, interpolated = interpolator.locate(150.0)
+    assert interpolated
+    assert latitude == pytest.approx(32.0 + 1.5 / gps.METERS_PER_DEGREE_LATITUDE, abs=1e-9)
+    assert longitude == -106.0
+
+
+def test_extrapolated_position():
+    # Past the last fix the cart keeps its heading for the distance the wheel measured
+    interpolator = driving_north()
+    latitude, longitude, interpolated = interpolator.locate(300.0)
+    assert not interpolated
+    assert latitude == pytest.approx(32.0 + 3.0 / gps.METERS_PER_DEGREE_LATITUDE, abs=1e-9)
+    assert longitude == pytest.approx(-106.0, abs=1e-9)
+
+
+def test_standing_still_keeps_latest_fix():
+    interpolator = driving_north()
+    interpolator.add_fix(gps.Fix(5.0, 32.5, -106.0))
+    assert len(interpolator.fixes) == 3
+    assert interpolator.fixes[-1].latitude == 32.5
+
+
+def test_trigger_located_once_fix_after_it_arrives():
+    interpolator = gps.PositionInterpolator()
+    located = []
+    locator = gps.TriggerLocator(interpolator, lambda camera, trigger, *location: located.append((trigger, location)))
+    for i in range(21):
+        interpolator.add_pulse(i * 0.1, i * 10.0)
+    trigger = types.SimpleNamespace(position=150.0)
+    locator.on_trigger('completed', None, trigger)
+    for t in (0.0, 1.0):
+        fix = gps.Fix(t, 32.0 + t / gps.METERS_PER_DEGREE_LATITUDE, -106.0)
+        interpolator.add_fix(fix)
+        locator.on_fix(fix)
+    assert located == []
+    fix = gps.Fix(2.0, 32.0 + 2.0 / gps.METERS_PER_DEGREE_LATITUDE, -106.0)
+    interpolator.add_fix(fix)
+    locator.on_fix(fix)
+    assert len(located) == 1 and located[0][1][2]
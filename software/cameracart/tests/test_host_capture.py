@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+import types
+
+import camera_array
+import capture_monitor
+import host_capture
+import sensors
+import triggering
+
+
+def test_window_limits_captures_in_flight():
+    window = host_capture.InFlightWindow(2)
+    assert window.acquire() and window.acquire()
+    assert not window.acquire(timeout=0.05)
+    assert (window.in_flight, window.waits) == (2, 1)
+    assert window.wait_time >= 0.05
+
+    threading.Timer(0.05, window.release).start()
+    assert window.acquire(timeout=1.0)
+    assert window.in_flight == 2
+    for _ in range(3):
+        window.release()
+    assert window.in_flight == 0
+
+
+class Dispatcher:
+    def __init__(self):
+        self.now = 0.0
+        self.listeners = []
+
+    def clock(self):
+        return self.now
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+
+def test_unconfirmed_capture_gives_back_its_slot(tmp_path):
+    dispatcher = Dispatcher()
+    window = host_capture.InFlightWindow(1)
+    window.acquire()
+    camera = types.SimpleNamespace(location='left')
+    downloader = host_capture.HostDownloader(camera, dispatcher, window, str(tmp_path), confirm_timeout=2.0)
+    trigger = triggering.Trigger(1, 0.0)
+    trigger.completed = 0.5
+    downloader.on_trigger('completed', camera, trigger)
+    dispatcher.now = 2.0
+    downloader.expire()
+    assert window.in_flight == 1
+    dispatcher.now = 3.0
+    downloader.expire()
+    assert window.in_flight == 0 and not downloader.unconfirmed
+
+
+def test_captures_downloaded_to_host(tmp_path, monkeypatch):
+    spec = camera_array.load()[0]
+    device = [device for device in sensors.gp.devices if device.serial_number == spec.serial_number][0]
+    monkeypatch.setattr(device, 'capture_latency', 0.02)
+    monkeypatch.setattr(device, 'ram_write_time', 0.05)
+    spec.overrides['capturetarget'] = host_capture.RAM
+    camera = sensors.Camera(name=spec.model, location=spec.location, config=spec.config,
+                            serial_number=spec.serial_number)
+    dispatcher = triggering.TriggerDispatcher()
+    window = host_capture.InFlightWindow(2)
+    worker = dispatcher.add_camera(camera, window=window)
+    monitor = capture_monitor.CaptureMonitor(camera, dispatcher)
+    downloader = host_capture.HostDownloader(camera, dispatcher, window, str(tmp_path), chunk_size=64 * 1024)
+    written = []
+    downloader.listeners.append(written.append)
+    monitor.start()
+    downloader.start()
+    try:
+        for _ in range(5):
+            dispatcher.dispatch()
+            time.sleep(0.1)
+        deadline = time.monotonic() + 10
+        while downloader.downloaded < worker.stats.completed and time.monotonic() < deadline:
+            time.sleep(0.02)
+    finally:
+        monitor.stop()
+        monitor.join()
+        dispatcher.stop()
+        downloader.stop()
+        camera.set_config({'capturetarget': camera_array.D3500_CONFIG['capturetarget']})
+        camera.camera.exit()
+
+    assert worker.stats.completed >= 3
+    assert worker.stats.busy == worker.stats.failed == 0
+    assert downloader.downloaded == worker.stats.completed and not downloader.errors
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(path) for path in written)
+    # Named by sequence number, so photos of the same trigger from different cameras sort together
+    assert all(name[:6].isdigit() and name.endswith('.nef') for name in os.listdir(tmp_path))
+    assert downloader.bytes == worker.stats.completed * device.file_size
+    assert not [path for path in device.files if path[0] == '/']
+    assert window.in_flight == 0
@@ -0,0 +1,118 @@
+import calendar
+import csv
+import time
+import types
+
+import exif
+import ingest
+import session
+
+# UTC of event time 0, logged by timesync
+OFFSET = calendar.timegm((2023, 6, 1, 16, 0, 0))
+
+LEFT = types.SimpleNamespace(location='left')
+
+
+def record_trigger(recorder, sequence, start, name=None, frame=0):
+    """
+    Logs a trigger of the left camera that took 0.1 s, and its file name if the capture was confirmed.
+    """
+    recorder.record(session.TRIGGER, start, LEFT, sequence, frame, value1=sequence * 20.0, value2=0.0, value3=0.1)
+    if name is not None:
+        recorder.record(session.CAPTURE, start + 0.3, LEFT, sequence, frame, value1=sequence * 20.0, label=name)
+
+
+def make_session(tmp_path):
+    recorder = session.SessionRecorder(str(tmp_path / 'run.ccsession'), clock=lambda: 0.0)
+    recorder.record(session.CLOCK, 0.0, value1=OFFSET)
+    for sequence in range(1, 6):
+        record_trigger(recorder, sequence, 10.0 + sequence, f'DSC_{sequence:04d}.NEF')
+    recorder.flush()
+    return recorder
+
+
+def test_match_by_name(tmp_path):
+    recorder = make_session(tmp_path)
+    triggers = ingest.SessionTriggers(recorder.path)
+    used = set()
+    trigger, how = triggers.match('left', 'DSC_0003.NEF', OFFSET + 13.05, 1.0, used)
+    assert (trigger[2:4], how) == ((3, 0), ingest.NAME)
+    assert used == {('left', 3, 0)}
+    recorder.close()
+
+
+def test_match_by_time(tmp_path):
+    recorder = make_session(tmp_path)
+    triggers = ingest.SessionTriggers(recorder.path)
+    used = set()
+    trigger, how = triggers.match('left', 'IMG_9999.NEF', OFFSET + 12.3, 1.0, used)
+    assert (trigger[2], how) == (2, ingest.TIME)
+    # A trigger is only matched once, the next photo at the same time gets the next nearest trigger
+    trigger, how = triggers.match('left', 'IMG_9999.NEF', OFFSET + 12.3, 1.0, used)
+    assert (trigger[2], how) == (3, ingest.TIME)
+    assert triggers.match('left', 'IMG_9999.NEF', OFFSET + 100.0, 1.0, used) == (None, ingest.UNMATCHED)
+    recorder.close()
+
+
+def test_repeated_name_needs_matching_time(tmp_path):
+    # Camera file names repeat every 10000 photos, a logged name at another time does not count
+    recorder = make_session(tmp_path)
+    triggers = ingest.SessionTriggers(recorder.path)
+    trigger, how = triggers.match('left', 'DSC_0001.NEF', OFFSET + 14.05, 1.0, set())
+    assert (trigger[2], how) == (4, ingest.TIME)
+    recorder.close()
+
+
+def test_match_by_sequence(tmp_path):
+    # host_capture saves files as <sequence>_<name>, a burst's frames share the sequence
+    recorder = make_session(tmp_path)
+    record_trigger(recorder, 6, 16.0, 'DSC_0006.NEF')
+    record_trigger(recorder, 6, 16.2, 'DSC_0007.NEF', frame=1)
+    recorder.flush()
+    triggers = ingest.SessionTriggers(recorder.path)
+    used = set()
+    trigger, how = triggers.match('left', '000006_DSC_0007.NEF', None, 1.0, used)
+    assert (trigger[2:4], how) == ((6, 1), ingest.SEQUENCE)
+    trigger, how = triggers.match('left', '000006_DSC_0006.NEF', None, 1.0, used)
+    assert (trigger[2:4], how) == ((6, 0), ingest.SEQUENCE)
+    recorder.close()
+
+
+def test_update_reads_new_records(tmp_path):
+    recorder = make_session(tmp_path)
+    triggers = ingest.SessionTriggers(recorder.path)
+    assert len(triggers.triggers['left']) == 5
+    record_trigger(recorder, 6, 16.0, 'DSC_0006.NEF')
+    recorder.flush()
+    triggers.update()
+    assert len(triggers.triggers['left']) == 6
+    trigger, how = triggers.match('left', 'DSC_0006.NEF', OFFSET + 16.05, 1.0, set())
+    assert (trigger[2], how) == (6, ingest.NAME)
+    recorder.close()
+
+
+def test_photo_index(tmp_path):
+    recorder = make_session(tmp_path)
+    recorder.close()
+    photos = tmp_path / 'photos' / 'left'
+    photos.mkdir(parents=True)
+    for sequence in range(1, 4):
+        exposure = time.gmtime(OFFSET + 10 + sequence)
+        fields = {'datetime_original': time.strftime('%Y:%m:%d %H:%M:%S', exposure), 'subsec': '05',
+                  'serial_number': '3534517', 'shutter_count': 100 + sequence}
+        (photos / f'DSC_{sequence:04d}.NEF').write_bytes(exif.write_tiff_header(fields))
+
+    index_path = str(tmp_path / 'run.photos.csv')
+    index = ingest.PhotoIndex(recorder.path, index_path, cameras=[], threads=True)
+    rows = index.update(str(tmp_path / 'photos'))
+    assert [(row['camera'], row['sequence'], row['match']) for row in rows] == [('left', 1, ingest.NAME),
+                                                                               ('left', 2, ingest.NAME),
+                                                                               ('left', 3, ingest.NAME)]
+    # Files already in the index are skipped, also by a new index on the same file
+    assert index.update(str(tmp_path / 'photos')) == []
+    index.close()
+    index = ingest.PhotoIndex(recorder.path, index_path, cameras=[], threads=True)
+    assert index.update(str(tmp_path / 'photos')) == []
+    index.close()
+    with open(index_path, newline='') as f:
+        assert [row['shutter_count'] for row in csv.DictReader(f)] == ['101', '102', '103']
@@ -0,0 +1,145 @@
+import math
+import threading
+import time
+import types
+
+import pytest
+
+import triggering
+
+
+class Camera:
+    """
+    Stand-in for sensors.Camera whose capture takes latency seconds, the exposure happens at its end.
+    """
+
+    def __init__(self, location, latency=0.0, configure_time=0.0, refused=False):
+        self.location = location
+        self.latency = latency
+        self.configure_time = configure_time
+        self.lock = threading.RLock()
+        self.trigger_lock = False
+        self.refused = refused
+        self.exposures = []
+        self.config_cache = types.SimpleNamespace(apply=self.apply)
+        self.config_error = None
+
+    def apply(self, settings):
+        time.sleep(self.configure_time)
+        if self.config_error is not None:
+            raise self.config_error
+
+    def trigger(self):
+        time.sleep(self.latency)
+        self.exposures.append(time.monotonic())
+        return True
+
+
+def scheduler(latencies, photo_spacing=15.0):
+    """
+    :return: (PredictiveTrigger, list of (index, exposure time, poll time) it dispatched) for workers with the
+    given latencies, without cameras
+    """
+    dispatched = []
+    now = [0.0]
+    workers = [types.SimpleNamespace(latency=types.SimpleNamespace(value=latency)) for latency in latencies]
+    dispatcher = types.SimpleNamespace(
+        workers=workers,
+        dispatch_at=lambda index, exposure_time, position: dispatched.append((index, exposure_time, now[0])))
+    predictive = triggering.PredictiveTrigger(dispatcher, 10.0, photo_spacing, clock=lambda: now[0])
+
+    def poll(t):
+        now[0] = t
+        return predictive.poll(t)
+
+    predictive.poll_at = poll
+    return predictive, dispatched
+
+
+def test_exposures_at_fixed_positions():
+    # 1 m/s, a pulse every 10 cm, a photo every 15 cm
+    predictive, dispatched = scheduler([0.08, 0.12])
+    for pulse in range(11):
+        t = pulse * 0.1
+        predictive.on_pulse(t, pulse * 10.0)
+        step = t
+        while step < t + 0.1:
+            predictive.poll_at(step)
+            step += 0.005
+
+    indices = [index for index, _, _ in dispatched]
+    assert indices == list(range(len(indices)))
+    assert indices[-1] >= 7
+    for index, exposure_time, poll_time in dispatched[2:]:
+        assert exposure_time == pytest.approx(index * 0.15)
+        # Dispatched ahead of the exposure by the slowest camera's latency, to within a poll step, unless the
+        # position is only predicted (one pulse ahead) after that
+        predicted = math.ceil(round(index * 1.5 - 1, 6)) * 0.1
+        assert poll_time <= max(exposure_time - 0.12, predicted) + 0.006
+        assert poll_time >= exposure_time - 0.12 - 1e-9
+
+
+def test_stopping_takes_at_most_one_pulse_of_photos():
+    predictive, dispatched = scheduler([0.1])
+    for pulse in range(5):
+        predictive.on_pulse(pulse * 0.1, pulse * 10.0)
+        predictive.poll_at(pulse * 0.1)
+    predictive.poll_at(100.0)
+    assert max(index for index, _, _ in dispatched) * 15.0 <= 40.0 + 10.0
+    assert predictive.poll_at(200.0) is None
+
+
+def test_replaced_cameras_keep_the_positions():
+    # The next ground position does not belong to a worker, a camera attached mid-run continues with the others
+    predictive, dispatched = scheduler([0.1])
+    for pulse in range(3):
+        predictive.on_pulse(pulse * 0.1, pulse * 10.0)
+        predictive.poll_at(pulse * 0.1 + 0.09)
+    predictive.dispatcher.workers = [types.SimpleNamespace(latency=types.SimpleNamespace(value=0.1))]
+    predictive.on_pulse(0.3, 30.0)
+    predictive.poll_at(0.39)
+    indices = [index for index, _, _ in dispatched]
+    assert indices == list(range(len(indices)))
+
+
+def test_cameras_expose_together():
+    # Each camera is released early by its own latency, so the exposures line up rather than the calls
+    dispatcher = triggering.TriggerDispatcher()
+    cameras = [Camera('left', latency=0.05), Camera('right', latency=0.15)]
+    shots = []
+    dispatcher.add_listener(lambda event, camera, trigger: event == 'shot' and shots.append(trigger))
+    for camera in cameras:
+        dispatcher.add_camera(camera).latency.value = camera.latency
+    exposure_time = time.monotonic() + 0.3
+    dispatcher.dispatch_at(1, exposure_time, 15.0)
+    time.sleep(0.6)
+    dispatcher.stop()
+
+    for camera in cameras:
+        assert camera.exposures[0] == pytest.approx(exposure_time, abs=0.02)
+    assert len(shots) == 1
+    assert shots[0].skew < 0.02
+    assert shots[0].release_skew == pytest.approx(0.1, abs=0.02)
+
+
+def test_latency_excludes_configuring():
+    dispatcher = triggering.TriggerDispatcher()
+    camera = Camera('left', latency=0.02, configure_time=0.1)
+    worker = dispatcher.add_camera(camera, burst=triggering.Burst(bracket={'shutterspeed': [9]}))
+    dispatcher.dispatch()
+    time.sleep(0.3)
+    dispatcher.stop()
+    assert worker.stats.completed == 1
+    assert worker.latency.value == pytest.approx(0.02, abs=0.015)
+
+
+def test_configure_failure_is_not_busy():
+    # The last capture was refused, but this frame never reached the camera
+    dispatcher = triggering.TriggerDispatcher()
+    camera = Camera('left', refused=True)
+    camera.config_error = IOError('USB error')
+    worker = dispatcher.add_camera(camera, burst=triggering.Burst(bracket={'shutterspeed': [9]}))
+    dispatcher.dispatch()
+    time.sleep(0.2)
+    dispatcher.stop()
+    assert (worker.stats.failed, worker.stats.busy) == (1, 0)
@@ -0,0 +1,107 @@
+import math
+import threading
+import time
+
+import pytest
+
+import emulators
+import replay
+import sensors
+import triggering
+
+
+def test_virtual_sleep_waits_for_the_replay():
+    clock = replay.ReplayClock(replay.AS_FAST_AS_POSSIBLE)
+    woke = []
+    thread = threading.Thread(target=lambda: (clock.sleep(1.0), woke.append(clock.now())))
+    thread.start()
+    while clock.sleeping() == 0:
+        time.sleep(0.001)
+    assert clock.next_wake_time() == 1.0
+    clock.advance(0.5)
+    time.sleep(0.02)
+    assert woke == [] and clock.sleeping() == 1
+    clock.advance(1.25)
+    thread.join(1)
+    assert woke == [1.25] and clock.sleeping() == 0
+
+
+@pytest.fixture
+def cart(monkeypatch):
+    """
+    Movement sensor, dispatcher and two fresh simulated cameras that all run on a virtual replay clock.
+    :return: (clock, movement sensor, dispatcher, devices)
+    """
+    clock = replay.ReplayClock(replay.AS_FAST_AS_POSSIBLE)
+    devices = [emulators.SimulatedCameraDevice('Nikon DSC D3500', f'usb:002,{i + 1:03d}', 2000 + i, seed=i)
+               for i in range(2)]
+    monkeypatch.setattr(sensors.gp, 'devices', devices)
+    sensors.gp.set_clock(clock.now, clock.sleep)
+    sensors.get_camera_registry().invalidate()
+    movement_sensor = sensors.MovementSensor(gpio_pin=10, movement_distance=19.5, mode=sensors.MovementSensor.EDGE,
+                                             clock=clock.now)
+    dispatcher = triggering.TriggerDispatcher(clock=clock.now, sleep=clock.sleep)
+    cameras = [sensors.Camera(name=device.model, location=f'camera{i}', serial_number=device.serial_number)
+               for i, device in enumerate(devices)]
+    for camera in cameras:
+        dispatcher.add_camera(camera)
+    yield clock, movement_sensor, dispatcher, devices
+    dispatcher.stop()
+    movement_sensor.stop()
+    for camera in cameras:
+        camera.camera.exit()
+    sensors.get_camera_registry().invalidate()
+
+
+def replay_run(cart, timeline, schedulers=()):
+    clock, movement_sensor, dispatcher, devices = cart
+    engine = replay.ReplayEngine(timeline, movement_sensor, clock, schedulers=schedulers,
+                                 busy=lambda: sum(worker.pending() for worker in dispatcher.workers))
+    start = time.monotonic()
+    engine.run()
+    return engine, time.monotonic() - start
+
+
+def test_replay_in_virtual_time(cart):
+    # 100 s at 1 m/s. The cameras write a frame every 0.25 s but are triggered every 0.195 s, so once their
+    # buffers of 6 frames are full the extra triggers find them busy.
+    clock, movement_sensor, dispatcher, devices = cart
+    movement_sensor.add_listener(dispatcher.dispatch)
+    engine, wall_time = replay_run(cart, replay.Timeline.constant_speed(100.0, 10000.0))
+    assert wall_time < 20
+    assert engine.pulses_replayed == movement_sensor.cumulative_movements == 512
+    # Until the last capture has finished
+    assert clock.now() == pytest.approx(511 * 0.195 + 0.08)
+    for device, stats in zip(devices, dispatcher.stats().values()):
+        assert stats['issued'] == 512
+        assert stats['completed'] == len(device.exposures) == 404
+        assert stats['busy'] == 512 - 404
+        assert stats['failed'] == stats['dropped'] == 0
+
+
+def test_predictive_exposures_on_schedule(cart):
+    # Release times and capture latencies are both in replay time, so every exposure is exactly where it is
+    # scheduled: at its position, or one latency after the pulse it is predicted at (one pulse ahead) if that is later
+    clock, movement_sensor, dispatcher, devices = cart
+    predictive = triggering.PredictiveTrigger(dispatcher, movement_sensor.movement_distance, 30.0, clock=clock.now)
+    movement_sensor.add_listener(predictive.on_pulse)
+    replay_run(cart, replay.Timeline.constant_speed(100.0, 1000.0), schedulers=[predictive])
+    expected = []
+    for index in range(34):
+        # The first pulse is at 19.5 cm and replay time 0
+        pulse = math.ceil(round((index * 30.0 - 19.5) / 19.5, 6)) - 1
+        expected.append(max((index * 30.0 - 19.5) / 100.0, pulse * 0.195 + 0.08))
+    for device in devices:
+        # The first two photos are taken before the velocity and latency have been measured
+        assert device.exposures[2:] == pytest.approx(expected[2:])
+
+
+def test_gps_fixes(cart):
+    clock, movement_sensor, dispatcher, devices = cart
+    fixes = []
+    timeline = replay.Timeline([10.0, 10.5], [(10.2, 32.28, -106.75, 1186.0), (11.0, 32.29, -106.75, 1187.0)])
+    engine = replay.ReplayEngine(timeline, movement_sensor, clock)
+    engine.fix_listeners.append(fixes.append)
+    engine.run()
+    assert [(fix.time, fix.latitude, fix.altitude) for fix in fixes] == [(pytest.approx(0.2), 32.28, 1186.0),
+                                                                         (1.0, 32.29, 1187.0)]
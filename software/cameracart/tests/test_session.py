@@ -0,0 +1,113 @@
+import csv
+import json
+import math
+import types
+
+import pytest
+
+import capture_monitor
+import session
+import triggering
+
+LEFT = types.SimpleNamespace(location='left')
+RIGHT = types.SimpleNamespace(location='right')
+
+
+def recorder(tmp_path, **kwargs):
+    return session.SessionRecorder(str(tmp_path / 'run.ccsession'), clock=lambda: 5.0, metadata={'field': 'test'},
+                                   **kwargs)
+
+
+def test_records_round_trip(tmp_path):
+    log = recorder(tmp_path)
+    log.record_pulse(1.0, 19.5)
+    log.record_gps(1.5, 32.28, -106.75, 1186.0)
+    log.record(session.CLOCK, value1=1.6e9, label='gps')
+    log.close()
+
+    records = session.read_session(log.path)
+    assert list(records['event']) == [session.PULSE, session.GPS, session.CLOCK]
+    assert list(records['time']) == [1.0, 1.5, 5.0]
+    assert records['value1'][0] == 19.5
+    assert tuple(records[1][['value1', 'value2', 'value3']]) == (32.28, -106.75, 1186.0)
+    assert records['camera'][2] == session.NO_CAMERA
+    assert records['label'][2] == b'gps'
+    assert math.isnan(records['value2'][0])
+
+    header = session.read_header(log.path)
+    metadata = session.read_metadata(log.path)
+    assert header['monotonic_start'] == metadata['monotonic_start'] == 5.0
+    assert metadata['field'] == 'test'
+
+
+def test_trigger_events(tmp_path):
+    log = recorder(tmp_path)
+    trigger = triggering.Trigger(3, 10.0, position=58.5)
+    trigger.started, trigger.completed, trigger.success = 10.01, 10.09, True
+    log.on_trigger('completed', LEFT, trigger)
+    trigger.capture = capture_monitor.Capture(trigger, '/store_00010001/DCIM/100D3500', 'DSC_0003.NEF', 10.4)
+    log.on_trigger('confirmed', LEFT, trigger)
+    burst_frame = trigger.next_frame()
+    log.on_trigger('dropped', RIGHT, burst_frame)
+    log.close()
+
+    records = session.read_session(log.path)
+    assert list(records['event']) == [session.TRIGGER, session.CAPTURE, session.DROPPED]
+    assert list(records['camera']) == [0, 0, 1]
+    assert list(records['sequence']) == [3, 3, 3]
+    assert list(records['frame']) == [0, 0, 1]
+    assert records['value2'][0] == pytest.approx(0.01)
+    assert records['value3'][0] == pytest.approx(0.08)
+    assert records['label'][1] == b'DSC_0003.NEF'
+    assert session.read_metadata(log.path)['cameras'] == ['left', 'right']
+
+
+def test_partial_record_ignored(tmp_path):
+    # A power loss can leave the end of a record unwritten
+    log = recorder(tmp_path)
+    for i in range(3):
+        log.record_pulse(float(i), i * 19.5)
+    log.close()
+    with open(log.path, 'ab') as f:
+        f.write(session.RECORD.pack(9.0, session.PULSE, 0, 0, 0, 58.5, 0.0, 0.0, b'')[:20])
+    assert session.record_count(log.path) == 3
+    assert list(session.read_session(log.path)['value1']) == [0.0, 19.5, 39.0]
+
+
+def test_more_records_than_a_batch(tmp_path):
+    log = recorder(tmp_path, batch_size=4, flush_interval=60.0)
+    for i in range(10):
+        log.record_pulse(float(i), i * 19.5)
+    log.close()
+    assert list(session.read_session(log.path)['time']) == [float(i) for i in range(10)]
+
+
+def test_reopen_appends(tmp_path):
+    log = recorder(tmp_path)
+    log.record_pulse(1.0, 19.5)
+    log.close()
+    log = recorder(tmp_path)
+    log.record_pulse(2.0, 39.0)
+    log.close()
+    assert list(session.read_session(log.path)['value1']) == [19.5, 39.0]
+
+
+def test_not_a_session(tmp_path):
+    path = tmp_path / 'photo.NEF'
+    path.write_bytes(b'\x00' * 100)
+    with pytest.raises(ValueError):
+        session.read_session(str(path))
+
+
+def test_export_csv(tmp_path):
+    log = recorder(tmp_path)
+    log.record(session.PULSE, 1.0, LEFT, value1=19.5)
+    log.close()
+    csv_path = tmp_path / 'run.csv'
+    session.export_csv(log.path, str(csv_path))
+    with open(csv_path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 1
+    assert (rows[0]['event'], rows[0]['camera'], float(rows[0]['value1'])) == ('pulse', 'left', 19.5)
+    with open(session.metadata_path(log.path)) as f:
+        assert json.load(f)['cameras'] == ['left']
@@ -0,0 +1,72 @@
+import calendar
+import types
+
+import numpy as np
+import pytest
+
+import session
+import solar
+
+
+def test_spa_example():
+    # Example of NREL's Solar Position Algorithm (Reda and Andreas 2008): 2003-10-17 12:30:30 MST at NREL, Golden,
+    # topocentric zenith 50.11162 and azimuth 194.34024 degrees. NOAA's algorithm agrees to about 0.01 degrees.
+    t = calendar.timegm((2003, 10, 17, 19, 30, 30))
+    elevation, azimuth = solar.position(t, 39.742476, -105.1786)
+    assert elevation == pytest.approx(90 - 50.11162, abs=0.01)
+    assert azimuth == pytest.approx(194.34024, abs=0.01)
+
+
+def test_solstice_noon():
+    # At the June solstice (2023-06-21 14:58 UTC) the declination is the obliquity of the ecliptic, 23.44 degrees,
+    # so at solar noon the sun is 90 - |latitude - 23.44| degrees high, north of latitudes below that
+    t = calendar.timegm((2023, 6, 21, 12, 2, 0))  # solar noon at the prime meridian, equation of time -1.8 minutes
+    latitudes = np.array([0.0, 20.0, 45.0])
+    elevation, azimuth = solar.position(np.full(3, float(t)), latitudes, np.zeros(3), refract=False)
+    assert elevation == pytest.approx(90 - abs(latitudes - 23.44), abs=0.02)
+    assert min(azimuth[0], 360 - azimuth[0]) < 1
+    assert azimuth[2] == pytest.approx(180.0, abs=1.0)
+
+
+def test_night():
+    # Midnight at the cart's field in Las Cruces
+    t = calendar.timegm((2023, 6, 1, 7, 0, 0))
+    elevation, _ = solar.position(t, 32.28, -106.75)
+    assert elevation < -30
+
+
+def test_refraction():
+    assert solar.refraction(90.0) == 0.0
+    # About half a degree at the horizon, a minute of arc at 45 degrees
+    assert solar.refraction(0.0) == pytest.approx(0.48, abs=0.02)
+    assert solar.refraction(45.0) * 60 == pytest.approx(0.97, abs=0.03)
+
+
+def test_arrays_broadcast():
+    times = calendar.timegm((2023, 6, 1, 18, 0, 0)) + np.arange(5) * 600.0
+    elevations, azimuths = solar.position(times, 32.28, -106.75)
+    assert elevations.shape == azimuths.shape == (5,)
+    for t, elevation, azimuth in zip(times, elevations, azimuths):
+        assert (elevation, azimuth) == pytest.approx(solar.position(float(t), 32.28, -106.75))
+
+
+def test_annotate_session_uses_logged_clock(tmp_path):
+    # The system clock was wrong when the session started, timesync logged the offset to UTC once GPS had a fix
+    utc_start = calendar.timegm((2023, 6, 1, 18, 0, 0))
+    now = [100.0]
+    recorder = session.SessionRecorder(str(tmp_path / 'run.ccsession'), clock=lambda: now[0])
+    offset = utc_start - 100.0
+    recorder.record(session.GPS, 100.0, value1=32.28, value2=-106.75)
+    recorder.record(session.CLOCK, 101.0, value1=offset)
+    recorder.record(session.GPS, 160.0, value1=32.29, value2=-106.75)
+    camera = types.SimpleNamespace(location='left')
+    recorder.record(session.TRIGGER, 130.0, camera, 7, value1=300.0)
+    recorder.close()
+
+    result = solar.annotate_session(recorder.path)
+    assert len(result) == 1
+    assert result['sequence'][0] == 7
+    assert result['time'][0] == pytest.approx(utc_start + 30.0)
+    assert result['latitude'][0] == pytest.approx(32.285)
+    elevation, azimuth = solar.position(utc_start + 30.0, 32.285, -106.75)
+    assert (result['elevation'][0], result['azimuth'][0]) == pytest.approx((elevation, azimuth))
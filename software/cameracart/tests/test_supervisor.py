@@ -0,0 +1,100 @@
+import time
+
+import pytest
+
+import engine
+import sensors
+import supervisor
+
+
+def device(spec):
+    for device_ in sensors.gp.devices:
+        if device_.serial_number == spec.serial_number:
+            return device_
+
+
+@pytest.fixture
+def cart():
+    """
+    CartEngine with the simulated cameras, the supervisor is not started so the tests run its checks.
+    """
+    cart = engine.CartEngine('supervisor-test')
+    yield cart
+    for spec in cart.camera_specs:
+        device(spec).plug()
+    cart.stop()
+
+
+def dispatch(cart, triggers=1):
+    workers = list(cart.trigger_dispatcher.workers)
+    for _ in range(triggers):
+        cart.trigger_dispatcher.dispatch()
+        deadline = time.monotonic() + 5
+        while any(worker.pending() for worker in workers) and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+def test_unplugged_camera_reconnects(cart, capsys):
+    center = cart.camera_specs[1]
+    old_camera = cart.cameras[1]
+    dispatch(cart, 2)
+    device(center).unplug()
+    cart.supervisor.check()
+    cart.supervisor.check()
+    assert cart.supervisor.state('center') == supervisor.CameraSupervisor.LOST
+    assert cart.cameras[1] is None
+    assert [camera.location for camera in cart.connected_cameras()] == ['left', 'right']
+    # The others keep triggering
+    dispatch(cart)
+    assert cart.trigger_dispatcher.stats()['left']['completed'] == 3
+    output = capsys.readouterr().out
+    assert output.count('center camera lost') == 1
+    assert output.count('Could not reconnect center camera') == 1
+
+    device(center).plug('usb:001,009')
+    cart.supervisor.check()
+    assert cart.supervisor.state('center') == supervisor.CameraSupervisor.OK
+    assert cart.cameras[1] is not old_camera and cart.cameras[1].address == 'usb:001,009'
+    assert cart.supervisor.reconnects == 1
+    dispatch(cart)
+    # Counters continue from the camera that was replaced
+    assert cart.trigger_dispatcher.stats()['center']['completed'] == 3
+    assert 'center camera reconnected at usb:001,009' in capsys.readouterr().out
+
+
+def test_reconnect_failure_reported_once_per_loss(cart, capsys):
+    center = cart.camera_specs[1]
+    for _ in range(2):
+        device(center).unplug()
+        for _ in range(3):
+            cart.supervisor.check()
+        device(center).plug()
+        cart.supervisor.check()
+    assert capsys.readouterr().out.count('Could not reconnect center camera') == 2
+    assert cart.supervisor.reconnects == 2
+
+
+def test_reset(cart):
+    old_camera = cart.cameras[0]
+    cart.reset_camera(0)
+    assert cart.supervisor.state('left') == supervisor.CameraSupervisor.LOST
+    cart.supervisor.check()
+    assert cart.supervisor.state('left') == supervisor.CameraSupervisor.OK
+    assert cart.cameras[0] is not None and cart.cameras[0] is not old_camera
+    assert cart.trigger_dispatcher.worker(cart.cameras[0]).camera is cart.cameras[0]
+    assert sorted(cart.capture_monitors) == ['center', 'left', 'right']
+
+
+def test_failed_triggers_mark_camera_lost(cart):
+    camera = cart.cameras[2]
+    device(cart.camera_specs[2]).trigger_error_rate = 1.0
+    try:
+        dispatch(cart, cart.supervisor.max_failures)
+    finally:
+        device(cart.camera_specs[2]).trigger_error_rate = 0.0
+    assert cart.supervisor.state('right') == supervisor.CameraSupervisor.LOST
+    cart.supervisor.check()
+    assert cart.supervisor.state('right') == supervisor.CameraSupervisor.OK
+    assert cart.cameras[2] is not camera
+    assert cart.supervisor.failures['right'] == 0
+    assert cart.trigger_dispatcher.stats()['right']['failed'] == cart.supervisor.max_failures
@@ -0,0 +1,140 @@
+import json
+import threading
+import time
+import types
+
+import pytest
+
+import camera_array
+import triggering
+
+
+def release_later(shot, delay):
+    """
+    Releases a trigger of the shot from another thread after delay seconds.
+    :return: (thread, trigger), trigger.started is set once release() returns
+    """
+    trigger = types.SimpleNamespace(started=None, completed=None, success=True)
+
+    def run():
+        time.sleep(delay)
+        shot.release(trigger)
+        trigger.started = time.monotonic()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, trigger
+
+
+def test_cameras_wait_for_each_other():
+    shot = triggering.Shot(1, timeout=1.0)
+    shot.set_parties(2)
+    start = time.monotonic()
+    threads = [release_later(shot, 0.0), release_later(shot, 0.1)]
+    for thread, _ in threads:
+        thread.join()
+    # The first camera is released when the second arrives
+    assert threads[0][1].started - start == pytest.approx(0.1, abs=0.03)
+    assert shot.release_skew < 0.02
+
+
+def test_busy_camera_does_not_hold_back_the_others():
+    shot = triggering.Shot(1, timeout=0.05)
+    shot.set_parties(2)
+    start = time.monotonic()
+    thread, trigger = release_later(shot, 0.0)
+    thread.join()
+    assert trigger.started - start == pytest.approx(0.05, abs=0.03)
+
+
+def test_dropped_trigger_leaves_the_shot():
+    shot = triggering.Shot(1, timeout=1.0)
+    shot.set_parties(2)
+    assert not shot.leave()
+    start = time.monotonic()
+    thread, trigger = release_later(shot, 0.0)
+    thread.join()
+    assert trigger.started - start < 0.05
+    assert shot.finish()
+
+
+def test_shot_finished_once():
+    shot = triggering.Shot(1)
+    assert not shot.finish()  # parties are not known yet
+    assert shot.set_parties(2) is False
+    assert shot.finish()
+    assert not shot.finish()
+
+
+def test_skew_ignores_failed_captures():
+    shot = triggering.Shot(1)
+    shot.triggers = [types.SimpleNamespace(started=1.0, completed=1.3, success=True),
+                     types.SimpleNamespace(started=1.01, completed=1.32, success=True),
+                     types.SimpleNamespace(started=1.02, completed=5.0, success=False)]
+    assert shot.release_skew == pytest.approx(0.02)
+    assert shot.skew == pytest.approx(0.02)
+    assert triggering.Shot(2).skew == 0.0
+
+
+class Camera:
+    def __init__(self, location, latency):
+        self.location = location
+        self.latency = latency
+        self.lock = threading.RLock()
+        self.trigger_lock = False
+        self.refused = False
+
+    def trigger(self):
+        time.sleep(self.latency)
+        return True
+
+
+def test_dispatched_shots_measure_skew():
+    dispatcher = triggering.TriggerDispatcher(sync_timeout=0.5)
+    shots = []
+    dispatcher.add_listener(lambda event, camera, shot: event == 'shot' and shots.append(shot))
+    for location in ('left', 'center', 'right'):
+        dispatcher.add_camera(Camera(location, 0.02))
+    for _ in range(3):
+        dispatcher.dispatch()
+        time.sleep(0.1)
+    dispatcher.stop()
+    assert [shot.sequence for shot in shots] == [1, 2, 3]
+    assert all(len(shot.triggers) == 3 for shot in shots)
+    assert len(dispatcher.skews) == 3
+    assert max(dispatcher.skews) < 0.02
+
+
+def test_unsynchronized_dispatch_has_no_shots():
+    dispatcher = triggering.TriggerDispatcher(synchronize=False)
+    events = []
+    dispatcher.add_listener(lambda event, camera, trigger: events.append(event))
+    dispatcher.add_camera(Camera('left', 0.0))
+    dispatcher.dispatch()
+    time.sleep(0.1)
+    dispatcher.stop()
+    assert 'shot' not in events and 'completed' in events
+    assert len(dispatcher.skews) == 0
+
+
+def test_camera_array_file(tmp_path):
+    cameras = camera_array.load()
+    assert [camera.location for camera in cameras] == ['left', 'center', 'right']
+    cameras[0].overrides['iso'] = 3
+    cameras[0].burst = {'frames': 2}
+    path = str(tmp_path / 'cameras.json')
+    camera_array.save(cameras, path)
+    loaded = camera_array.load(path)
+    assert [camera.as_dict() for camera in loaded] == [camera.as_dict() for camera in cameras]
+    assert loaded[0].config['iso'] == 3
+    assert loaded[1].config == camera_array.PROFILES['d3300']
+
+
+def test_camera_array_locations_unique(tmp_path):
+    path = tmp_path / 'cameras.json'
+    camera = {'model': 'Nikon DSC D3500', 'serial_number': 1, 'location': 'left', 'profile': 'd3500'}
+    path.write_text(json.dumps({'cameras': [camera, camera]}))
+    with pytest.raises(ValueError):
+        camera_array.load(str(path))
+    with pytest.raises(ValueError):
+        camera_array.CameraSpec('Nikon DSC D3500', 1, 'left', 'd7000')
@@ -0,0 +1,57 @@
+import os
+import time
+
+import sensors
+import transfer
+
+
+class Camera:
+    """
+    Stand-in for sensors.Camera that records the time of every request.
+    """
+    location = 'left'
+
+    def __init__(self, files):
+        self.files = files
+        self.requests = []
+
+    def list_files(self):
+        self.requests.append(('list', time.monotonic()))
+        return self.files
+
+    def save(self, folder, name, path, chunk_size, before_chunk):
+        self.requests.append(('size', time.monotonic()))
+        if before_chunk() is False:
+            return sensors.Camera.STOPPED
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(name.encode())
+        return sensors.Camera.SAVED
+
+
+def test_no_requests_while_moving(tmp_path):
+    gate = transfer.MovementGate(idle_time=0.2)
+    gate.moved()
+    camera = Camera([('/store_00010001/DCIM/100NIKON', f'DSC_000{i}.NEF') for i in range(3)])
+    transfer_ = transfer.PhotoTransfer(camera, str(tmp_path), gate=gate)
+    written = []
+    transfer_.listeners.append(written.append)
+    transfer_.start()
+    transfer_.join(5)
+    idle = gate.last_movement + gate.idle_time
+    assert camera.requests and all(request_time >= idle for _, request_time in camera.requests)
+    assert sorted(os.listdir(tmp_path / '100NIKON')) == ['DSC_0000.NEF', 'DSC_0001.NEF', 'DSC_0002.NEF']
+    assert transfer_.files_done == len(written) == 3
+
+
+def test_stopped_while_waiting(tmp_path):
+    gate = transfer.MovementGate(idle_time=10.0)
+    gate.moved()
+    camera = Camera([('/', 'capt0001.nef')])
+    transfer_ = transfer.PhotoTransfer(camera, str(tmp_path), gate=gate)
+    transfer_.start()
+    time.sleep(0.05)
+    transfer_.stop()
+    transfer_.join(1)
+    assert not transfer_.is_alive()
+    assert camera.requests == []
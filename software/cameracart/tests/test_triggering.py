@@ -0,0 +1,144 @@
+import time
+
+import pytest
+
+import sensors
+import triggering
+
+
+def test_burst_all_frames_when_idle():
+    assert triggering.Burst(frames=3).plan(0.0, 0.0) == 3
+
+
+def test_burst_limited_by_buffer():
+    burst = triggering.Burst(frames=4, depth=6, write_time=0.25)
+    for _ in range(5):
+        burst.add_frame(0.0)
+    assert burst.buffered(0.0) == 5
+    assert burst.plan(0.0, 0.0) == 1
+    # Half a second later two frames have been written to the card
+    assert burst.plan(2.0, 0.5) == 3
+    assert burst.plan(4.0, 10.0) == 4
+
+
+def test_burst_limited_by_trigger_interval():
+    # Frames are written while the cart moves on, a burst must not take longer to write than the next trigger
+    burst = triggering.Burst(frames=4, depth=6, write_time=0.25)
+    assert burst.plan(0.0, 0.0) == 4
+    assert burst.plan(0.5, 0.5) == 2
+    assert burst.plan(1.0, 1.0) == 2
+    # The interval is a moving average, so a single slow trigger does not bring back every frame
+    assert burst.plan(3.0, 3.0) == 3
+
+
+def test_burst_takes_at_least_one_frame():
+    burst = triggering.Burst(frames=3, depth=2, write_time=1.0)
+    for _ in range(10):
+        burst.add_frame(0.0)
+    assert burst.plan(0.0, 0.0) == 1
+    assert burst.plan(0.1, 0.1) == 1
+
+
+def test_burst_settings():
+    burst = triggering.Burst.from_dict({'frames': 3, 'bracket': {'shutterspeed': [9, 7, 11]}, 'buffer_depth': 4})
+    assert burst.depth == 4
+    assert [burst.settings(frame) for frame in range(4)] == [{'shutterspeed': 9}, {'shutterspeed': 7},
+                                                           {'shutterspeed': 11}, {'shutterspeed': 9}]
+    assert triggering.Burst(frames=2).settings(1) == {}
+    with pytest.raises(ValueError):
+        triggering.Burst(frames=0)
+
+
+@pytest.fixture
+def camera(monkeypatch):
+    """
+    Simulated D3500 whose trigger_capture takes 0.3 s, so triggers issued 50 ms apart find it busy.
+    """
+    device = sensors.gp.devices[0]
+    monkeypatch.setattr(device, 'capture_latency', 0.3)
+    camera = sensors.Camera(name=device.model, location='left', serial_number=device.serial_number)
+    yield camera
+    camera.camera.exit()
+
+
+def run(camera, policy, triggers=3):
+    """
+    Dispatches triggers 50 ms apart, while the camera is busy with the first, and waits until the camera has run
+    every trigger it accepted.
+    :return: (dispatcher, list of (event, sequence))
+    """
+    dispatcher = triggering.TriggerDispatcher()
+    events = []
+
+    def on_trigger(event, camera_, trigger):
+        if event != 'shot':
+            events.append((event, trigger.sequence))
+
+    dispatcher.add_listener(on_trigger)
+    worker = dispatcher.add_camera(camera, policy=policy)
+    for _ in range(triggers):
+        dispatcher.dispatch()
+        time.sleep(0.05)
+    deadline = time.monotonic() + 5
+    while worker.pending() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    dispatcher.stop()
+    return dispatcher, events
+
+
+def completed(events):
+    return [sequence for event, sequence in events if event == 'completed']
+
+
+def test_coalesce(camera):
+    # The second trigger waits and is replaced by the third, the camera takes the first and the latest
+    dispatcher, events = run(camera, triggering.COALESCE)
+    assert completed(events) == [1, 3]
+    assert ('dropped', 2) in events
+    stats = dispatcher.stats()['left']
+    assert (stats['issued'], stats['completed'], stats['dropped'], stats['failed']) == (3, 2, 1, 0)
+
+
+def test_drop_if_busy(camera):
+    dispatcher, events = run(camera, triggering.DROP_IF_BUSY)
+    assert completed(events) == [1]
+    assert [sequence for event, sequence in events if event == 'dropped'] == [2, 3]
+    stats = dispatcher.stats()['left']
+    assert (stats['issued'], stats['completed'], stats['dropped'], stats['failed']) == (3, 1, 2, 0)
+
+
+def test_block(camera):
+    # Dispatching waits for room in the queue, so every trigger is taken, late
+    start = time.monotonic()
+    dispatcher, events = run(camera, triggering.BLOCK)
+    assert completed(events) == [1, 2, 3]
+    assert time.monotonic() - start >= 0.6
+    stats = dispatcher.stats()['left']
+    assert (stats['issued'], stats['completed'], stats['dropped'], stats['failed']) == (3, 3, 0, 0)
+    assert stats['late'] >= 1
+
+
+def test_unknown_policy(camera):
+    with pytest.raises(ValueError):
+        triggering.TriggerDispatcher().add_camera(camera, policy='queue')
+
+
+def test_bracketed_burst(camera):
+    sensors.gp.devices[0].capture_latency = 0.02
+    shutterspeeds = sensors.gp.devices[0].CHOICES['shutterspeed']
+    dispatcher = triggering.TriggerDispatcher()
+    frames = []
+    dispatcher.add_listener(lambda event, camera_, trigger: event == 'completed' and frames.append(
+        (trigger.sequence, trigger.frame, sensors.gp.devices[0].value('shutterspeed'))))
+    burst = triggering.Burst(frames=3, bracket={'shutterspeed': [9, 7, 11]})
+    worker = dispatcher.add_camera(camera, burst=burst)
+    dispatcher.dispatch()
+    deadline = time.monotonic() + 5
+    while worker.pending() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    dispatcher.stop()
+    assert frames == [(1, 0, shutterspeeds[9]), (1, 1, shutterspeeds[7]), (1, 2, shutterspeeds[11])]
+    # The first frame's settings are back for the next trigger
+    assert sensors.gp.devices[0].value('shutterspeed') == shutterspeeds[9]
+    stats = dispatcher.stats()['left']
+    assert (stats['completed'], stats['frames'], stats['frames_cut']) == (1, 3, 0)
@@ -0,0 +1,272 @@
+"""
+Background time synchronization.
+
+The Pi has no real time clock and usually no network in the field, so UTC is taken from the GPS: NMEA sentences
+give the time of each fix to within the receiver's output delay, and the PPS pulse (if wired to a GPIO pin) marks
+the start of each second to within microseconds. NTP is only tried in the background when a server is given.
+Nothing here blocks startup; until a source is available, times fall back to the system clock.
+
+Camera clocks only have whole seconds, so their offsets are estimated as intervals that are narrowed down with
+every observation, from the moment the camera's datetime setting ticks over and from the file times of captures.
+"""
+import collections
+import math
+import threading
+import time
+
+import sensors
+import session
+
+SYSTEM = 'system'
+NMEA = 'nmea'
+PPS = 'pps'
+NTP = 'ntp'
+
+
+class OffsetEstimate:
+    """
+    Offset known to lie between lower and upper; every observation narrows the interval. An observation that does
+    not overlap the current interval means the clock was changed, and starts a new estimate.
+    """
+
+    def __init__(self):
+        self.lower = -math.inf
+        self.upper = math.inf
+        self.observations = 0
+
+    def add(self, lower, upper):
+        if lower > self.upper or upper < self.lower:
+            self.lower, self.upper = -math.inf, math.inf
+        self.lower = max(self.lower, lower)
+        self.upper = min(self.upper, upper)
+        self.observations += 1
+
+    @property
+    def known(self):
+        return self.observations > 0
+
+    @property
+    def value(self):
+        return (self.lower + self.upper) / 2 if self.known else None
+
+    @property
+    def uncertainty(self):
+        return (self.upper - self.lower) / 2 if self.known else None
+
+
+class TimeService(threading.Thread):
+    """
+    Maps the monotonic clock used for pulses, triggers and session logs to UTC, and estimates each camera's clock
+    offset. Offsets are logged as CLOCK session events, so session times and EXIF times can be joined afterwards.
+    """
+
+    def __init__(self, engine, pps_pin=None, ntp_server=None, interval=10.0, camera_interval=600.0, window=60.0,
+                 set_camera_clocks=False):
+        """
+        :param engine: engine.CartEngine
+        :param pps_pin: BCM pin the GPS's PPS output is connected to, if any
+        :param ntp_server: NTP server tried in the background, e.g. when the cart is on a network at the station
+        :param interval: seconds between updates of the host offset
+        :param camera_interval: seconds between datetime measurements of each camera
+        :param window: seconds of GPS fixes considered for the NMEA offset
+        :param set_camera_clocks: set camera clocks that are more than a second off to UTC
+        """
+        super().__init__(daemon=True, name='time service')
+        self.engine = engine
+        self.clock = engine.movement_sensor.clock
+        self.pps_pin = pps_pin
+        self.ntp_server = ntp_server
+        self.interval = interval
+        self.camera_interval = camera_interval
+        self.window = window
+        self.set_camera_clocks = set_camera_clocks
+
+        self.lock = threading.Lock()
+        self.offset = None  # UTC - monotonic clock
+        self.uncertainty = None
+        self.source = SYSTEM
+        self.nmea_samples = collections.deque()  # (receive time, UTC - receive time)
+        self.last_pps = None
+        self.recorded = None
+
+        self.camera_offsets = {}  # camera location -> OffsetEstimate of camera clock - UTC
+        self.camera_measured = {}  # camera location -> monotonic time of the last datetime measurement
+        self.captures = collections.deque(maxlen=1000)  # (camera, trigger) waiting for their file time
+        self.stop_event = threading.Event()
+
+        if pps_pin is not None:
+            sensors.gpio_setup(pps_pin)
+            sensors.GPIO.add_event_detect(pps_pin, sensors.GPIO.RISING, callback=self.on_pps)
+
+    def utc(self, t=None):
+        """
+        :param t: monotonic time, defaults to now
+        :return: UTC as seconds since the epoch
+        """
+        if t is None:
+            t = self.clock()
+        offset = self.offset
+        if offset is None:
+            return time.time() - self.clock() + t
+        return t + offset
+
+    def set_offset(self, offset, uncertainty, source):
+        with self.lock:
+            self.offset, self.uncertainty, self.source = offset, uncertainty, source
+
+    def on_pps(self, channel=None):
+        """
+        GPIO callback, the pulse marks the start of a UTC second.
+        """
+        self.last_pps = self.clock()
+
+    def on_fix(self, fix):
+        """
+        GPS listener.
+        """
+        if fix.utc is None:
+            return
+        utc = fix.utc.timestamp()
+        pps = self.last_pps
+        if pps is not None and 0 <= fix.time - pps < 1 and utc - math.floor(utc) < fix.time - pps:
+            # The sentence describes the second that started at the last pulse
+            self.set_offset(math.floor(utc) - pps, 0.001, PPS)
+            return
+
+        # Sentences arrive some time after their fix, so the smallest delay seen is the best estimate
+        with self.lock:
+            self.nmea_samples.append((fix.time, utc - fix.time))
+            while self.nmea_samples and self.nmea_samples[0][0] < fix.time - self.window:
+                self.nmea_samples.popleft()
+            offset = max(sample for _, sample in self.nmea_samples)
+        if self.source != PPS or pps is None or fix.time - pps > 2:
+            self.set_offset(offset, 0.1, NMEA)
+
+    def on_trigger(self, event, camera, trigger):
+        """
+        Dispatcher listener, confirmed captures are used to estimate the camera's clock offset.
+        """
+        if event == 'confirmed' and trigger.completed is not None:
+            self.captures.append((camera, trigger))
+
+    def query_ntp(self):
+        try:
+            import ntplib
+        except ImportError:
+            print('ntplib is not installed, NTP is disabled.')
+            self.ntp_server = None
+            return
+        try:
+            response = ntplib.NTPClient().request(self.ntp_server, version=3, timeout=1)
+        except Exception:  # no network
+            return
+        now = self.clock()
+        self.set_offset(time.time() + response.offset - now, response.delay / 2, NTP)
+
+    def camera_offset(self, camera):
+        estimate = self.camera_offsets.get(camera.location)
+        return None if estimate is None else estimate.value
+
+    def measure_camera(self, camera, timeout=1.5):
+        """
+        Reads the camera's datetime until it ticks over. The tick happened between the start of the last read
+        that returned the old value and the end of the first read that returned the new one.
+        """
+        estimate = self.camera_offsets.setdefault(camera.location, OffsetEstimate())
+        previous = None
+        start = self.clock()
+        while self.clock() - start < timeout:
+            request_start = self.clock()
+            with camera.lock:
+                widget = sensors.gp.check_result(sensors.gp.gp_camera_get_single_config(camera.camera, 'datetime'))
+            value = sensors.gp.check_result(sensors.gp.gp_widget_get_value(widget))
+            request_end = self.clock()
+            if previous is not None and value == previous[0] + 1:
+                estimate.add(value - self.utc(request_end), value - self.utc(previous[1]))
+                return True
+            previous = (value, request_start)
+        return False
+
+    def measure_capture(self, camera, trigger):
+        """
+        The file time is the camera clock at the exposure, rounded down to the second, and the exposure happened
+        while trigger_capture was running.
+        """
+        capture = trigger.capture
+        with camera.lock:
+            info = sensors.gp.check_result(sensors.gp.gp_camera_file_get_info(camera.camera, capture.folder,
+                                                                              capture.name))
+        mtime = info.file.mtime
+        if not mtime:
+            return
+        estimate = self.camera_offsets.setdefault(camera.location, OffsetEstimate())
+        estimate.add(mtime - self.utc(trigger.completed), mtime + 1 - self.utc(trigger.started))
+
+    def set_camera_clock(self, camera):
+        camera.set_config2({'datetime': int(round(self.utc()))})
+        self.camera_offsets.pop(camera.location, None)
+        self.camera_measured.pop(camera.location, None)
+        print(f'{camera.location} camera clock set to UTC.')
+
+    def record(self):
+        """
+        Logs the host offset when it changes noticeably and the camera offsets.
+        """
+        offset = self.offset
+        if offset is not None and (self.recorded is None or abs(offset - self.recorded) > 0.001):
+            self.recorded = offset
+            self.engine.recorder.record(session.CLOCK, value1=offset, value2=time.time() - self.utc(),
+                                        value3=self.uncertainty, label=self.source)
+        offsets = {}
+        for camera in self.engine.connected_cameras():
+            estimate = self.camera_offsets.get(camera.location)
+            if estimate is not None and estimate.known:
+                offsets[camera.location] = estimate.value
+                self.engine.recorder.record(session.CLOCK, camera=camera, value1=estimate.value,
+                                            value3=estimate.uncertainty, label='camera')
+        self.engine.recorder.set_metadata('time_source', self.source)
+        self.engine.recorder.set_metadata('camera_clock_offsets', offsets)
+
+    def update_cameras(self):
+        # USB requests are kept off the bus while the cart is moving
+        if self.engine.transfer_gate.is_moving():
+            return
+        while self.captures and not self.engine.transfer_gate.is_moving():
+            camera, trigger = self.captures.popleft()
+            if camera in self.engine.cameras:
+                try:
+                    self.measure_capture(camera, trigger)
+                except Exception as e:  # gphoto error, e.g. file already deleted
+                    print(f'Could not read file time from {camera.location} camera: {e}')
+
+        now = self.clock()
+        for camera in self.engine.connected_cameras():
+            if self.engine.transfer_gate.is_moving() or self.stop_event.is_set():
+                return
+            if now - self.camera_measured.get(camera.location, -math.inf) < self.camera_interval:
+                continue
+            self.camera_measured[camera.location] = now
+            try:
+                self.measure_camera(camera)
+            except Exception as e:  # gphoto error
+                print(f'Could not read clock of {camera.location} camera: {e}')
+                continue
+            estimate = self.camera_offsets.get(camera.location)
+            if (self.set_camera_clocks and self.source != SYSTEM and estimate is not None and estimate.known
+                    and abs(estimate.value) > 1):
+                self.set_camera_clock(camera)
+
+    def run(self):
+        while not self.stop_event.is_set():
+            if self.ntp_server is not None and self.source in (SYSTEM, NTP):
+                self.query_ntp()
+            self.update_cameras()
+            self.record()
+            self.stop_event.wait(self.interval)
+
+    def stop(self):
+        self.stop_event.set()
+        if self.is_alive():
+            self.join()
+        if self.pps_pin is not None:
+            sensors.GPIO.remove_event_detect(self.pps_pin)
@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+
+import sensors
+
+
+class MovementGate:
+    """
+    Keeps photo transfers off the USB bus while the cart is moving, so they never compete with triggers.
+    """
+
+    def __init__(self, idle_time=3.0, clock=time.monotonic):
+        """
+        :param idle_time: seconds without movement before transfers may continue
+        :param clock: monotonic clock
+        """
+        self.idle_time = idle_time
+        self.clock = clock
+        self.last_movement = None
+
+    def moved(self, pulse_time=None):
+        self.last_movement = self.clock() if pulse_time is None else pulse_time
+
+    def remaining(self):
+        """
+        :return: seconds until the cart counts as idle, 0 if it already is
+        """
+        if self.last_movement is None:
+            return 0
+        return max(self.last_movement + self.idle_time - self.clock(), 0)
+
+    def is_moving(self):
+        return self.remaining() > 0
+
+    def wait_until_idle(self, stop_event):
+        """
+        Blocks while the cart is moving.
+        :return: False if stop_event was set while waiting
+        """
+        remaining = self.remaining()
+        while remaining > 0:
+            if stop_event.wait(remaining):
+                return False
+            remaining = self.remaining()
+        return not stop_event.is_set()
+
+
+class PhotoTransfer(threading.Thread):
+    """
+    Downloads every file on a camera that is not yet in the destination directory.
+
+    Files are saved as <destination>/<camera folder>/<file name>, so a transfer that is stopped or interrupted
+    can simply be started again and continues where it left off. Listeners are called with the path of every file
+    written, not of files skipped because they were already there, e.g. to index it (ingest.PhotoIndexer.submit).
+    """
+
+    def __init__(self, camera, destination, gate=None, chunk_size=1024 * 1024):
+        super().__init__(daemon=True, name=f'{camera.location} camera photo transfer')
+        self.camera = camera
+        self.destination = destination
+        self.gate = gate
+        self.chunk_size = chunk_size
+        self.stop_event = threading.Event()
+
+        self.files_total = 0
+        self.files_done = 0
+        self.files_skipped = 0  # already transferred earlier, included in files_done
+        self.errors = []
+        self.listeners = []
+
+    def destination_path(self, folder, name):
+        return os.path.join(self.destination, os.path.basename(folder.rstrip('/')), name)
+
+    def wait_until_idle(self):
+        """
+        Waits while the cart is moving. Called before listing the files, before each file (its size is read from
+        the camera) and before each chunk, so no USB request of the transfer is made during a run.
+        :return: False once the transfer is stopped
+        """
+        if self.gate is None:
+            return not self.stop_event.is_set()
+        return self.gate.wait_until_idle(self.stop_event)
+
+    def run(self):
+        if not self.wait_until_idle():
+            return
+        try:
+            files = self.camera.list_files()
+        except Exception as e:  # gphoto error
+            print(f'Could not list files on {self.camera.location} camera: {e}')
+            self.errors.append(('/', str(e)))
+            return
+
+        self.files_total = len(files)
+        print(f'Transferring {self.files_total} files from {self.camera.location} camera to {self.destination}')
+        for folder, name in files:
+            if not self.wait_until_idle():
+                break
+            try:
+                result = self.camera.save(folder, name, self.destination_path(folder, name),
+                                          chunk_size=self.chunk_size, before_chunk=self.wait_until_idle)
+                if result == sensors.Camera.STOPPED:
+                    break
+                self.files_done += 1
+                if result == sensors.Camera.SKIPPED:
+                    self.files_skipped += 1
+                    continue
+                for listener in self.listeners:
+                    listener(self.destination_path(folder, name))
+            except Exception as e:  # gphoto error or size mismatch, file is retried on the next transfer
+                print(f'Could not transfer {folder}/{name} from {self.camera.location} camera: {e}')
+                self.errors.append((f'{folder}/{name}', str(e)))
+
+        print(f'{self.camera.location} camera transfer finished: {self.files_done} of {self.files_total} files '
+              f'({self.files_skipped} already transferred), {len(self.errors)} errors.')
+
+    def stop(self):
+        self.stop_event.set()
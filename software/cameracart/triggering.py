@@ -0,0 +1,730 @@
+import collections
+import heapq
+import itertools
+import threading
+import time
+
+# Queue policies, used when a trigger arrives while the camera is still busy with an earlier one
+DROP_IF_BUSY = 'drop'  # Discard the new trigger
+COALESCE = 'coalesce'  # Replace any waiting triggers with the new one
+BLOCK = 'block'  # Wait until there is room in the queue
+
+POLICIES = (DROP_IF_BUSY, COALESCE, BLOCK)
+
+
+class Trigger:
+    """
+    One request for a camera to take a photo.
+    """
+
+    def __init__(self, sequence, issued, position=None):
+        self.sequence = sequence
+        self.issued = issued  # monotonic time the trigger was issued (e.g. time of the wheel pulse)
+        self.position = position  # cumulative distance in centimeters, if known
+        self.started = None
+        self.completed = None
+        self.success = None
+        self.busy = False  # failed because the camera was still busy with earlier photos
+        self.capture = None  # set once the camera reports the file (capture_monitor.Capture)
+        self.shot = None  # Shot, if the trigger is released together with the other cameras' triggers
+        self.release_time = None  # monotonic time to call the camera at, if the capture is scheduled
+        self.frame = 0  # index of the frame within the camera's burst
+
+    def next_frame(self):
+        """
+        :return: Trigger for the next frame of a burst, same sequence number, time and position
+        """
+        trigger = Trigger(self.sequence, self.issued, self.position)
+        trigger.frame = self.frame + 1
+        return trigger
+
+    @property
+    def delay(self):
+        """
+        Time between the trigger being issued and the camera being asked to capture.
+        """
+        if self.started is None:
+            return None
+        return self.started - self.issued
+
+
+class Shot:
+    """
+    The triggers of one dispatch, one per camera, released together.
+
+    Works like a threading.Barrier whose number of parties is only known once every camera's queue has accepted or
+    dropped its trigger: camera workers wait in release() until all triggers of the shot have arrived (or timeout
+    has passed, so a camera still busy with an earlier trigger does not hold back the others) and then call the
+    cameras at the same time. Triggers that are dropped from a queue before being released leave the shot.
+    """
+
+    def __init__(self, sequence, timeout=0.05):
+        """
+        :param sequence: sequence number shared by the triggers
+        :param timeout: longest time in seconds a camera waits for the others
+        """
+        self.sequence = sequence
+        self.timeout = timeout
+        self.parties = None
+        self.left = 0
+        self.arrived = 0
+        self.triggers = []
+        self.finished = 0
+        self.reported = False
+        self.condition = threading.Condition()
+
+    def set_parties(self, parties):
+        """
+        :return: True if every trigger of the shot has already finished
+        """
+        with self.condition:
+            self.parties = parties
+            self.condition.notify_all()
+            return self.done()
+
+    def leave(self):
+        """
+        :return: True if this was the last outstanding trigger of the shot
+        """
+        with self.condition:
+            self.left += 1
+            self.condition.notify_all()
+            return self.done()
+
+    def ready(self):
+        return self.parties is not None and self.arrived >= self.parties - self.left
+
+    def release(self, trigger):
+        """
+        Blocks until every trigger of the shot is ready to be released, or until timeout.
+        """
+        with self.condition:
+            self.arrived += 1
+            self.triggers.append(trigger)
+            self.condition.notify_all()
+            self.condition.wait_for(self.ready, self.timeout)
+
+    def finish(self):
+        """
+        :return: True for the last trigger of the shot to finish
+        """
+        with self.condition:
+            self.finished += 1
+            return self.done()
+
+    def done(self):
+        # Called with the condition held, True only once
+        if self.reported or self.parties is None or self.finished == 0 or self.finished < self.parties - self.left:
+            return False
+        self.reported = True
+        return True
+
+    @staticmethod
+    def spread(times):
+        times = [t for t in times if t is not None]
+        if len(times) < 2:
+            return 0.0
+        return max(times) - min(times)
+
+    @property
+    def release_skew(self):
+        """
+        Seconds between the first and the last camera being asked to capture.
+        """
+        return Shot.spread([trigger.started for trigger in self.triggers])
+
+    @property
+    def skew(self):
+        """
+        Seconds between the first and the last camera releasing the shutter (trigger_capture returning).
+        """
+        return Shot.spread([trigger.completed for trigger in self.triggers if trigger.success])
+
+
+class TriggerStats:
+    def __init__(self):
+        self.issued = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.busy = 0  # refused by the camera (GP_ERROR_CAMERA_BUSY), its buffer was full; not counted as failed
+        self.late = 0
+        self.frames = 0  # frames taken, more than completed triggers with bursts
+        self.frames_cut = 0  # burst frames left out so the camera's buffer does not overflow
+
+    def as_dict(self):
+        return {'issued': self.issued, 'completed': self.completed, 'failed': self.failed,
+                'dropped': self.dropped, 'busy': self.busy, 'late': self.late, 'frames': self.frames,
+                'frames_cut': self.frames_cut}
+
+
+class LatencyEstimator:
+    """
+    Exponential moving average of the time between asking a camera to capture and the exposure.
+    """
+
+    def __init__(self, initial=0.1, alpha=0.2):
+        self.value = initial  # seconds
+        self.alpha = alpha
+        self.samples = 0
+
+    def update(self, latency):
+        if self.samples == 0:
+            self.value = latency
+        else:
+            self.value += self.alpha * (latency - self.value)
+        self.samples += 1
+
+
+class VelocityEstimator:
+    """
+    Estimates cart velocity from the timestamps of the last few wheel pulses.
+    """
+
+    def __init__(self, movement_distance, window=4, timeout=2.0):
+        """
+        :param movement_distance: distance between pulses in centimeters
+        :param window: number of pulses to average over
+        :param timeout: seconds without a pulse after which the cart is considered stopped
+        """
+        self.movement_distance = movement_distance
+        self.timeout = timeout
+        self.pulse_times = collections.deque(maxlen=window)
+
+    def update(self, pulse_time):
+        self.pulse_times.append(pulse_time)
+
+    def velocity(self, now=None):
+        """
+        :return: velocity in centimeters per second, or None if it cannot be estimated yet
+        """
+        if len(self.pulse_times) < 2:
+            return None
+        if now is not None and now - self.pulse_times[-1] > self.timeout:
+            return 0.0
+        elapsed = self.pulse_times[-1] - self.pulse_times[0]
+        if elapsed <= 0:
+            return None
+        return self.movement_distance * (len(self.pulse_times) - 1) / elapsed
+
+
+class Burst:
+    """
+    Several frames per trigger, optionally bracketed: frame k is taken with the k-th choice (cycling) of every
+    bracketed config item, e.g. {'shutterspeed': [9, 8, 10]} for 1/500, 1/640 and 1/400 s.
+
+    The camera's buffer is modelled as a bucket that every frame fills by one and that drains one frame every
+    write_time seconds. A burst is cut short so that the buffer never holds more than depth frames, and so that at
+    the current trigger interval the frames of one trigger are written before the next trigger arrives. The first
+    frame is always taken, so a burst never takes fewer photos than a single frame per trigger would.
+    """
+
+    def __init__(self, frames=1, bracket=None, depth=6, write_time=0.25, alpha=0.3):
+        """
+        :param frames: frames per trigger
+        :param bracket: dict of config item -> list of choice indices, one per frame
+        :param depth: frames the camera's buffer holds
+        :param write_time: seconds the camera needs to write one frame from its buffer to the card
+        :param alpha: weight of the latest trigger interval in its moving average
+        """
+        if frames < 1:
+            raise ValueError(f'A burst needs at least one frame, got {frames}')
+        self.frames = frames
+        self.bracket = {name: list(values) for name, values in (bracket or {}).items()}
+        self.depth = depth
+        self.write_time = write_time
+        self.alpha = alpha
+
+        self.level = 0.0  # frames in the buffer at self.updated
+        self.updated = None
+        self.last_issued = None
+        self.interval = None  # moving average of the seconds between triggers
+
+    @classmethod
+    def from_dict(cls, burst):
+        """
+        :param burst: dict as in cameras.json, see camera_array
+        """
+        return cls(burst.get('frames', 1), burst.get('bracket'), burst.get('buffer_depth', 6),
+                   burst.get('write_time', 0.25))
+
+    def settings(self, frame):
+        """
+        :return: dict of config item -> choice index for a frame
+        """
+        return {name: values[frame % len(values)] for name, values in self.bracket.items() if values}
+
+    def buffered(self, now):
+        """
+        :return: frames estimated to be in the camera's buffer
+        """
+        if self.updated is None:
+            return 0.0
+        return max(self.level - (now - self.updated) / self.write_time, 0.0)
+
+    def plan(self, issued, now):
+        """
+        Called once per trigger, before its first frame.
+        :param issued: time the trigger was issued, for the trigger interval
+        :param now: monotonic time
+        :return: number of frames to take
+        """
+        if self.last_issued is not None and issued > self.last_issued:
+            interval = issued - self.last_issued
+            if self.interval is None:
+                self.interval = interval
+            else:
+                self.interval += self.alpha * (interval - self.interval)
+        self.last_issued = issued
+
+        frames = min(self.frames, int(self.depth - self.buffered(now)))
+        if self.interval is not None:
+            frames = min(frames, int(self.interval / self.write_time))
+        return max(frames, 1)
+
+    def add_frame(self, now):
+        self.level = self.buffered(now) + 1
+        self.updated = now
+
+
+class CameraWorker(threading.Thread):
+    """
+    Takes triggers for one camera off a bounded queue and runs them one at a time.
+
+    With a window (host_capture.InFlightWindow), a trigger is only taken off the queue once the window has a free
+    slot, so the queue coalesces or blocks as usual while the camera's earlier captures are being downloaded.
+    The slot of a failed trigger is released here, that of a successful one once its file has been downloaded.
+
+    With a burst (Burst), every trigger is followed by the burst's further frames, each a Trigger of its own with
+    the same sequence number and the next frame number, so listeners see and log every frame.
+    """
+
+    def __init__(self, camera, dispatcher, policy=COALESCE, maxsize=1, window=None, burst=None, stats=None):
+        """
+        :param stats: TriggerStats to continue counting in, e.g. those of the camera this one replaces
+        """
+        super().__init__(daemon=True, name=f'{camera.location} camera trigger worker')
+        if policy not in POLICIES:
+            raise ValueError(f'Unknown trigger policy {policy}, expected one of {POLICIES}')
+
+        self.camera = camera
+        self.dispatcher = dispatcher
+        self.policy = policy
+        self.maxsize = maxsize
+        self.window = window
+        self.burst = burst
+
+        self.queue = collections.deque()
+        self.condition = threading.Condition()
+        self.busy = False
+        self.stopped = False
+        self.stats = TriggerStats() if stats is None else stats
+        # trigger_capture returns once the shutter has been released, so its duration is used as the
+        # trigger-to-exposure latency
+        self.latency = LatencyEstimator()
+
+    def is_busy(self):
+        return self.busy or self.camera.trigger_lock or len(self.queue) > 0
+
+    def submit(self, trigger):
+        """
+        Queues a trigger according to the worker's policy.
+        :return: True if the trigger was queued, False if it was dropped
+        """
+        dropped = []
+        with self.condition:
+            self.stats.issued += 1
+            if self.policy == DROP_IF_BUSY and self.is_busy():
+                dropped.append(trigger)
+            elif self.policy == COALESCE:
+                while len(self.queue) >= self.maxsize:
+                    dropped.append(self.queue.popleft())
+            elif self.policy == BLOCK:
+                while len(self.queue) >= self.maxsize and not self.stopped:
+                    self.condition.wait()
+
+            if trigger not in dropped:
+                self.queue.append(trigger)
+            self.stats.dropped += len(dropped)
+            self.condition.notify_all()
+
+        for trigger_ in dropped:
+            if trigger_ is not trigger and trigger_.shot is not None and trigger_.shot.leave():
+                self.dispatcher.shot_finished(trigger_.shot)
+            print(f'{self.camera.location} camera busy, trigger {trigger_.sequence} dropped.')
+            self.dispatcher.notify('dropped', self.camera, trigger_)
+
+        return trigger not in dropped
+
+    def pending(self):
+        with self.condition:
+            return len(self.queue) + int(self.busy)
+
+    def ready(self):
+        """
+        :return: True if the worker is triggering or has a trigger it can run now. Unlike pending, triggers held
+        back by a full window do not count, as they wait for the downloads that callers would hold up.
+        """
+        with self.condition:
+            if self.busy:
+                return True
+            return len(self.queue) > 0 and (self.window is None or self.window.in_flight < self.window.size)
+
+    def wait_for_window(self):
+        """
+        :return: False if the worker was stopped while waiting
+        """
+        if self.window is None:
+            return True
+        while not self.window.acquire(timeout=0.1):
+            if self.stopped:
+                return False
+        return True
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.queue and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+            if not self.wait_for_window():
+                return
+            with self.condition:
+                if not self.queue or self.stopped:
+                    # Stopped, or the trigger was dropped while waiting
+                    if self.window is not None:
+                        self.window.release()
+                    if self.stopped:
+                        return
+                    continue
+                trigger = self.queue.popleft()
+                self.busy = True
+                self.condition.notify_all()
+
+            if trigger.shot is not None:
+                trigger.shot.release(trigger)
+            if trigger.release_time is not None:
+                # Scheduled captures wait for their own release time, so cameras with different latencies expose
+                # together
+                self.dispatcher.sleep(max(trigger.release_time - self.dispatcher.clock(), 0))
+            frames = 1 if self.burst is None else self.burst.plan(trigger.issued, self.dispatcher.clock())
+            self.take(trigger)
+            with self.condition:
+                self.stats.frames_cut += self.burst_frames() - frames
+                if trigger.delay > self.dispatcher.late_threshold:
+                    self.stats.late += 1
+            if trigger.shot is not None and trigger.shot.finish():
+                self.dispatcher.shot_finished(trigger.shot)
+
+            frame = trigger
+            while frame.success and frame.frame + 1 < frames and not self.stopped:
+                if self.window is not None and not self.window.acquire(timeout=0):
+                    # The camera's RAM is full of earlier captures, the rest of the burst would have to wait
+                    with self.condition:
+                        self.stats.frames_cut += frames - frame.frame - 1
+                    break
+                frame = frame.next_frame()
+                self.take(frame)
+
+            if frame.frame > 0 and self.burst.bracket:
+                # Back to the first frame's settings now rather than delaying the next trigger
+                self.configure(0)
+            with self.condition:
+                self.busy = False
+                self.condition.notify_all()
+
+    def burst_frames(self):
+        return 1 if self.burst is None else self.burst.frames
+
+    def take(self, trigger):
+        """
+        Takes one frame, with the burst's settings for it, and tells the listeners.
+        """
+        # Configured first, so started to completed (and the latency estimate) covers only the capture
+        configured = self.configure(trigger.frame)
+        trigger.started = self.dispatcher.clock()
+        self.dispatcher.notify('started', self.camera, trigger)
+        trigger.success = configured and self.camera.trigger()
+        trigger.completed = self.dispatcher.clock()
+        # camera.refused is only set by the call, a frame that could not be configured was never tried
+        trigger.busy = configured and not trigger.success and self.camera.refused
+
+        with self.condition:
+            if trigger.success:
+                if trigger.frame == 0:
+                    self.stats.completed += 1
+                    self.latency.update(trigger.completed - trigger.started)
+                self.stats.frames += 1
+                if self.burst is not None:
+                    self.burst.add_frame(trigger.completed)
+            else:
+                if trigger.frame == 0 and trigger.busy:
+                    self.stats.busy += 1
+                elif trigger.frame == 0:
+                    self.stats.failed += 1
+                if self.window is not None:
+                    self.window.release()
+
+        self.dispatcher.notify('completed' if trigger.success else 'failed', self.camera, trigger)
+
+    def configure(self, frame):
+        """
+        Sets the bracketed config items for a frame. Items that already have the value cost no USB request.
+        :return: False if the camera could not be configured
+        """
+        if self.burst is None or not self.burst.bracket:
+            return True
+        try:
+            # Not Camera.set_config, which would print every change of every burst
+            with self.camera.lock:
+                self.camera.config_cache.apply(self.burst.settings(frame))
+        except Exception as e:  # gphoto error
+            print(f'{self.camera.location} camera could not set up frame {frame} of the burst, error: {e}.')
+            return False
+        return True
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+
+class TriggerDispatcher:
+    """
+    Sits between MovementSensor and the cameras. Every pulse is turned into one Trigger per camera, which is put on
+    that camera's bounded queue, so a camera that cannot keep up loses triggers (and counts them) instead of
+    falling further and further behind the wheel.
+
+    With synchronize, the triggers of a pulse form a Shot and all cameras are released together, and the spread of
+    their shutter times (skew) is measured for every shot.
+
+    Triggers at positions the skip function returns True for (e.g. field.FieldLayout.in_alley) are not issued at
+    all, they are only counted.
+    """
+
+    def __init__(self, late_threshold=0.2, clock=time.monotonic, synchronize=True, sync_timeout=0.05, skip=None,
+                 sleep=time.sleep):
+        """
+        :param late_threshold: triggers that start capturing more than this many seconds after being issued are
+        counted as late
+        :param clock: monotonic clock, should be the same one the movement sensor uses
+        :param synchronize: release the cameras of a pulse together
+        :param sync_timeout: longest time in seconds a camera waits for the others before capturing anyway
+        :param skip: function of the position in centimeters, True if no photo should be taken there
+        :param sleep: function waiting a number of seconds on clock, used until scheduled release times
+        """
+        self.late_threshold = late_threshold
+        self.clock = clock
+        self.sleep = sleep
+        self.synchronize = synchronize
+        self.sync_timeout = sync_timeout
+        self.workers = []
+        self.listeners = []
+        self.sequence = 0
+        self.lock = threading.Lock()
+        self.skews = collections.deque(maxlen=1000)  # shutter skew of recent shots, in seconds
+        self.skip = skip
+        self.skipped = 0
+
+    def add_camera(self, camera, policy=COALESCE, maxsize=1, window=None, burst=None, stats=None):
+        worker = CameraWorker(camera, self, policy=policy, maxsize=maxsize, window=window, burst=burst, stats=stats)
+        self.workers.append(worker)
+        worker.start()
+        return worker
+
+    def remove_camera(self, camera):
+        for worker in [worker for worker in self.workers if worker.camera is camera]:
+            worker.stop()
+            self.workers.remove(worker)
+
+    def worker(self, camera):
+        for worker in self.workers:
+            if worker.camera is camera:
+                return worker
+        raise KeyError(f'{camera.location} camera is not attached to the dispatcher')
+
+    def add_listener(self, listener):
+        """
+        :param listener: callable(event, camera, trigger), with event one of 'started', 'completed', 'failed',
+        'dropped' or 'confirmed'. Called from the camera worker (or dispatching) thread, so it should return quickly.
+        When every trigger of a synchronized shot has finished, listeners are also called with ('shot', None, shot).
+        """
+        self.listeners.append(listener)
+
+    def notify(self, event, camera, trigger):
+        for listener in self.listeners:
+            listener(event, camera, trigger)
+
+    def dispatch(self, timestamp=None, position=None):
+        """
+        Issues a trigger to every camera.
+        :param timestamp: monotonic time of the pulse that caused the trigger, defaults to now
+        :param position: cumulative distance in centimeters, if known
+        """
+        if self.skipping(position):
+            return
+        if timestamp is None:
+            timestamp = self.clock()
+        with self.lock:
+            self.sequence += 1
+            sequence = self.sequence
+        shot = Shot(sequence, self.sync_timeout) if self.synchronize else None
+        accepted = 0
+        for worker in list(self.workers):
+            trigger = Trigger(sequence, timestamp, position)
+            trigger.shot = shot
+            accepted += worker.submit(trigger)
+        if shot is not None and shot.set_parties(accepted):
+            self.shot_finished(shot)
+
+    def dispatch_at(self, sequence, exposure_time, position=None):
+        """
+        Issues a trigger to every camera for an exposure at a scheduled time, used by PredictiveTrigger. Each camera
+        is released ahead of exposure_time by its own measured latency.
+        :param sequence: sequence number of the triggers
+        :param exposure_time: monotonic time the exposures should happen at
+        :param position: cumulative distance in centimeters at the exposures, if known
+        """
+        if self.skipping(position):
+            return
+        shot = Shot(sequence, self.sync_timeout) if self.synchronize else None
+        accepted = 0
+        for worker in list(self.workers):
+            release_time = exposure_time - worker.latency.value
+            trigger = Trigger(sequence, release_time, position)
+            trigger.release_time = release_time
+            trigger.shot = shot
+            accepted += worker.submit(trigger)
+        if shot is not None and shot.set_parties(accepted):
+            self.shot_finished(shot)
+
+    def skipping(self, position):
+        if self.skip is None or position is None or not self.skip(position):
+            return False
+        with self.lock:
+            self.skipped += 1
+        return True
+
+    def shot_finished(self, shot):
+        self.skews.append(shot.skew)
+        self.notify('shot', None, shot)
+
+    def stats(self):
+        """
+        :return: dict of camera location -> trigger counters
+        """
+        return {worker.camera.location: worker.stats.as_dict() for worker in self.workers}
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+        for worker in self.workers:
+            worker.join(timeout=5)
+
+
+class PredictiveTrigger:
+    """
+    Schedules captures so exposures land at fixed ground positions instead of at the wheel pulses.
+
+    Velocity is estimated from the pulse timestamps. Every ground position is one Shot for all cameras, dispatched
+    ahead of the exposure by the slowest camera's latency, and each camera is then released at the exposure time
+    less its own measured latency. Positions are spaced photo_spacing apart, which can be finer or coarser than the
+    distance between pulses. Positions are only predicted up to one pulse ahead, so the cart stopping cannot cause
+    more than one pulse worth of extra photos. Triggers use the index of the ground position as their sequence
+    number, so photos from different cameras with the same sequence number show the same position.
+    """
+
+    def __init__(self, dispatcher, movement_distance, photo_spacing, clock=time.monotonic):
+        """
+        :param dispatcher: TriggerDispatcher the cameras are attached to
+        :param movement_distance: distance between pulses in centimeters
+        :param photo_spacing: distance between exposures in centimeters
+        :param clock: monotonic clock, should be the same one the movement sensor uses
+        """
+        self.dispatcher = dispatcher
+        self.movement_distance = movement_distance
+        self.photo_spacing = photo_spacing
+        self.clock = clock
+        self.velocity = VelocityEstimator(movement_distance)
+
+        self.next_index = None  # index of the next ground position to photograph
+        self.schedule = []  # heap of (fire time, tie breaker, index, exposure time)
+        self._tie_breaker = itertools.count()
+        self.condition = threading.Condition()
+        self.thread = None
+        self.stopped = False
+
+    def on_pulse(self, pulse_time, position):
+        """
+        Reschedules all upcoming exposures with the latest velocity estimate.
+        :param pulse_time: monotonic time of the pulse
+        :param position: cumulative distance in centimeters at the pulse
+        """
+        with self.condition:
+            self.velocity.update(pulse_time)
+            velocity = self.velocity.velocity()
+            self.schedule = []
+            if not self.dispatcher.workers:
+                return
+            latency = max(worker.latency.value for worker in self.dispatcher.workers)
+            if self.next_index is None:
+                # Start at the current position rather than photographing everything since the start
+                self.next_index = int(position // self.photo_spacing)
+            index = self.next_index
+            while index * self.photo_spacing <= position + self.movement_distance:
+                target = index * self.photo_spacing
+                if target <= position or not velocity:
+                    # Already passed (or velocity unknown), fire as soon as possible
+                    if target > position:
+                        break
+                    exposure_time = pulse_time
+                else:
+                    exposure_time = pulse_time + (target - position) / velocity
+                heapq.heappush(self.schedule, (exposure_time - latency, next(self._tie_breaker), index, exposure_time))
+                index += 1
+            self.condition.notify_all()
+
+    def poll(self, now=None):
+        """
+        Fires every scheduled capture that is due.
+        :return: time the next capture is due, or None if nothing is scheduled
+        """
+        if now is None:
+            now = self.clock()
+        due = []
+        with self.condition:
+            while self.schedule and self.schedule[0][0] <= now:
+                fire_time, _, index, exposure_time = heapq.heappop(self.schedule)
+                if index < self.next_index:
+                    continue
+                self.next_index = index + 1
+                due.append((index, exposure_time))
+            next_time = self.schedule[0][0] if self.schedule else None
+
+        for index, exposure_time in due:
+            self.dispatcher.dispatch_at(index, exposure_time, index * self.photo_spacing)
+
+        return next_time
+
+    def run(self):
+        while True:
+            next_time = self.poll()
+            with self.condition:
+                if self.stopped:
+                    return
+                if self.schedule and self.schedule[0][0] <= self.clock():
+                    continue
+                timeout = None if next_time is None else max(next_time - self.clock(), 0)
+                self.condition.wait(timeout)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True, name='predictive trigger scheduler')
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
@@ -96,90 +96,6 @@ class Ui_MainWindow(object):
         self.horizontalLayout_12 = QtWidgets.QHBoxLayout(self.widget_14)
         self.horizontalLayout_12.setContentsMargins(0, 0, 0, 0)
         self.horizontalLayout_12.setObjectName("horizontalLayout_12")
-        self.groupBox1 = QtWidgets.QGroupBox(self.widget_14)
-        self.groupBox1.setObjectName("groupBox1")
-        self.verticalLayout_4 = QtWidgets.QVBoxLayout(self.groupBox1)
-        self.verticalLayout_4.setObjectName("verticalLayout_4")
-        self.widget_9 = QtWidgets.QWidget(self.groupBox1)
-        self.widget_9.setObjectName("widget_9")
-        self.horizontalLayout_7 = QtWidgets.QHBoxLayout(self.widget_9)
-        self.horizontalLayout_7.setContentsMargins(0, 0, 0, 0)
-        self.horizontalLayout_7.setObjectName("horizontalLayout_7")
-        self.label_13 = QtWidgets.QLabel(self.widget_9)
-        self.label_13.setObjectName("label_13")
-        self.horizontalLayout_7.addWidget(self.label_13)
-        self.photos_taken_1 = QtWidgets.QLabel(self.widget_9)
-        self.photos_taken_1.setObjectName("photos_taken_1")
-        self.horizontalLayout_7.addWidget(self.photos_taken_1)
-        self.verticalLayout_4.addWidget(self.widget_9)
-        self.enable_camera_1_btn = QtWidgets.QPushButton(self.groupBox1)
-        self.enable_camera_1_btn.setCheckable(True)
-        self.enable_camera_1_btn.setChecked(False)
-        self.enable_camera_1_btn.setObjectName("enable_camera_1_btn")
-        self.verticalLayout_4.addWidget(self.enable_camera_1_btn)
-        self.transfer_photos_1_btn = QtWidgets.QPushButton(self.groupBox1)
-        self.transfer_photos_1_btn.setObjectName("transfer_photos_1_btn")
-        self.verticalLayout_4.addWidget(self.transfer_photos_1_btn)
-        self.reset_1_btn = QtWidgets.QPushButton(self.groupBox1)
-        self.reset_1_btn.setObjectName("reset_1_btn")
-        self.verticalLayout_4.addWidget(self.reset_1_btn)
-        self.horizontalLayout_12.addWidget(self.groupBox1)
-        self.groupBox_2 = QtWidgets.QGroupBox(self.widget_14)
-        self.groupBox_2.setObjectName("groupBox_2")
-        self.verticalLayout_5 = QtWidgets.QVBoxLayout(self.groupBox_2)
-        self.verticalLayout_5.setObjectName("verticalLayout_5")
-        self.widget_10 = QtWidgets.QWidget(self.groupBox_2)
-        self.widget_10.setObjectName("widget_10")
-        self.horizontalLayout_8 = QtWidgets.QHBoxLayout(self.widget_10)
-        self.horizontalLayout_8.setContentsMargins(0, 0, 0, 0)
-        self.horizontalLayout_8.setObjectName("horizontalLayout_8")
-        self.label_15 = QtWidgets.QLabel(self.widget_10)
-        self.label_15.setObjectName("label_15")
-        self.horizontalLayout_8.addWidget(self.label_15)
-        self.photos_taken_2 = QtWidgets.QLabel(self.widget_10)
-        self.photos_taken_2.setObjectName("photos_taken_2")
-        self.horizontalLayout_8.addWidget(self.photos_taken_2)
-        self.verticalLayout_5.addWidget(self.widget_10)
-        self.enable_camera_2_btn = QtWidgets.QPushButton(self.groupBox_2)
-        self.enable_camera_2_btn.setCheckable(True)
-        self.enable_camera_2_btn.setChecked(False)
-        self.enable_camera_2_btn.setObjectName("enable_camera_2_btn")
-        self.verticalLayout_5.addWidget(self.enable_camera_2_btn)
-        self.transfer_photos_2_btn = QtWidgets.QPushButton(self.groupBox_2)
-        self.transfer_photos_2_btn.setObjectName("transfer_photos_2_btn")
-        self.verticalLayout_5.addWidget(self.transfer_photos_2_btn)
-        self.reset_2_btn = QtWidgets.QPushButton(self.groupBox_2)
-        self.reset_2_btn.setObjectName("reset_2_btn")
-        self.verticalLayout_5.addWidget(self.reset_2_btn)
-        self.horizontalLayout_12.addWidget(self.groupBox_2)
-        self.groupBox_3 = QtWidgets.QGroupBox(self.widget_14)
-        self.groupBox_3.setObjectName("groupBox_3")
-        self.verticalLayout_6 = QtWidgets.QVBoxLayout(self.groupBox_3)
-        self.verticalLayout_6.setObjectName("verticalLayout_6")
-        self.widget_11 = QtWidgets.QWidget(self.groupBox_3)
-        self.widget_11.setObjectName("widget_11")
-        self.horizontalLayout_9 = QtWidgets.QHBoxLayout(self.widget_11)
-        self.horizontalLayout_9.setContentsMargins(0, 0, 0, 0)
-        self.horizontalLayout_9.setObjectName("horizontalLayout_9")
-        self.label_17 = QtWidgets.QLabel(self.widget_11)
-        self.label_17.setObjectName("label_17")
-        self.horizontalLayout_9.addWidget(self.label_17)
-        self.photos_taken_3 = QtWidgets.QLabel(self.widget_11)
-        self.photos_taken_3.setObjectName("photos_taken_3")
-        self.horizontalLayout_9.addWidget(self.photos_taken_3)
-        self.verticalLayout_6.addWidget(self.widget_11)
-        self.enable_camera_3_btn = QtWidgets.QPushButton(self.groupBox_3)
-        self.enable_camera_3_btn.setCheckable(True)
-        self.enable_camera_3_btn.setChecked(False)
-        self.enable_camera_3_btn.setObjectName("enable_camera_3_btn")
-        self.verticalLayout_6.addWidget(self.enable_camera_3_btn)
-        self.transfer_photos_3_btn = QtWidgets.QPushButton(self.groupBox_3)
-        self.transfer_photos_3_btn.setObjectName("transfer_photos_3_btn")
-        self.verticalLayout_6.addWidget(self.transfer_photos_3_btn)
-        self.reset_3_btn = QtWidgets.QPushButton(self.groupBox_3)
-        self.reset_3_btn.setObjectName("reset_3_btn")
-        self.verticalLayout_6.addWidget(self.reset_3_btn)
-        self.horizontalLayout_12.addWidget(self.groupBox_3)
         self.verticalLayout_8.addWidget(self.widget_14)
         self.widget_2 = QtWidgets.QWidget(self.centralwidget)
         self.widget_2.setObjectName("widget_2")
@@ -221,24 +137,6 @@ class Ui_MainWindow(object):
         self.groupBox_4.setTitle(_translate("MainWindow", "Cart Controls"))
         self.check_cameras_btn.setText(_translate("MainWindow", "Check Cameras"))
         self.focus_cameras_btn.setText(_translate("MainWindow", "Focus Cameras"))
-        self.groupBox1.setTitle(_translate("MainWindow", "Left Camera"))
-        self.label_13.setText(_translate("MainWindow", "Photos Taken:"))
-        self.photos_taken_1.setText(_translate("MainWindow", "0"))
-        self.enable_camera_1_btn.setText(_translate("MainWindow", "Enable Camera"))
-        self.transfer_photos_1_btn.setText(_translate("MainWindow", "Transfer Photos"))
-        self.reset_1_btn.setText(_translate("MainWindow", "Reset"))
-        self.groupBox_2.setTitle(_translate("MainWindow", "Center Camera"))
-        self.label_15.setText(_translate("MainWindow", "Photos Taken:"))
-        self.photos_taken_2.setText(_translate("MainWindow", "0"))
-        self.enable_camera_2_btn.setText(_translate("MainWindow", "Enable Camera"))
-        self.transfer_photos_2_btn.setText(_translate("MainWindow", "Transfer Photos"))
-        self.reset_2_btn.setText(_translate("MainWindow", "Reset"))
-        self.groupBox_3.setTitle(_translate("MainWindow", "Right Camera"))
-        self.label_17.setText(_translate("MainWindow", "Photos Taken:"))
-        self.photos_taken_3.setText(_translate("MainWindow", "0"))
-        self.enable_camera_3_btn.setText(_translate("MainWindow", "Enable Camera"))
-        self.transfer_photos_3_btn.setText(_translate("MainWindow", "Transfer Photos"))
-        self.reset_3_btn.setText(_translate("MainWindow", "Reset"))
 
 
 if __name__ == "__main__":